@@ -1,25 +1,19 @@
 import sqlite3
 import os
-import datetime
+import re
+from datetime import datetime, timedelta
 from functools import wraps
-from decimal import Decimal
 import json
 
-# DEBUG: Confirm app.py path
-print(f"DEBUG: app.py loaded from: {os.path.abspath(__file__)}")
-
-# --- Web App & Analytics Imports ---
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify, flash, send_file
-import pandas as pd
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
+# --- Web App Imports ---
+# Heavy optional libraries (pandas, matplotlib, qrcode/PIL, pyotp, requests)
+# are imported inside the functions that use them to keep worker boot and
+# test imports fast. See benchmarks/bench_app_startup.py.
+from flask import Flask, render_template, request, redirect, url_for, session, jsonify, flash, send_file, send_from_directory, Response, stream_with_context, g, has_request_context
 import io
 import base64
 
 # --- Authentication & Email Imports ---
-import pyotp
-import qrcode
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
@@ -27,32 +21,40 @@ from email.mime.base import MIMEBase
 from email import encoders
 from threading import Thread
 import time
-
-from functools import wraps
 import hashlib
-
-# --- AI & PDF Imports ---
-import requests
+import unicodedata
+from urllib.parse import quote
+
+import db
+import metrics
+import slow_queries
+import profiling
+import memory_budget
+import risk_scoring
+import library_logic
+import library_fines
+import popularity
+import canteen_logic
+import wallet_logic
+import charts
+import rollups
+import student_accounts
+import leader
+import group_commit
+import http_cache
+import money
 
 # --- Database Setup ---
 
 
 def get_db_conn(db_path=None):
-
-
+    """
+    Returns a pooled connection (see db.py); conn.close() hands it back.
+    record_book.db has always run without foreign key enforcement.
+    """
     if db_path is None:
-
-
-        db_path = app.config.get('DATABASE', 'record_book.db')
-
-
-    conn = sqlite3.connect(db_path)
-
-
-    conn.row_factory = sqlite3.Row
-
-
-    return conn
+        db_path = app.config.get('DATABASE', db.RECORD_BOOK_DB)
+    return db.connect(db_path, foreign_keys=False)
 
 
 
@@ -60,7 +62,7 @@ def initialize_database(db_path="record_book.db"):
 
     """Creates the database with all tables for record book management"""
 
-    conn = sqlite3.connect(db_path)
+    conn = db.connect(db_path, foreign_keys=False)
 
     cursor = conn.cursor()
 
@@ -84,7 +86,7 @@ def initialize_database(db_path="record_book.db"):
 
             gst_number TEXT,
 
-            credit_limit REAL DEFAULT 5000.00,
+            credit_limit INTEGER DEFAULT 500000,
 
             payment_days_limit INTEGER DEFAULT 30,
 
@@ -114,11 +116,11 @@ def initialize_database(db_path="record_book.db"):
 
             transaction_type TEXT NOT NULL,
 
-            amount REAL NOT NULL,
+            amount INTEGER NOT NULL,
 
-            tax_amount REAL DEFAULT 0,
+            tax_amount INTEGER DEFAULT 0,
 
-            total_amount REAL NOT NULL,
+            total_amount INTEGER NOT NULL,
 
             description TEXT,
 
@@ -156,15 +158,15 @@ def initialize_database(db_path="record_book.db"):
 
             bill_month TEXT NOT NULL,
 
-            subtotal REAL NOT NULL,
+            subtotal INTEGER NOT NULL,
 
-            tax_amount REAL DEFAULT 0,
+            tax_amount INTEGER DEFAULT 0,
 
-            total_amount REAL NOT NULL,
+            total_amount INTEGER NOT NULL,
 
-            paid_amount REAL DEFAULT 0,
+            paid_amount INTEGER DEFAULT 0,
 
-            due_amount REAL NOT NULL,
+            due_amount INTEGER NOT NULL,
 
             bill_date TEXT NOT NULL,
 
@@ -230,7 +232,7 @@ def initialize_database(db_path="record_book.db"):
 
             hsn_code TEXT,
 
-            price REAL NOT NULL,
+            price INTEGER NOT NULL,
 
             tax_rate REAL DEFAULT 18.0,
 
@@ -340,8 +342,38 @@ def initialize_database(db_path="record_book.db"):
 
     
 
+    # Amounts are integer paise (see money.py); converts tables from when they were REAL rupees
+
+    try:
+        converted_to_paise = money.migrate_to_paise(cursor)
+    except money.AmountOutOfRange:
+        # Leave the database exactly as it was; the error names the rows to fix
+        conn.rollback()
+        conn.close()
+        raise
+
+    
+
+    # --- Customer Risk Scores (filled by the nightly risk_scoring job) ---
+
+    risk_scoring.create_risk_table(conn)
+
+    # Indexes behind the paginated bills/customer pages and the ledger export
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_monthly_bills_bill_date ON monthly_bills (bill_date)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_monthly_bills_customer_date ON monthly_bills (customer_id, bill_date)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_transactions_customer_date ON transactions (customer_id, transaction_date)")
+
+    # Per-table and per-customer change counters for HTTP caching (see http_cache.py)
+    http_cache.create_version_tables(cursor)
+
+    
+
     conn.commit()
 
+    if converted_to_paise:
+        # The rebuilt tables leave the old pages behind as free space
+        conn.execute("VACUUM")
+
     conn.close()
 
 
@@ -356,12 +388,36 @@ app.config['TOTP_SECRET'] = os.getenv('TOTP_SECRET', 'JBSWY3DPEHPK3PXP')
 
 app.config['DATABASE'] = 'record_book.db'
 
-# --- Helper Functions ---
-def get_db_conn():
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    return conn
+app.config['SUPER_APP_DATABASE'] = 'super_app.db'
+
+# Rendered analytics charts (see charts.py)
+app.config['CHART_CACHE_DIR'] = 'chart_cache'
 
+# Prometheus metrics at /metrics when METRICS_ENABLED=1 (see metrics.py)
+metrics.init_app(app)
+
+# Statements slower than SLOW_QUERY_MS (off by default) are logged with their
+# query plans; each worker installs the log in start_worker_services()
+app.config['SLOW_QUERY_LOG'] = slow_queries.LOG_FILE
+
+# ?_profile=1 (cProfile) or ?_profile=sample on any page, for logged-in admins
+app.config['PROFILE_DIR'] = profiling.PROFILE_DIR
+profiling.init_app(app)
+
+# Sampled peak-memory checks against per-route budgets (MEMORY_SAMPLE_RATE)
+memory_budget.init_app(app)
+
+# Megabytes of rendered pages kept per process, keyed by ETag (see http_cache.py); 0 turns it off
+app.config['FRAGMENT_CACHE_MB'] = float(os.getenv('FRAGMENT_CACHE_MB', '0'))
+
+# {{ paise|rupees }} in templates, for amounts handed to JavaScript or forms
+app.jinja_env.filters['rupees'] = money.rupees_str
+
+# Rows per page on the bills list and the customer detail tabs
+BILLS_PAGE_SIZE = 100
+CUSTOMER_DETAIL_PAGE_SIZE = 50
+
+# --- Helper Functions ---
 def get_setting(key):
     """Get a setting value from database"""
     conn = get_db_conn(app.config['DATABASE'])
@@ -369,35 +425,36 @@ def get_setting(key):
     conn.close()
     return result['setting_value'] if result else None
 
+def currency_symbol():
+    """The currency_symbol setting, read once per request rather than once per amount"""
+    if not has_request_context():
+        return get_setting('currency_symbol') or '₹'
+    if 'currency_symbol' not in g:
+        g.currency_symbol = get_setting('currency_symbol') or '₹'
+    return g.currency_symbol
+
 def format_currency(amount):
-    """Format amount in Indian currency style"""
-    
-    # --- FIX: Define default symbol *before* the try block ---
-    symbol = '₹'  
-    
+    """Format a rupee amount (canteen and library pages) in Indian currency style"""
+    symbol = currency_symbol()
     try:
-        amount = float(amount)
-        
-        # Try to get a new symbol from DB, but 'symbol' is already safe
-        db_symbol = get_setting('currency_symbol')
-        if db_symbol:
-            symbol = db_symbol
-        
-        # Simple fix - use standard formatting
-        return f"{symbol}{amount:,.2f}"
-        
-        # OR for proper Indian style (lakhs/crores):
-        # ... (your other formatting logic) ...
-        
-    except:
-        # No error: 'symbol' is guaranteed to be '₹' (the default)
+        return f"{symbol}{float(amount):,.2f}"
+    except (TypeError, ValueError):
         return f"{symbol}0.00"
 
-def generate_bill_number():
-    """Generate unique bill number"""
+def format_money(paise):
+    """Format a record book amount, stored as integer paise (see money.py)"""
+    return money.format_paise(paise, currency_symbol())
+
+def generate_bill_number(conn=None):
+    """
+    Generate unique bill number. Pass the connection of an open bill run
+    so the count includes the bills it has inserted but not committed.
+    """
     prefix = get_setting('bill_prefix') or 'INV'
     today = datetime.now()
-    conn = get_db_conn(app.config['DATABASE'])
+    own_conn = conn is None
+    if own_conn:
+        conn = get_db_conn(app.config['DATABASE'])
     
     # Count bills this month
     count = conn.execute("""
@@ -405,7 +462,8 @@ def generate_bill_number():
         WHERE strftime('%Y-%m', bill_date) = ?
     """, (today.strftime('%Y-%m'),)).fetchone()['cnt']
     
-    conn.close()
+    if own_conn:
+        conn.close()
     
     return f"{prefix}{today.strftime('%Y%m')}{str(count + 1).zfill(4)}"
 
@@ -446,9 +504,88 @@ def send_email_async(recipient, subject, body, attachment=None):
             print(f"Email error: {e}")
             return False
     
-    Thread(target=send).start()
+    def send_and_record():
+        metrics.email_finished(send())
+    
+    metrics.email_queued()
+    Thread(target=send_and_record).start()
+
+def gemini_generate(api_key, prompt, timeout=30):
+    """POSTs a prompt to the Gemini API and returns the response, recording its latency"""
+    import requests
+    
+    start = time.perf_counter()
+    outcome = 'error'
+    try:
+        response = requests.post(
+            f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash-exp:generateContent?key={api_key}",
+            json={"contents": [{"parts": [{"text": prompt}]}]},
+            timeout=timeout
+        )
+        outcome = 'ok' if response.status_code == 200 else 'http_error'
+        return response
+    finally:
+        metrics.GEMINI_SECONDS.observe(time.perf_counter() - start, outcome)
+
+def record_book_write(job, *args):
+    """
+    Runs job(conn, *args) against record_book.db and commits it: batched
+    with other writes when GROUP_COMMIT=1, else in its own transaction.
+    """
+    return group_commit.write(app.config['DATABASE'], job, *args, foreign_keys=False)
+
+def notifier_writer():
+    """The group-commit writer for the notifiers' email_log writes, or None when GROUP_COMMIT is off"""
+    if not group_commit.is_enabled():
+        return None
+    return group_commit.get_writer(app.config['DATABASE'], foreign_keys=False)
+
+def _log_email(conn, customer_id, email_type, sent_date, message):
+    conn.execute("""
+        INSERT INTO email_log (customer_id, email_type, sent_date, status, message)
+        VALUES (?, ?, ?, 'sent', ?)
+    """, (customer_id, email_type, sent_date, message))
+
+def _log_overdue_reminder(conn, bill_id, customer_id, sent_date, message):
+    conn.execute("""
+        UPDATE monthly_bills 
+        SET last_reminder_date = ?, reminder_count = reminder_count + 1
+        WHERE bill_id = ?
+    """, (sent_date, bill_id))
+    _log_email(conn, customer_id, 'overdue_notice', sent_date, message)
+
+def _log_then_send(conn, job, notices):
+    """
+    Records each notice with job(conn, *log) and sends its email only once
+    that record has committed. notices is a list of (log args, (to,
+    subject, body)). With group commit the records go to the writer
+    together; any that fail are reported after the rest have been sent.
+    """
+    writer = notifier_writer()
+    if writer is None:
+        for log, email in notices:
+            job(conn, *log)
+        conn.commit()
+        for log, email in notices:
+            send_email_async(*email)
+        return
 
+    submitted = [(writer.submit(job, *log), email) for log, email in notices]
+    failures = []
+    for future, email in submitted:
+        try:
+            group_commit.wait(future, group_commit.WRITE_TIMEOUT_SECONDS)
+        except Exception as e:
+            failures.append(e)
+        else:
+            send_email_async(*email)
+    if failures:
+        raise RuntimeError(f"{len(failures)} of {len(notices)} notices not recorded or sent: {failures[0]}")
+
+def check_overdue_payments():
+    """Send reminders for overdue bills"""
     conn = get_db_conn(app.config['DATABASE'])
+    notices = []
     today_str = datetime.now().strftime('%Y-%m-%d')
     today_date_obj = datetime.strptime(today_str, '%Y-%m-%d')
     business_name = get_setting('business_name')
@@ -493,7 +630,7 @@ def send_email_async(recipient, subject, body, attachment=None):
                         </tr>
                         <tr>
                             <td style="padding: 10px;"><strong>Amount Due:</strong></td>
-                            <td style="padding: 10px; text-align: right; font-size: 20px; color: #dc2626;"><strong>{format_currency(bill['due_amount'])}</strong></td>
+                            <td style="padding: 10px; text-align: right; font-size: 20px; color: #dc2626;"><strong>{format_money(bill['due_amount'])}</strong></td>
                         </tr>
                     </table>
                 </div>
@@ -509,27 +646,20 @@ def send_email_async(recipient, subject, body, attachment=None):
         </html>
         """
         
-        send_email_async(bill['email'], subject, body)
-        
-        # Update reminder count and date
-        conn.execute("""
-            UPDATE monthly_bills 
-            SET last_reminder_date = ?, reminder_count = reminder_count + 1
-            WHERE bill_id = ?
-        """, (today, bill['bill_id']))
-        
-        conn.execute("""
-            INSERT INTO email_log (customer_id, email_type, sent_date, status, message)
-            VALUES (?, 'overdue_notice', ?, 'sent', ?)
-        """, (bill['customer_id'], today, f"Overdue by {days_overdue} days"))
+        # Update reminder count and date, then send
+        reminder = (bill['bill_id'], bill['customer_id'], today_str, f"Overdue by {days_overdue} days")
+        notices.append((reminder, (bill['email'], subject, body)))
     
-    conn.commit()
-    conn.close()
+    try:
+        _log_then_send(conn, _log_overdue_reminder, notices)
+    finally:
+        conn.close()
 
 def check_credit_limit_exceeded():
     """Check customers exceeding credit limit"""
     conn = get_db_conn(app.config['DATABASE'])
     business_name = get_setting('business_name')
+    notices = []
     
     customers = conn.execute("""
         SELECT c.*, 
@@ -573,15 +703,15 @@ def check_credit_limit_exceeded():
                     <table style="width: 100%; border-collapse: collapse;">
                         <tr>
                             <td style="padding: 10px; border-bottom: 1px solid #e5e7eb;"><strong>Credit Limit:</strong></td>
-                            <td style="padding: 10px; border-bottom: 1px solid #e5e7eb; text-align: right;">{format_currency(customer['credit_limit'])}</td>
+                            <td style="padding: 10px; border-bottom: 1px solid #e5e7eb; text-align: right;">{format_money(customer['credit_limit'])}</td>
                         </tr>
                         <tr>
                             <td style="padding: 10px; border-bottom: 1px solid #e5e7eb;"><strong>Current Balance:</strong></td>
-                            <td style="padding: 10px; border-bottom: 1px solid #e5e7eb; text-align: right; color: #dc2626;">{format_currency(customer['total_due'])}</td>
+                            <td style="padding: 10px; border-bottom: 1px solid #e5e7eb; text-align: right; color: #dc2626;">{format_money(customer['total_due'])}</td>
                         </tr>
                         <tr>
                             <td style="padding: 10px;"><strong>Exceeded By:</strong></td>
-                            <td style="padding: 10px; text-align: right; font-size: 20px; color: #dc2626;"><strong>{format_currency(exceeded_by)}</strong></td>
+                            <td style="padding: 10px; text-align: right; font-size: 20px; color: #dc2626;"><strong>{format_money(exceeded_by)}</strong></td>
                         </tr>
                     </table>
                 </div>
@@ -597,15 +727,25 @@ def check_credit_limit_exceeded():
         </html>
         """
         
-        send_email_async(customer['email'], subject, body)
-        
-        conn.execute("""
-            INSERT INTO email_log (customer_id, email_type, sent_date, status, message)
-            VALUES (?, 'credit_limit_exceeded', ?, 'sent', ?)
-        """, (customer['customer_id'], today, f"Exceeded by {format_currency(exceeded_by)}"))
+        log = (customer['customer_id'], 'credit_limit_exceeded', today, f"Exceeded by {format_money(exceeded_by)}")
+        notices.append((log, (customer['email'], subject, body)))
     
-    conn.commit()
-    conn.close()
+    try:
+        _log_then_send(conn, _log_email, notices)
+    finally:
+        conn.close()
+
+# --- Risk Score Sorting ---
+RISK_BANDS = ('Low', 'Medium', 'High')
+
+# Whitelisted ORDER BY clauses for the customers/alerts pages.
+# Unscored customers (no customer_risk row yet) sort last.
+RISK_SORT_ORDERS = {
+    'name': "c.name",
+    'outstanding': "outstanding_balance DESC",
+    'overdue': "overdue_bills DESC",
+    'risk': "r.reliability_score IS NULL, r.reliability_score ASC, outstanding_balance DESC",
+}
 
 # --- AI Cooldown Management ---
 last_ai_call = {}
@@ -637,7 +777,10 @@ def ai_analyze_customer(customer_id):
     
     api_key = get_setting('gemini_api_key')
     if not api_key:
-            conn = get_db_conn(app.config['DATABASE'])    customer = conn.execute("SELECT * FROM customers WHERE customer_id = ?", (customer_id,)).fetchone()
+        return "AI not configured. Please add Gemini API key in settings."
+    
+    conn = get_db_conn(app.config['DATABASE'])
+    customer = conn.execute("SELECT * FROM customers WHERE customer_id = ?", (customer_id,)).fetchone()
     
     transactions = conn.execute("""
         SELECT * FROM transactions 
@@ -661,7 +804,7 @@ def ai_analyze_customer(customer_id):
     avg_days_to_pay = 0
     
     transaction_summary = "\n".join([
-        f"Date: {t['transaction_date']}, Type: {t['transaction_type']}, Amount: {format_currency(t['total_amount'])}, Status: {t['status']}"
+        f"Date: {t['transaction_date']}, Type: {t['transaction_type']}, Amount: {format_money(t['total_amount'])}, Status: {t['status']}"
         for t in transactions[:20]
     ])
     
@@ -670,15 +813,15 @@ def ai_analyze_customer(customer_id):
     
     **Customer Information:**
     - Name: {customer['name']}
-    - Credit Limit: {format_currency(customer['credit_limit'])}
+    - Credit Limit: {format_money(customer['credit_limit'])}
     - Payment Terms: {customer['payment_days_limit']} days
     - Customer Since: {customer['registration_date']}
     
     **Financial Summary:**
     - Total Transactions: {total_transactions}
-    - Total Amount Billed (last 12 months): {format_currency(total_billed)}
-    - Total Amount Paid: {format_currency(total_paid)}
-    - Outstanding: {format_currency(total_billed - total_paid)}
+    - Total Amount Billed (last 12 months): {format_money(total_billed)}
+    - Total Amount Paid: {format_money(total_paid)}
+    - Outstanding: {format_money(total_billed - total_paid)}
     - Payment Success Rate: {(paid_on_time/total_transactions*100) if total_transactions > 0 else 0:.1f}%
     
     **Recent Transaction History (last 20):**
@@ -697,11 +840,7 @@ def ai_analyze_customer(customer_id):
     """
     
     try:
-        response = requests.post(
-            f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash-exp:generateContent?key={api_key}",
-            json={"contents": [{"parts": [{"text": prompt}]}]},
-            timeout=30
-        )
+        response = gemini_generate(api_key, prompt)
         
         if response.status_code == 200:
             result = response.json()
@@ -722,10 +861,11 @@ def ai_generate_collection_strategy(customer_id):
         return f"**{cooldown_check['message']}**\n\nThis prevents API rate limiting. The cooldown will reset automatically."
     
     api_key = get_setting('gemini_api_key')
-        if not api_key:
-            return "AI not configured"
+    if not api_key:
+        return "AI not configured"
     
-        conn = get_db_conn(app.config['DATABASE'])    customer = conn.execute("SELECT * FROM customers WHERE customer_id = ?", (customer_id,)).fetchone()
+    conn = get_db_conn(app.config['DATABASE'])
+    customer = conn.execute("SELECT * FROM customers WHERE customer_id = ?", (customer_id,)).fetchone()
     overdue_bills = conn.execute("""
         SELECT * FROM monthly_bills 
         WHERE customer_id = ? AND status = 'Unpaid' AND due_date < date('now')
@@ -744,7 +884,7 @@ def ai_generate_collection_strategy(customer_id):
     Create a professional and empathetic debt collection strategy for:
     
     Customer: {customer['name']}
-    Total Overdue: {format_currency(total_overdue)}
+    Total Overdue: {format_money(total_overdue)}
     Oldest Bill: {days_overdue} days overdue
     Number of Overdue Bills: {len(overdue_bills)}
     
@@ -759,11 +899,7 @@ def ai_generate_collection_strategy(customer_id):
     """
     
     try:
-        response = requests.post(
-            f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash-exp:generateContent?key={api_key}",
-            json={"contents": [{"parts": [{"text": prompt}]}]},
-            timeout=30
-        )
+        response = gemini_generate(api_key, prompt)
         
         if response.status_code == 200:
             result = response.json()
@@ -785,6 +921,9 @@ def login_required(f):
 # --- Authentication Routes ---
 @app.route('/setup-2fa')
 def setup_2fa():
+    import pyotp
+    import qrcode
+    
     totp_secret = app.config['TOTP_SECRET']
     totp_uri = pyotp.totp.TOTP(totp_secret).provisioning_uri(
         name='admin@recordbook',
@@ -807,6 +946,7 @@ def login():
     error = None
     if request.method == 'POST':
         code = request.form.get('code', '').strip()
+        import pyotp
         totp = pyotp.TOTP(app.config['TOTP_SECRET'])
         
         if totp.verify(code, valid_window=1):
@@ -827,6 +967,7 @@ def logout():
 # --- Main Routes ---
 @app.route('/')
 @login_required
+@http_cache.conditional(('customers', 'transactions', 'monthly_bills', 'settings'))
 def dashboard():
     conn = get_db_conn(app.config['DATABASE'])
     
@@ -865,11 +1006,18 @@ def dashboard():
                          this_month_revenue=this_month_revenue,
                          recent_transactions=recent_transactions,
                          top_debtors=top_debtors,
-                         format_currency=format_currency,
+                         format_money=format_money,
                          current_date=datetime.now())
 
+def _insert_customer(conn, values):
+    conn.execute("""
+        INSERT INTO customers (name, email, phone, address, gst_number, credit_limit, payment_days_limit, registration_date)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, values)
+
 @app.route('/customers', methods=['GET', 'POST'])
 @login_required
+@http_cache.conditional(('customers', 'monthly_bills', 'customer_risk', 'settings'))
 def customers():
     conn = get_db_conn(app.config['DATABASE'])
     
@@ -879,16 +1027,15 @@ def customers():
         phone = request.form['phone']
         address = request.form.get('address', '')
         gst_number = request.form.get('gst_number', '')
-        credit_limit = float(request.form.get('credit_limit', 5000))
+        credit_limit = money.to_paise(request.form.get('credit_limit', 5000))
         payment_days = int(request.form.get('payment_days', 30))
         
         try:
-            conn.execute("""
-                INSERT INTO customers (name, email, phone, address, gst_number, credit_limit, payment_days_limit, registration_date)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """, (name, email, phone, address, gst_number, credit_limit, payment_days, datetime.now().strftime('%Y-%m-%d')))
-            conn.commit()
+            record_book_write(_insert_customer, (name, email, phone, address, gst_number, credit_limit, payment_days,
+                                                 datetime.now().strftime('%Y-%m-%d')))
             flash(f'✅ Customer "{name}" added successfully!', 'success')
+        except group_commit.WritePending as e:
+            flash(f'⏳ Customer "{name}" not confirmed yet: {e}', 'warning')
         except sqlite3.IntegrityError:
             flash('❌ Error: Email already exists!', 'error')
         except Exception as e:
@@ -897,42 +1044,78 @@ def customers():
         conn.close()
         return redirect(url_for('customers'))
     
+    # Optional server-side risk filter/sort from the nightly risk_scoring job
+    risk_band = request.args.get('risk')
+    sort_by = request.args.get('sort', 'name')
+    order_by = RISK_SORT_ORDERS.get(sort_by, RISK_SORT_ORDERS['name'])
+    
+    risk_filter = ""
+    params = ()
+    if risk_band in RISK_BANDS:
+        risk_filter = "WHERE r.risk_band = ?"
+        params = (risk_band,)
+    
     # Get all customers with outstanding balance
-    customers_list = conn.execute("""
+    customers_list = conn.execute(f"""
         SELECT c.*, 
                COALESCE(SUM(CASE WHEN b.status = 'Unpaid' THEN b.due_amount ELSE 0 END), 0) as outstanding_balance,
-               COUNT(CASE WHEN b.status = 'Unpaid' AND b.due_date < date('now') THEN 1 END) as overdue_bills
+               COUNT(CASE WHEN b.status = 'Unpaid' AND b.due_date < date('now') THEN 1 END) as overdue_bills,
+               r.reliability_score, r.risk_band, r.scored_at
         FROM customers c
         LEFT JOIN monthly_bills b ON c.customer_id = b.customer_id
+        LEFT JOIN customer_risk r ON c.customer_id = r.customer_id
+        {risk_filter}
         GROUP BY c.customer_id
-        ORDER BY c.name
-    """).fetchall()
+        ORDER BY {order_by}
+    """, params).fetchall()
     
     conn.close()
-    return render_template('customers.html', active_page='customers', customers=customers_list, format_currency=format_currency)
+    return render_template('customers.html', active_page='customers', customers=customers_list,
+                           risk_band=risk_band, sort_by=sort_by, format_money=format_money)
 
 @app.route('/customer/<int:customer_id>')
 @login_required
+@http_cache.conditional(('settings',), customer_arg='customer_id')
 def customer_detail(customer_id):
     conn = get_db_conn(app.config['DATABASE'])
     
     customer = conn.execute("SELECT * FROM customers WHERE customer_id = ?", (customer_id,)).fetchone()
+    if not customer:
+        conn.close()
+        flash('Customer not found!', 'danger')
+        return redirect(url_for('customers'))
+    
+    # One page of each history; big accounts have thousands of rows
+    tx_page = max(request.args.get('tx_page', 1, type=int), 1)
+    bill_page = max(request.args.get('bill_page', 1, type=int), 1)
+    per_page = CUSTOMER_DETAIL_PAGE_SIZE
+    
     transactions = conn.execute("""
         SELECT * FROM transactions 
         WHERE customer_id = ? 
         ORDER BY transaction_date DESC
-    """, (customer_id,)).fetchall()
+        LIMIT ? OFFSET ?
+    """, (customer_id, per_page, (tx_page - 1) * per_page)).fetchall()
+    transaction_count = conn.execute(
+        "SELECT COUNT(*) FROM transactions WHERE customer_id = ?", (customer_id,)
+    ).fetchone()[0]
     
     bills = conn.execute("""
         SELECT * FROM monthly_bills 
         WHERE customer_id = ? 
         ORDER BY bill_date DESC
-    """, (customer_id,)).fetchall()
-    
-    # Calculate summary stats
-    total_billed = sum(b['total_amount'] for b in bills)
-    total_paid = sum(b['paid_amount'] for b in bills)
-    total_outstanding = sum(b['due_amount'] for b in bills if b['status'] == 'Unpaid')
+        LIMIT ? OFFSET ?
+    """, (customer_id, per_page, (bill_page - 1) * per_page)).fetchall()
+    
+    # Summary stats over all bills, not just the page shown
+    summary = conn.execute("""
+        SELECT COUNT(*) AS bill_count,
+               COALESCE(SUM(total_amount), 0) AS total_billed,
+               COALESCE(SUM(paid_amount), 0) AS total_paid,
+               COALESCE(SUM(CASE WHEN status = 'Unpaid' THEN due_amount ELSE 0 END), 0) AS total_outstanding
+        FROM monthly_bills
+        WHERE customer_id = ?
+    """, (customer_id,)).fetchone()
     
     conn.close()
     
@@ -941,16 +1124,16 @@ def customer_detail(customer_id):
                          customer=customer,
                          transactions=transactions,
                          bills=bills,
-                         total_billed=total_billed,
-                         total_paid=total_paid,
-                         total_outstanding=total_outstanding,
-                         format_currency=format_currency)
+                         tx_page=tx_page,
+                         tx_pages=(transaction_count + per_page - 1) // per_page or 1,
+                         bill_page=bill_page,
+                         bill_pages=(summary['bill_count'] + per_page - 1) // per_page or 1,
+                         total_billed=summary['total_billed'],
+                         total_paid=summary['total_paid'],
+                         total_outstanding=summary['total_outstanding'],
+                         format_money=format_money)
 
 ####################################################################
-# Add after existing imports
-import re
-from datetime import datetime, timedelta
-
 # Natural Language Search
 @app.route('/nl-search', methods=['POST'])
 @login_required
@@ -1001,14 +1184,11 @@ def nl_search():
     3. For "last month": Use date functions
     4. Customer names are case-insensitive
     5. Return ONLY valid JSON, no markdown
+    6. Amounts (amount, total_amount, due_amount, credit_limit) are stored in paise: select them divided by 100.0 to show rupees
     """
     
     try:
-        response = requests.post(
-            f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash-exp:generateContent?key={api_key}",
-            json={"contents": [{"parts": [{"text": prompt}]}]},
-            timeout=30
-        )
+        response = gemini_generate(api_key, prompt)
         
         if response.status_code == 200:
             result = response.json()
@@ -1077,7 +1257,7 @@ def customer_quick_insight(customer_id):
     conn.close()
     
     count = recent_trans['count']
-    avg = recent_trans['avg_amount'] or 0
+    avg = (recent_trans['avg_amount'] or 0) / money.PAISE_PER_RUPEE
     
     if count > 10:
         insight = f"💎 High-value customer! {count} transactions in 3 months, avg ₹{avg:.0f}"
@@ -1111,7 +1291,7 @@ def smart_transaction_suggestions(customer_id):
     
     return jsonify({
         'suggestions': [
-            {'amount': s['amount'], 'description': s['description']}
+            {'amount': money.rupees_str(s['amount']), 'description': s['description']}
             for s in suggestions
         ]
     })
@@ -1163,11 +1343,7 @@ def ai_generate_description():
     """
     
     try:
-        response = requests.post(
-            f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash-exp:generateContent?key={api_key}",
-            json={"contents": [{"parts": [{"text": prompt}]}]},
-            timeout=15
-        )
+        response = gemini_generate(api_key, prompt, timeout=15)
         
         if response.status_code == 200:
             result = response.json()
@@ -1180,16 +1356,24 @@ def ai_generate_description():
     
     return jsonify({'description': f'{trans_type} for {customer["name"]}'})
 
+def _insert_transaction(conn, values):
+    conn.execute("""
+        INSERT INTO transactions (customer_id, transaction_type, amount, tax_amount, total_amount,
+                                description, transaction_date, due_date, status, payment_mode, reference_number)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, values)
+
 # Update transactions route to pass tax_rate
 @app.route('/transactions', methods=['GET', 'POST'])
 @login_required
+@http_cache.conditional(('customers', 'transactions', 'monthly_bills', 'settings'))
 def transactions():
     conn = get_db_conn()
     
     if request.method == 'POST':
         customer_id = request.form['customer_id']
         transaction_type = request.form['transaction_type']
-        amount = float(request.form['amount'])
+        amount = money.to_paise(request.form['amount'])
         description = request.form.get('description', '')
         payment_mode = request.form.get('payment_mode', '')
         reference_number = request.form.get('reference_number', '')
@@ -1201,7 +1385,7 @@ def transactions():
         due_date = None
 
         if transaction_type == 'Sale/Credit':
-            tax_amount = amount * (tax_rate / 100)
+            tax_amount = money.percent_of(amount, tax_rate)
             total_amount = amount + tax_amount
             transaction_status = 'Unpaid'
             
@@ -1218,14 +1402,12 @@ def transactions():
             transaction_status = 'Paid' # Refund is a completed action
 
         try:
-            conn.execute("""
-                INSERT INTO transactions (customer_id, transaction_type, amount, tax_amount, total_amount,
-                                        description, transaction_date, due_date, status, payment_mode, reference_number)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (customer_id, transaction_type, amount, tax_amount, total_amount,
-                  description, datetime.now().strftime('%Y-%m-%d'), due_date, transaction_status, payment_mode, reference_number))
-            conn.commit()
+            record_book_write(_insert_transaction, (customer_id, transaction_type, amount, tax_amount, total_amount,
+                                                    description, datetime.now().strftime('%Y-%m-%d'), due_date,
+                                                    transaction_status, payment_mode, reference_number))
             flash(f'✅ {transaction_type} transaction recorded successfully!', 'success')
+        except group_commit.WritePending as e:
+            flash(f'⏳ {transaction_type} transaction not confirmed yet: {e}', 'warning')
         except Exception as e:
             flash(f'❌ Error recording transaction: {str(e)}', 'error')
         
@@ -1267,7 +1449,7 @@ def transactions():
                          transactions=all_transactions,
                          today=datetime.now().strftime('%Y-%m-%d'),
                          tax_rate=tax_rate,
-                         format_currency=format_currency)
+                         format_money=format_money)
 ####################################################################
 
 @app.route('/bills/generate', methods=['POST'])
@@ -1302,9 +1484,9 @@ def generate_bills():
         total_amount = subtotal + tax_amount
         
         if total_amount > 0:
-            bill_number = generate_bill_number()
+            bill_number = generate_bill_number(conn)
             bill_date = datetime.now().strftime('%Y-%m-%d')
-            due_date = (datetime.now() + datetime.timedelta(days=customer['payment_days_limit'])).strftime('%Y-%m-%d')
+            due_date = (datetime.now() + timedelta(days=customer['payment_days_limit'])).strftime('%Y-%m-%d')
             
             conn.execute("""
                 INSERT INTO monthly_bills (customer_id, bill_number, bill_month, subtotal, tax_amount, 
@@ -1372,15 +1554,15 @@ def generate_bill_email(customer, bill_number, month, subtotal, tax_amount, tota
                     <tbody>
                         <tr>
                             <td style="padding: 15px; border-bottom: 1px solid #e5e7eb;">Subtotal</td>
-                            <td style="padding: 15px; border-bottom: 1px solid #e5e7eb; text-align: right;">{format_currency(subtotal)}</td>
+                            <td style="padding: 15px; border-bottom: 1px solid #e5e7eb; text-align: right;">{format_money(subtotal)}</td>
                         </tr>
                         <tr>
                             <td style="padding: 15px; border-bottom: 1px solid #e5e7eb;">Tax (GST)</td>
-                            <td style="padding: 15px; border-bottom: 1px solid #e5e7eb; text-align: right;">{format_currency(tax_amount)}</td>
+                            <td style="padding: 15px; border-bottom: 1px solid #e5e7eb; text-align: right;">{format_money(tax_amount)}</td>
                         </tr>
                         <tr style="background: #f3f4f6;">
                             <td style="padding: 20px;"><strong style="font-size: 18px;">Total Amount Due</strong></td>
-                            <td style="padding: 20px; text-align: right;"><strong style="font-size: 24px; color: #059669;">{format_currency(total_amount)}</strong></td>
+                            <td style="padding: 20px; text-align: right;"><strong style="font-size: 24px; color: #059669;">{format_money(total_amount)}</strong></td>
                         </tr>
                     </tbody>
                 </table>
@@ -1407,23 +1589,30 @@ def generate_bill_email(customer, bill_number, month, subtotal, tax_amount, tota
 
 @app.route('/bills')
 @login_required
+@http_cache.conditional(('customers', 'monthly_bills', 'settings'))
 def bills():
     conn = get_db_conn()
     
-    all_bills = conn.execute("""
+    page = max(request.args.get('page', 1, type=int), 1)
+    total = conn.execute("SELECT COUNT(*) FROM monthly_bills").fetchone()[0]
+    page_bills = conn.execute("""
         SELECT b.*, c.name as customer_name, c.email
         FROM monthly_bills b
         JOIN customers c ON b.customer_id = c.customer_id
         ORDER BY b.bill_date DESC
-    """).fetchall()
+        LIMIT ? OFFSET ?
+    """, (BILLS_PAGE_SIZE, (page - 1) * BILLS_PAGE_SIZE)).fetchall()
     
     conn.close()
     return render_template('bills.html', 
                          active_page='bills', 
-                         bills=all_bills,
+                         bills=page_bills,
+                         page=page,
+                         pages=(total + BILLS_PAGE_SIZE - 1) // BILLS_PAGE_SIZE or 1,
+                         total_bills=total,
                          today=datetime.now().strftime('%Y-%m-%d'),
                          current_month=datetime.now().strftime('%Y-%m'),
-                         format_currency=format_currency)
+                         format_money=format_money)
 
 @app.route('/ai-analysis/<int:customer_id>')
 @login_required
@@ -1445,6 +1634,7 @@ def settings():
     if request.method == 'POST':
         # Add extra 2FA check for settings page
         verify_code = request.form.get('verify_code')
+        import pyotp
         totp = pyotp.TOTP(app.config['TOTP_SECRET'])
         
         if not totp.verify(verify_code, valid_window=1):
@@ -1508,76 +1698,91 @@ def test_email():
     flash(f'✅ Test email sent to {smtp_email}. Please check your inbox.', 'success')
     return redirect(url_for('settings'))
 
+def set_attachment_filename(response, filename):
+    """
+    Sets Content-Disposition: attachment the way send_file(download_name=...)
+    does: a quoted filename, plus an RFC 5987 filename* (UTF-8) with an
+    ASCII fallback when the name is not ASCII.
+    """
+    try:
+        filename.encode('ascii')
+    except UnicodeEncodeError:
+        fallback = unicodedata.normalize('NFKD', filename).encode('ascii', 'ignore').decode('ascii')
+        names = {'filename': fallback, 'filename*': f"UTF-8''{quote(filename, safe='!#$&+-.^_`|~')}"}
+    else:
+        names = {'filename': filename}
+    response.headers.set('Content-Disposition', 'attachment', **names)
+    return response
+
 @app.route('/export-ledger/<int:customer_id>')
 @login_required
 def export_ledger(customer_id):
-    """Export customer ledger as CSV"""
+    """Export customer ledger as CSV, streamed a row at a time"""
     conn = get_db_conn()
-    
     customer = conn.execute("SELECT * FROM customers WHERE customer_id = ?", (customer_id,)).fetchone()
-    transactions = conn.execute("""
-        SELECT transaction_date, transaction_type, description, amount, tax_amount, 
-               total_amount, status, due_date 
-        FROM transactions 
-        WHERE customer_id = ? 
-        ORDER BY transaction_date ASC
-    """, (customer_id,)).fetchall()
-    
     conn.close()
-    
-    # Create CSV data
-    csv_data = f"Customer Ledger - {customer['name']}\n"
-    csv_data += f"Generated on: {datetime.now().strftime('%Y-%m-%d %H:%M')}\n\n"
-    csv_data += "Date,Type,Description,Amount,Tax,Total,Status,Due Date\n"
-    
-    for trans in transactions:
-        csv_data += f"{trans['transaction_date']},{trans['transaction_type']},{trans['description'] or ''},"
-        csv_data += f"{trans['amount']},{trans['tax_amount']},{trans['total_amount']},{trans['status']},{trans['due_date'] or ''}\n"
-    
-    # Return as downloadable file
-    return send_file(
-        io.BytesIO(csv_data.encode()),
-        mimetype='text/csv',
-        as_attachment=True,
-        download_name=f"ledger_{customer['name'].replace(' ', '_')}_{datetime.now().strftime('%Y%m%d')}.csv"
+    if not customer:
+        return "Customer not found", 404
+    
+    # Same format as the standalone CLI export
+    filename = f"ledger_{customer['name'].replace(' ', '_')}_{datetime.now().strftime('%Y%m%d')}.csv"
+    response = Response(
+        stream_with_context(cli_logic.iter_ledger_csv(customer_id, datetime.now().strftime('%Y-%m-%d %H:%M'),
+                                                       app.config['DATABASE'])),
+        mimetype='text/csv'
     )
+    return set_attachment_filename(response, filename)
 
 @app.route('/dashboard-stats')
 @login_required
+@http_cache.conditional(('customers', 'monthly_bills'))
 def dashboard_stats():
     """API endpoint for real-time dashboard stats"""
     conn = get_db_conn()
     
+    total_unpaid = conn.execute("SELECT COALESCE(SUM(due_amount), 0) as t FROM monthly_bills WHERE status='Unpaid'").fetchone()['t']
+    this_month_revenue = conn.execute("SELECT COALESCE(SUM(paid_amount), 0) as t FROM monthly_bills WHERE strftime('%Y-%m', bill_date) = strftime('%Y-%m', 'now')").fetchone()['t']
     stats = {
         'total_customers': conn.execute("SELECT COUNT(*) as c FROM customers WHERE status='Active'").fetchone()['c'],
-        'total_unpaid': conn.execute("SELECT COALESCE(SUM(due_amount), 0) as t FROM monthly_bills WHERE status='Unpaid'").fetchone()['t'],
+        'total_unpaid': float(money.to_rupees(total_unpaid)),
         'overdue_count': conn.execute("SELECT COUNT(*) as c FROM monthly_bills WHERE status='Unpaid' AND due_date < date('now')").fetchone()['c'],
-        'this_month_revenue': conn.execute("SELECT COALESCE(SUM(paid_amount), 0) as t FROM monthly_bills WHERE strftime('%Y-%m', bill_date) = strftime('%Y-%m', 'now')").fetchone()['t']
+        'this_month_revenue': float(money.to_rupees(this_month_revenue))
     }
     
     conn.close()
     return jsonify(stats)
-# Add after other imports
-from functools import wraps
-import hashlib
-
 # New route for alerts page
 @app.route('/alerts')
 @login_required
 def alerts():
     conn = get_db_conn()
-    customers = conn.execute("""
+    
+    risk_band = request.args.get('risk')
+    sort_by = request.args.get('sort', 'outstanding')
+    order_by = RISK_SORT_ORDERS.get(sort_by, RISK_SORT_ORDERS['outstanding'])
+    
+    risk_filter = ""
+    params = ()
+    if risk_band in RISK_BANDS:
+        risk_filter = "WHERE r.risk_band = ?"
+        params = (risk_band,)
+    
+    customers = conn.execute(f"""
         SELECT c.*, 
-               COALESCE(SUM(CASE WHEN b.status = 'Unpaid' THEN b.due_amount ELSE 0 END), 0) as outstanding_balance
+               COALESCE(SUM(CASE WHEN b.status = 'Unpaid' THEN b.due_amount ELSE 0 END), 0) as outstanding_balance,
+               r.reliability_score, r.risk_band
         FROM customers c
         LEFT JOIN monthly_bills b ON c.customer_id = b.customer_id
+        LEFT JOIN customer_risk r ON c.customer_id = r.customer_id
+        {risk_filter}
         GROUP BY c.customer_id
         HAVING outstanding_balance > 0
-        ORDER BY outstanding_balance DESC
-    """).fetchall()
+        ORDER BY {order_by}
+    """, params).fetchall()
     conn.close()
     
-    return render_template('alerts.html', active_page='alerts', customers=customers, format_currency=format_currency)
+    return render_template('alerts.html', active_page='alerts', customers=customers,
+                           risk_band=risk_band, sort_by=sort_by, format_money=format_money)
 
 # Generate AI alert emails
 @app.route('/generate-alert-emails', methods=['POST'])
@@ -1623,11 +1828,7 @@ def generate_alert_emails():
     """
     
     try:
-        response = requests.post(
-            f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash-exp:generateContent?key={api_key}",
-            json={"contents": [{"parts": [{"text": prompt}]}]},
-            timeout=30
-        )
+        response = gemini_generate(api_key, prompt)
         
         if response.status_code == 200:
             result = response.json()
@@ -1660,6 +1861,7 @@ def send_alert_emails():
     emails = data['emails']
     
     # Verify TOTP
+    import pyotp
     totp = pyotp.TOTP(app.config['TOTP_SECRET'])
     if not totp.verify(code, valid_window=1):
         return jsonify({'success': False, 'error': 'Invalid authentication code'})
@@ -1672,6 +1874,351 @@ def send_alert_emails():
     
     return jsonify({'success': True, 'sent': sent_count})
 
+# --- Library Routes (super_app.db) ---
+def flash_result(message):
+    """Flash a cli_logic/library_logic style 'Success: ...'/'Error: ...' message"""
+    if message.startswith('Success'):
+        flash(f'✅ {message}', 'success')
+    else:
+        flash(f'❌ {message}', 'error')
+
+@app.route('/library', methods=['GET', 'POST'])
+@login_required
+def library():
+    if request.method == 'POST':
+        flash_result(library_logic.add_book(
+            request.form['title'].strip(),
+            request.form['author'].strip(),
+            request.form.get('quantity', 0)
+        ))
+        return redirect(url_for('library'))
+    
+    query = request.args.get('q', '').strip()
+    page = request.args.get('page', 1, type=int)
+    catalog = library_logic.search_books(query, page)
+    overdue_totals, overdue_issues = library_logic.get_overdue_summary()
+    popular_window = request.args.get('window', 'week')
+    if popular_window not in popularity.WINDOWS:
+        popular_window = 'week'
+    
+    return render_template('library.html',
+                         active_page='library',
+                         books=catalog['books'],
+                         catalog=catalog,
+                         query=query,
+                         open_issues=library_logic.get_open_issues(),
+                         overdue_totals=overdue_totals,
+                         overdue_issues=overdue_issues,
+                         popular_books=library_logic.get_popular_books(popular_window),
+                         popular_window=popular_window,
+                         popular_windows=list(popularity.WINDOWS),
+                         format_currency=format_currency)
+
+@app.route('/library/search')
+@login_required
+def library_search():
+    """Paginated catalog search (also used for type-ahead with a small per_page)"""
+    result = library_logic.search_books(
+        request.args.get('q', ''),
+        request.args.get('page', 1, type=int),
+        request.args.get('per_page', library_logic.SEARCH_PAGE_SIZE, type=int)
+    )
+    return jsonify(result)
+
+@app.route('/library/popular')
+@login_required
+def library_popular():
+    """Top-K most issued books: ?window=week|month|term&k=10"""
+    window = request.args.get('window', 'week')
+    if window not in popularity.WINDOWS:
+        return jsonify({'error': f"Unknown window. Use one of: {', '.join(popularity.WINDOWS)}"}), 400
+    k = min(max(request.args.get('k', 10, type=int), 1), 100)
+    return jsonify({'window': window, 'books': library_logic.get_popular_books(window, k)})
+
+@app.route('/library/issue', methods=['POST'])
+@login_required
+def library_issue():
+    try:
+        book_id = int(request.form['book_id'])
+    except ValueError:
+        flash('❌ Error: Invalid argument. Expected a number.', 'error')
+        return redirect(url_for('library'))
+    flash_result(library_logic.issue_book(book_id, request.form['student_id'].strip()))
+    return redirect(url_for('library'))
+
+@app.route('/library/return', methods=['POST'])
+@login_required
+def library_return():
+    try:
+        book_id = int(request.form['book_id'])
+    except ValueError:
+        flash('❌ Error: Invalid argument. Expected a number.', 'error')
+        return redirect(url_for('library'))
+    flash_result(library_logic.return_book(book_id, request.form['student_id'].strip()))
+    return redirect(url_for('library'))
+
+@app.route('/library/scan-batch', methods=['POST'])
+@login_required
+def library_scan_batch():
+    """Apply a batch of desk scans: {"scans": [[book_id, student_id, action], ...]}"""
+    data = request.get_json(silent=True) or {}
+    scans = data.get('scans', []) if isinstance(data, dict) else None
+    if not isinstance(scans, list):
+        return jsonify({'error': 'Expected a JSON object with a "scans" list'}), 400
+    
+    # Accept objects as well as [book_id, student_id, action] triples
+    scans = [
+        (s.get('book_id'), s.get('student_id'), s.get('action')) if isinstance(s, dict) else s
+        for s in scans
+    ]
+    
+    results = library_logic.process_scans(scans)
+    ok = [r.startswith('Success') for r in results]
+    
+    return jsonify({
+        'processed': len(results),
+        'succeeded': sum(ok),
+        'failed': len(results) - sum(ok),
+        'results': [{'ok': success, 'message': message} for success, message in zip(ok, results)]
+    })
+
+# --- Canteen Routes (super_app.db) ---
+@app.route('/canteen', methods=['GET', 'POST'])
+@login_required
+def canteen():
+    if request.method == 'POST':
+        flash_result(canteen_logic.add_menu_item(
+            request.form['name'].strip(),
+            request.form.get('price', '')
+        ))
+        return redirect(url_for('canteen'))
+    
+    popular_window = request.args.get('window', 'week')
+    if popular_window not in popularity.WINDOWS:
+        popular_window = 'week'
+    
+    return render_template('canteen.html',
+                         active_page='canteen',
+                         menu_items=canteen_logic.get_menu_items(),
+                         recent_orders=canteen_logic.get_recent_orders(),
+                         popular_items=canteen_logic.get_popular_items(popular_window),
+                         popular_window=popular_window,
+                         popular_windows=list(popularity.WINDOWS),
+                         format_currency=format_currency)
+
+@app.route('/canteen/pos', methods=['POST'])
+@login_required
+def canteen_pos():
+    """Ring up one order: {"counter": "1", "student_id": "S1" (optional, pays from wallet), "lines": [{"item_id": 3, "quantity": 2}, ...]}"""
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict) or not isinstance(data.get('lines', []), list):
+        return jsonify({'ok': False, 'message': 'Error: Expected a JSON object with a "lines" list.'}), 400
+    
+    # Accept objects as well as [item_id, quantity] pairs
+    lines = [
+        (l.get('item_id'), l.get('quantity', 1)) if isinstance(l, dict) else l
+        for l in data.get('lines', [])
+    ]
+    
+    message, order = canteen_logic.place_order(lines, data.get('counter'), data.get('student_id'))
+    if message.startswith('Pending'):
+        return jsonify({'ok': False, 'pending': True, 'message': message}), 202
+    if order is None:
+        return jsonify({'ok': False, 'message': message}), 400
+    return jsonify({'ok': True, 'message': message, **order})
+
+@app.route('/canteen/popular')
+@login_required
+def canteen_popular():
+    """Top-K best-selling menu items: ?window=week|month|term&k=10"""
+    window = request.args.get('window', 'week')
+    if window not in popularity.WINDOWS:
+        return jsonify({'error': f"Unknown window. Use one of: {', '.join(popularity.WINDOWS)}"}), 400
+    k = min(max(request.args.get('k', 10, type=int), 1), 100)
+    return jsonify({'window': window, 'items': canteen_logic.get_popular_items(window, k)})
+
+# --- Student Wallet Routes (super_app.db) ---
+@app.route('/wallets', methods=['GET', 'POST'])
+@login_required
+def wallets():
+    if request.method == 'POST':
+        student_id = request.form['student_id'].strip()
+        flash_result(wallet_logic.top_up(student_id, request.form.get('amount', '')))
+        return redirect(url_for('wallets', student_id=student_id))
+    
+    student_id = request.args.get('student_id', '').strip()
+    wallet, ledger = wallet_logic.get_wallet(student_id) if student_id else (None, [])
+    
+    return render_template('wallets.html',
+                         active_page='wallets',
+                         student_id=student_id,
+                         wallet=wallet,
+                         ledger=ledger,
+                         format_money=format_money)
+
+@app.route('/wallets/<student_id>')
+@login_required
+def wallet_detail(student_id):
+    """Live balance and recent ledger entries for one wallet"""
+    wallet, ledger = wallet_logic.get_wallet(student_id)
+    if wallet is None:
+        return jsonify({'error': f"No wallet found for student {student_id}."}), 404
+    return jsonify({
+        'student_id': wallet['student_id'],
+        'balance': float(money.to_rupees(wallet['balance'])),
+        'updated_at': wallet['updated_at'],
+        'ledger': [{**entry, 'amount': float(money.to_rupees(entry['amount']))} for entry in map(dict, ledger)]
+    })
+
+@app.route('/library/pay-fines', methods=['POST'])
+@login_required
+def library_pay_fines():
+    flash_result(wallet_logic.pay_library_fines(request.form['student_id']))
+    return redirect(url_for('library'))
+
+# --- Analytics Routes (super_app.db rollups) ---
+@app.route('/analytics')
+@login_required
+def analytics():
+    """Charts are pre-rendered by the chart worker; this only looks up their URLs"""
+    charts.ensure_worker(app.config['SUPER_APP_DATABASE'], app.config['CHART_CACHE_DIR'])
+    
+    graphs = {}
+    pending = False
+    for name in charts.CHARTS:
+        version, status = charts.current_chart(name, app.config['SUPER_APP_DATABASE'], app.config['CHART_CACHE_DIR'])
+        if status == 'pending':
+            # Show the previous rendering (if any) until the new one is ready
+            pending = True
+            version = charts.latest_rendered(name, app.config['CHART_CACHE_DIR'])
+            status = 'ready' if version is not None else status
+        graphs[name] = url_for('analytics_chart', name=name, fmt='png', v=version) if status == 'ready' else None
+    if pending:
+        charts.request_render()
+    
+    overdue_totals, _ = library_logic.get_overdue_summary(limit=0)
+    
+    return render_template('analytics.html',
+                         active_page='analytics',
+                         graph_canteen=graphs['canteen'],
+                         graph_library=graphs['library'],
+                         charts_pending=pending,
+                         overdue_totals=overdue_totals,
+                         format_currency=format_currency)
+
+@app.route('/analytics/charts/<name>.<fmt>')
+@login_required
+def analytics_chart(name, fmt):
+    """
+    Serves a rendered chart. Versioned URLs (?v=...) are immutable and cached
+    for a year; unversioned ones redirect to the current version.
+    """
+    if name not in charts.CHARTS or fmt not in charts.FORMATS:
+        return jsonify({'error': 'Unknown chart'}), 404
+    
+    version = request.args.get('v')
+    if version is None:
+        version, status = charts.current_chart(name, app.config['SUPER_APP_DATABASE'], app.config['CHART_CACHE_DIR'])
+        if status != 'ready':
+            return jsonify({'error': 'Chart not rendered yet'}), 404
+        response = redirect(url_for('analytics_chart', name=name, fmt=fmt, v=version))
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    
+    etag = f'{name}-{version}.{fmt}'
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        chart = charts.open_chart(name, version, fmt, app.config['CHART_CACHE_DIR'])
+        if chart is None:
+            return jsonify({'error': 'Chart version not available'}), 404
+        response = send_file(chart, mimetype=charts.FORMATS[fmt])
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, max-age=31536000, immutable'
+    return response
+
+@app.route('/analytics/rollups')
+@login_required
+def analytics_rollups():
+    """
+    Date-range questions answered from the rollup tables:
+      ?dataset=canteen|library&start=YYYY-MM-DD&end=YYYY-MM-DD
+       &by=period (with grain=day|week|month, optional id=) or by=total (optional limit=)
+    """
+    dataset = request.args.get('dataset', 'canteen')
+    if dataset not in rollups.DATASETS:
+        return jsonify({'error': f"Unknown dataset. Use one of: {', '.join(rollups.DATASETS)}"}), 400
+    
+    today = datetime.now()
+    start = request.args.get('start', (today - timedelta(days=29)).strftime('%Y-%m-%d'))
+    end = request.args.get('end', today.strftime('%Y-%m-%d'))
+    try:
+        if datetime.strptime(start, '%Y-%m-%d') > datetime.strptime(end, '%Y-%m-%d'):
+            return jsonify({'error': 'start must not be after end'}), 400
+    except ValueError:
+        return jsonify({'error': 'Dates must be YYYY-MM-DD'}), 400
+    
+    if request.args.get('by', 'period') == 'total':
+        rows = rollups.totals(dataset, start, end, request.args.get('limit', type=int))
+        return jsonify({'dataset': dataset, 'start': start, 'end': end, 'totals': rows})
+    
+    grain = request.args.get('grain', 'day')
+    if grain not in rollups.GRAINS:
+        return jsonify({'error': f"Unknown grain. Use one of: {', '.join(rollups.GRAINS)}"}), 400
+    rows = rollups.series(dataset, start, end, grain, request.args.get('id', type=int))
+    return jsonify({'dataset': dataset, 'start': start, 'end': end, 'grain': grain, 'series': rows})
+
+
+@app.route('/reports/student-spend')
+@login_required
+def student_spend_report():
+    """
+    Canteen spend vs. outstanding fees per student, joined across
+    record_book.db and super_app.db:
+      ?start=YYYY-MM-DD&end=YYYY-MM-DD (default last 30 days), optional id= and limit=
+    """
+    default_start, default_end = student_accounts.default_range()
+    start = request.args.get('start', default_start)
+    end = request.args.get('end', default_end)
+    try:
+        if datetime.strptime(start, '%Y-%m-%d') > datetime.strptime(end, '%Y-%m-%d'):
+            return jsonify({'error': 'start must not be after end'}), 400
+    except ValueError:
+        return jsonify({'error': 'Dates must be YYYY-MM-DD'}), 400
+
+    rows = student_accounts.spend_vs_outstanding(
+        start, end, request.args.get('id', type=int), request.args.get('limit', 100, type=int),
+        app.config['DATABASE'], app.config['SUPER_APP_DATABASE']
+    )
+    return jsonify({'start': start, 'end': end, 'students': rows})
+
+@app.route('/admin/slow-queries')
+@login_required
+def admin_slow_queries():
+    """Slow statements from the slow-query log, grouped by query shape"""
+    groups = slow_queries.summarize(app.config['SLOW_QUERY_LOG'])
+    return render_template('slow_queries.html',
+                         active_page='slow_queries',
+                         groups=groups,
+                         threshold=slow_queries.threshold_ms())
+
+@app.route('/admin/profiles')
+@login_required
+def admin_profiles():
+    """Saved request profiles (see profiling.py), newest first"""
+    return render_template('profiles.html',
+                         active_page='profiles',
+                         profiles=profiling.list_profiles(app.config['PROFILE_DIR']))
+
+@app.route('/admin/profiles/<filename>')
+@login_required
+def admin_profile_file(filename):
+    """Serves one saved profile file: .prof for pstats, .folded for flamegraph tools, .txt summary"""
+    is_prof = filename.endswith('.prof')
+    return send_from_directory(os.path.abspath(app.config['PROFILE_DIR']), filename,
+                               mimetype='application/octet-stream' if is_prof else 'text/plain',
+                               as_attachment=is_prof)
+
 #########################################################################################
 # --- Add this new import at the top of app.py ---
 import cli_logic
@@ -1702,6 +2249,9 @@ def web_cli():
                     "  edit [id] [field] [new_value] - Edit customer details\n"
                     "  edit-trans [id] [field] [new_value] - Edit transaction details\n"
                     "  edit-bill [id] [field] [new_value] - Edit monthly bill details\n"
+                    "\n"
+                    "Batch mode: paste or upload a script of edit/edit-trans/edit-bill/toggle\n"
+                    "lines below to run them all in one transaction (with optional dry run).\n"
                 )
             
             elif cmd == 'list':
@@ -1719,8 +2269,7 @@ def web_cli():
                 customer = cli_logic.find_customer_by_email(email)
                 if customer:
                     output = "--- Customer Found ---\n"
-                    # Convert row to a simple dict to iterate
-                    output += json.dumps(dict(customer), indent=2)
+                    output += json.dumps(cli_logic.customer_for_display(customer), indent=2)
                 else:
                     output = f"No customer found with email: {email}"
             
@@ -1787,11 +2336,111 @@ def web_cli():
             output = f"An unexpected error occurred: {e}"
             
     return render_template('web_cli.html', output=output, active_page='web-cli')
+
+@app.route('/web-cli/batch', methods=['POST'])
+@login_required
+def web_cli_batch():
+    """Run a pasted or uploaded script in one transaction, then stream its output line by line"""
+    script_text = request.form.get('script', '')
+    
+    uploaded = request.files.get('script_file')
+    if uploaded and uploaded.filename:
+        script_text = uploaded.read().decode('utf-8', errors='replace')
+    
+    dry_run = request.form.get('dry_run') in ('1', 'on', 'true')
+    
+    return Response(
+        stream_with_context(cli_logic.run_batch_script(script_text, dry_run=dry_run)),
+        mimetype='text/plain'
+    )
 #########################################################################################
 
+# --- App Factory & Startup ---
+# Held by the one process that runs the background jobs (see leader.py)
+app.config['BACKGROUND_LOCK_FILE'] = leader.LOCK_FILE
+
+
+def create_app(config=None):
+    """
+    Applies config overrides and points the logic modules at the configured
+    databases. Returns the app. Does no I/O, so it is safe in every worker.
+    """
+    if config:
+        app.config.update(config)
+    cli_logic.DB_FILE = app.config['DATABASE']
+    library_logic.DB_FILE = app.config['SUPER_APP_DATABASE']
+    canteen_logic.DB_FILE = app.config['SUPER_APP_DATABASE']
+    wallet_logic.DB_FILE = app.config['SUPER_APP_DATABASE']
+    rollups.DB_FILE = app.config['SUPER_APP_DATABASE']
+    return app
+
+
+def initialize_app():
+    """
+    One-time startup work: creates or migrates both databases. Run once
+    before the workers start (serve.py does this in the master process),
+    then close the pools with db.close_all() if the process will fork.
+    """
+    initialize_database(app.config['DATABASE'])
+    library_logic.initialize_library_schema()
+    canteen_logic.initialize_canteen_schema()
+    wallet_logic.initialize_wallet_schema()
+
+
+def background_notifier():
+    """Hourly notification checks plus the nightly risk, fines and wallet jobs. Never returns."""
+    while True:
+        time.sleep(3600)  # Check every hour
+        try:
+            check_overdue_payments()
+        except Exception as e:
+            print(f"Overdue reminders error: {e}")
+        try:
+            check_credit_limit_exceeded()
+        except Exception as e:
+            print(f"Credit limit alerts error: {e}")
+        
+        # Nightly risk scoring (first hourly tick of each new day)
+        try:
+            if risk_scoring.last_scored_date(app.config['DATABASE']) != datetime.now().strftime('%Y-%m-%d'):
+                risk_scoring.run_risk_scoring(app.config['DATABASE'])
+        except Exception as e:
+            print(f"Risk scoring error: {e}")
+        
+        # Nightly library overdue/fines summary
+        try:
+            if library_fines.last_computed_date(app.config['SUPER_APP_DATABASE']) != datetime.now().strftime('%Y-%m-%d'):
+                library_fines.run_overdue_fines(app.config['SUPER_APP_DATABASE'])
+        except Exception as e:
+            print(f"Library fines error: {e}")
+        
+        # Nightly wallet balance snapshot
+        try:
+            if wallet_logic.last_snapshot_date() != datetime.now().strftime('%Y-%m-%d'):
+                wallet_logic.snapshot_wallets()
+        except Exception as e:
+            print(f"Wallet snapshot error: {e}")
+
+
+def start_worker_services():
+    """
+    Per-process startup, run in each worker after it is forked: installs
+    the slow-query log, warms the popularity counters and starts the chart
+    worker. The background notifier starts too but only runs in the worker
+    holding the leader lock.
+    """
+    slow_queries.install(app.config['SLOW_QUERY_LOG'])
+    popularity.load_from_rollups(app.config['SUPER_APP_DATABASE'])
+    charts.ensure_worker(app.config['SUPER_APP_DATABASE'], app.config['CHART_CACHE_DIR'])
+    leader.run_as_leader(background_notifier, app.config['BACKGROUND_LOCK_FILE'], name="background-notifier")
+
+
 # --- Main Execution ---
+# Development server only; run serve.py in production.
 if __name__ == "__main__":
-    initialize_database(app.config['DATABASE'])
+    create_app()
+    initialize_app()
+    start_worker_services()
     print("\n" + "="*50)
     print("🚀 Indian Record Book System Starting...")
     print("="*50)
@@ -1800,16 +2449,4 @@ if __name__ == "__main__":
     print(f"🔑 Login: http://127.0.0.1:5000/login")
     print("="*50 + "\n")
     
-    # Start background task for periodic notification checks
-    def background_notifier():
-        while True:
-            time.sleep(3600)  # Check every hour
-            try:
-                check_overdue_payments()
-                check_credit_limit_exceeded()
-            except Exception as e:
-                print(f"Background task error: {e}")
-    
-    Thread(target=background_notifier, daemon=True).start()
-    
     app.run(debug=True, host='0.0.0.0', port=5000)
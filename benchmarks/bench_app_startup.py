@@ -0,0 +1,102 @@
+"""
+Cold-start benchmark for the Flask app (app.py).
+
+In fresh interpreters it measures:
+  * `import app` self/cumulative time from `python -X importtime`,
+  * wall time to import the app and serve the first request (GET /login)
+    through the Flask test client.
+
+It prints the slowest imports and fails if the heavy optional libraries
+are imported at module load or a budget is exceeded.
+
+Usage:  python benchmarks/bench_app_startup.py [--runs 5] [--import-budget-ms 400] [--first-request-budget-ms 600]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Libraries that must only be imported by the routes that need them.
+LAZY_MODULES = ('pandas', 'numpy', 'matplotlib', 'qrcode', 'PIL', 'pyotp', 'requests')
+
+FIRST_REQUEST_SCRIPT = """
+import sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+response = app.app.test_client().get('/login')
+served = time.perf_counter()
+assert response.status_code == 200, response.status_code
+print((imported - start) * 1000, (served - start) * 1000)
+print(','.join(sorted(m for m in {lazy!r} if m in sys.modules)))
+"""
+
+
+def parse_importtime(stderr):
+    """Returns [(module, depth, cumulative_us)] from -X importtime output."""
+    timings = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue  # header line
+        raw_name = fields[2].rstrip()
+        depth = (len(raw_name) - len(raw_name.lstrip())) // 2
+        timings.append((raw_name.strip(), depth, int(fields[1])))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--import-budget-ms', type=float, default=400.0)
+    parser.add_argument('--first-request-budget-ms', type=float, default=600.0)
+    args = parser.parse_args()
+
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'],
+                            cwd=REPO_ROOT, capture_output=True, text=True, check=True)
+    timings = parse_importtime(result.stderr)
+    app_cumulative_ms = next((us for name, _, us in timings if name == 'app'), 0) / 1000
+
+    # Direct imports of app.py are one level below 'app' itself
+    print("Slowest imports made by app.py (cumulative):")
+    direct = [(name, us) for name, depth, us in timings if depth == 1]
+    for name, cumulative_us in sorted(direct, key=lambda item: -item[1])[:10]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+
+    import_ms, first_request_ms, leaked = [], [], set()
+    script = FIRST_REQUEST_SCRIPT.format(lazy=LAZY_MODULES)
+    for _ in range(args.runs):
+        out = subprocess.run([sys.executable, '-c', script], cwd=REPO_ROOT,
+                             capture_output=True, text=True, check=True).stdout.splitlines()
+        imported, served = (float(v) for v in out[0].split())
+        import_ms.append(imported)
+        first_request_ms.append(served)
+        leaked.update(m for m in out[1].split(',') if m)
+
+    print(f"import app (importtime)   : {app_cumulative_ms:7.1f} ms")
+    print(f"import app (wall, median) : {statistics.median(import_ms):7.1f} ms (budget {args.import_budget_ms:.0f} ms)")
+    print(f"first request (median)    : {statistics.median(first_request_ms):7.1f} ms (budget {args.first_request_budget_ms:.0f} ms)")
+
+    failed = False
+    if leaked:
+        print(f"FAIL: imported at startup: {', '.join(sorted(leaked))}")
+        failed = True
+    if statistics.median(import_ms) > args.import_budget_ms:
+        print("FAIL: app import is over budget")
+        failed = True
+    if statistics.median(first_request_ms) > args.first_request_budget_ms:
+        print("FAIL: first request is over budget")
+        failed = True
+
+    if not failed:
+        print("OK")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
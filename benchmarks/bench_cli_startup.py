@@ -0,0 +1,78 @@
+"""
+Startup-time benchmark for the standalone CLI (cli.py).
+
+Runs `python -m cli --help` in fresh interpreters, reports the median
+wall time against a bare interpreter, and fails if the CLI imports any
+of the web/analytics stack or exceeds the startup budget.
+
+Usage:  python benchmarks/bench_cli_startup.py [--runs 20] [--budget-ms 60]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules the CLI must never pull in.
+FORBIDDEN_MODULES = ('flask', 'pandas', 'numpy', 'matplotlib', 'qrcode', 'PIL', 'pyotp', 'requests', 'app')
+
+
+def time_command(cmd, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(cmd, cwd=REPO_ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def imported_modules():
+    """Returns top-level module names imported by `import cli`, via -X importtime."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import cli'],
+        cwd=REPO_ROOT, capture_output=True, text=True, check=True
+    )
+    modules = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        name = line.rsplit('|', 1)[1].strip()
+        if name and not name.startswith('package'):
+            modules.add(name.split('.')[0])
+    return modules
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--budget-ms', type=float, default=60.0,
+                        help="maximum CLI startup time on top of a bare interpreter")
+    args = parser.parse_args()
+
+    bare_ms = time_command([sys.executable, '-c', 'pass'], args.runs)
+    cli_ms = time_command([sys.executable, '-m', 'cli', '--help'], args.runs)
+    overhead_ms = cli_ms - bare_ms
+
+    print(f"bare interpreter : {bare_ms:7.1f} ms")
+    print(f"python -m cli    : {cli_ms:7.1f} ms")
+    print(f"cli overhead     : {overhead_ms:7.1f} ms (budget {args.budget_ms:.0f} ms)")
+
+    leaked = sorted(set(FORBIDDEN_MODULES) & imported_modules())
+    failed = False
+    if leaked:
+        print(f"FAIL: cli imports the web stack: {', '.join(leaked)}")
+        failed = True
+    if overhead_ms > args.budget_ms:
+        print("FAIL: cli startup is over budget")
+        failed = True
+
+    if not failed:
+        print("OK")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+"""
+ATTACH join vs. application-side join for cross-database reports.
+
+Builds a temporary record_book.db (customers, monthly_bills) and
+super_app.db (canteen_orders, wallets, library fines), then times the
+"canteen spend vs. outstanding fees" report two ways:
+
+  attach  student_accounts.spend_vs_outstanding: one query on a
+          record_book.db connection with super_app.db ATTACHed
+  app     one aggregate query per database over two pooled connections,
+          merged in Python dicts
+
+Both must return the same rows. Reports median and best time per run.
+
+Usage:  python benchmarks/bench_cross_db.py [--customers 5000] [--orders 200000] [--runs 10]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as record_book_app
+import canteen_logic
+import db
+import library_logic
+import student_accounts
+import wallet_logic
+
+
+def build(record_book_db, super_app_db, customers, orders, rng):
+    record_book_app.initialize_database(record_book_db)
+    library_logic.initialize_library_schema(super_app_db)
+    canteen_logic.initialize_canteen_schema(super_app_db)
+    wallet_logic.initialize_wallet_schema(super_app_db)
+
+    today = datetime.now()
+    with db.transaction(record_book_db, foreign_keys=False) as conn:
+        conn.executemany(
+            "INSERT INTO customers (name, email, phone, registration_date) VALUES (?, ?, ?, ?)",
+            [(f"Student {i}", f"student{i}@example.com", "0000000000", "2024-01-01") for i in range(customers)]
+        )
+        bills = []
+        for customer_id in range(1, customers + 1):
+            for month in range(rng.randint(0, 6)):
+                total = rng.randint(500, 5000) * 100
+                paid = rng.choice((0, 0, total // 2, total))
+                bills.append((customer_id, f"B-{customer_id}-{month}", f"2024-{month + 1:02d}", total, total,
+                              paid, total - paid, "2024-01-01", "2024-02-01",
+                              'Paid' if paid == total else 'Unpaid'))
+        conn.executemany("""
+            INSERT INTO monthly_bills (customer_id, bill_number, bill_month, subtotal, total_amount,
+                                       paid_amount, due_amount, bill_date, due_date, status)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, bills)
+
+    with db.transaction(super_app_db) as conn:
+        conn.executemany(
+            "INSERT INTO canteen_orders (counter, student_id, total_price, created_at) VALUES (?, ?, ?, ?)",
+            [("1", str(rng.randint(1, customers * 2)), rng.randint(10, 200),
+              (today - timedelta(days=rng.randint(0, 90), seconds=rng.randint(0, 86399))).strftime('%Y-%m-%d %H:%M:%S'))
+             for _ in range(orders)]
+        )
+        conn.executemany(
+            "INSERT INTO wallets (student_id, balance, updated_at) VALUES (?, ?, ?)",
+            [(str(i), rng.randint(0, 1000) * 100, "2024-01-01 00:00:00") for i in range(1, customers + 1, 3)]
+        )
+        conn.executemany("""
+            INSERT INTO library_overdue (issue_id, book_id, student_id, title, due_date, days_overdue, fine, computed_on)
+            VALUES (?, 1, ?, 'Book', '2024-01-01', 10, ?, '2024-01-11')
+        """, [(i, str(rng.randint(1, customers)), 20) for i in range(customers // 4)])
+
+
+def app_side_join(start, end, record_book_db, super_app_db):
+    """The same report without ATTACH: per-database aggregates merged in Python."""
+    with db.get_pool(super_app_db).connection() as conn:
+        spend = {row[0]: (row[1], row[2]) for row in conn.execute("""
+            SELECT student_id, SUM(total_price), COUNT(*) FROM canteen_orders
+            WHERE student_id IS NOT NULL AND created_at >= ? AND created_at < date(?, '+1 day')
+            GROUP BY student_id
+        """, (start, end))}
+        fines = {row[0]: row[1] for row in conn.execute("""
+            SELECT o.student_id,
+                   SUM(o.fine - COALESCE((SELECT SUM(p.amount) FROM library_fine_payments p
+                                          WHERE p.issue_id = o.issue_id), 0))
+            FROM library_overdue o GROUP BY o.student_id
+        """)}
+        wallets = {row[0]: row[1] for row in conn.execute("SELECT student_id, balance FROM wallets")}
+
+    with db.get_pool(record_book_db, foreign_keys=False).connection() as conn:
+        fees = {row[0]: (row[1], row[2]) for row in conn.execute("""
+            SELECT customer_id, SUM(due_amount), COUNT(*) FROM monthly_bills
+            WHERE status = 'Unpaid' AND due_amount > 0 GROUP BY customer_id
+        """)}
+        customers = conn.execute("SELECT customer_id, name FROM customers").fetchall()
+
+    rows = []
+    for customer_id, name in customers:
+        student_id = str(customer_id)
+        if customer_id not in fees and student_id not in spend:
+            continue
+        outstanding, unpaid_bills = fees.get(customer_id, (0, 0))
+        canteen_spend, canteen_orders = spend.get(student_id, (0, 0))
+        rows.append({
+            'customer_id': customer_id, 'name': name,
+            'outstanding': round(outstanding / 100, 2), 'unpaid_bills': unpaid_bills,
+            'canteen_spend': round(canteen_spend, 2), 'canteen_orders': canteen_orders,
+            'library_fines': round(fines.get(student_id) or 0, 2),
+            'wallet_balance': round(wallets[student_id] / 100, 2) if student_id in wallets else None,
+        })
+    rows.sort(key=lambda r: (-r['outstanding'], -r['canteen_spend'], r['customer_id']))
+    return rows
+
+
+def time_runs(fn, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return result, times
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--customers', type=int, default=5000)
+    parser.add_argument('--orders', type=int, default=200000)
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        record_book_db = os.path.join(tmp, 'record_book.db')
+        super_app_db = os.path.join(tmp, 'super_app.db')
+        build(record_book_db, super_app_db, args.customers, args.orders, random.Random(7))
+        start, end = student_accounts.default_range()
+
+        attach_rows, attach_times = time_runs(
+            lambda: student_accounts.spend_vs_outstanding(start, end, record_book_db=record_book_db,
+                                                          super_app_db=super_app_db), args.runs)
+        app_rows, app_times = time_runs(lambda: app_side_join(start, end, record_book_db, super_app_db), args.runs)
+        db.close_all()
+
+    print(f"{args.customers} customers, {args.orders} canteen orders, {len(attach_rows)} report rows")
+    for label, times in (('attach', attach_times), ('app', app_times)):
+        print(f"{label:>6}: median {statistics.median(times) * 1000:.1f} ms, best {min(times) * 1000:.1f} ms")
+    if attach_rows != app_rows:
+        print("MISMATCH: ATTACH join and application-side join disagree")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
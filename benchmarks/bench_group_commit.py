@@ -0,0 +1,108 @@
+"""
+Commits/second for record_book.db writes with and without group commit.
+
+Many threads post transactions through app.record_book_write(), first
+with GROUP_COMMIT off (each write its own BEGIN IMMEDIATE ... COMMIT)
+and then on (the writer batches them, lingering up to
+GROUP_COMMIT_MAX_DELAY_MS). Reports writes/s, SQLite commits/s, write
+latency and "database is locked" failures for each mode, and checks
+that every acknowledged write is in the table.
+
+Usage:  python benchmarks/bench_group_commit.py [--threads 32] [--writes 200] [--max-delay-ms 5]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as record_book_app
+import db
+import group_commit
+import metrics
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def run(db_path, threads, writes):
+    latencies = [[] for _ in range(threads)]
+    failures = [[] for _ in range(threads)]
+    barrier = threading.Barrier(threads + 1)
+
+    def worker(index):
+        barrier.wait()
+        for n in range(writes):
+            values = (1 + (index + n) % 50, 'Sale/Credit', 10000, 1800, 11800, f"bench {index}-{n}",
+                      '2026-01-01', '2026-01-31', 'Unpaid', '', '')
+            start = time.perf_counter()
+            try:
+                record_book_app.record_book_write(record_book_app._insert_transaction, values)
+            except Exception as e:
+                failures[index].append(metrics.error_kind(e))
+            else:
+                latencies[index].append(time.perf_counter() - start)
+
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for t in pool:
+        t.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for t in pool:
+        t.join()
+    return time.perf_counter() - start, [x for per in latencies for x in per], [x for per in failures for x in per]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--writes', type=int, default=200, help="writes per thread")
+    parser.add_argument('--max-delay-ms', type=float, default=group_commit.DEFAULT_GROUP_COMMIT_DELAY_MS)
+    args = parser.parse_args()
+
+    commits = [0]
+
+    def count_commits(statement):
+        if statement.strip().upper().startswith('COMMIT'):
+            commits[0] += 1
+
+    db.add_connect_hook(lambda conn: conn.set_trace_callback(count_commits))
+    os.environ['GROUP_COMMIT_MAX_DELAY_MS'] = str(args.max_delay_ms)
+
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in ('off', 'on'):
+            db_path = os.path.join(tmp, f"record_book_{mode}.db")
+            record_book_app.initialize_database(db_path)
+            record_book_app.app.config['DATABASE'] = db_path
+            db.get_pool(db_path, foreign_keys=False).size = args.threads + 2
+            os.environ['GROUP_COMMIT'] = '1' if mode == 'on' else ''
+            commits[0] = 0
+
+            elapsed, latencies, failures = run(db_path, args.threads, args.writes)
+            if mode == 'on':
+                group_commit.get_writer(db_path, foreign_keys=False).close()
+            with db.get_pool(db_path, foreign_keys=False).connection() as conn:
+                stored = conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+
+            ok = len(latencies)
+            print(f"group commit {mode:<3}: {ok} writes in {elapsed:.2f} s -> {ok / elapsed:8.0f} writes/s, "
+                  f"{commits[0] / elapsed:7.0f} commits/s, p50 {percentile(latencies, 0.5) * 1000:6.1f} ms, "
+                  f"p99 {percentile(latencies, 0.99) * 1000:7.1f} ms, "
+                  f"locked {failures.count('locked')}, other errors {failures.count('other')}")
+            if stored != ok:
+                print(f"FAIL: {ok} writes acknowledged but {stored} rows stored")
+                failed = True
+            db.get_pool(db_path, foreign_keys=False).close_all()
+
+    print("FAIL" if failed else "OK")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,64 @@
+"""
+Throughput benchmark for library_logic.process_scans (batch desk scans).
+
+Builds a temporary super_app.db with a catalog, then pushes a term-start
+wave of check-outs followed by a term-end wave of returns through the
+batch path and reports scans/second.
+
+Usage:  python benchmarks/bench_library_scans.py [--books 2000] [--students 5000] [--scans 50000] [--batch 500]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+import library_logic
+
+
+def run_wave(scans, batch_size):
+    start = time.perf_counter()
+    succeeded = 0
+    for offset in range(0, len(scans), batch_size):
+        results = library_logic.process_scans(scans[offset:offset + batch_size])
+        succeeded += sum(1 for r in results if r.startswith("Success"))
+    return time.perf_counter() - start, succeeded
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--books', type=int, default=2000)
+    parser.add_argument('--students', type=int, default=5000)
+    parser.add_argument('--scans', type=int, default=50000)
+    parser.add_argument('--batch', type=int, default=500)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    with tempfile.TemporaryDirectory() as tmp:
+        library_logic.DB_FILE = os.path.join(tmp, 'super_app.db')
+        library_logic.initialize_library_schema()
+        with db.transaction(library_logic.DB_FILE) as conn:
+            conn.executemany(
+                "INSERT INTO books (title, author, quantity) VALUES (?, ?, ?)",
+                [(f"Title {i}", f"Author {i % 300}", 30) for i in range(args.books)]
+            )
+
+        checkouts = [(rng.randint(1, args.books), f"S{rng.randint(1, args.students):05d}", 'issue')
+                     for _ in range(args.scans)]
+        returns = [(book_id, student_id, 'return') for book_id, student_id, _ in checkouts]
+        rng.shuffle(returns)
+
+        for label, scans in (("check-out", checkouts), ("check-in", returns)):
+            elapsed, succeeded = run_wave(scans, args.batch)
+            print(f"{label:9}: {len(scans)} scans in {elapsed:6.2f} s -> "
+                  f"{len(scans) / elapsed:9.0f} scans/s ({succeeded} applied, batch={args.batch})")
+
+        db.get_pool(library_logic.DB_FILE).close_all()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Peak-memory check for the big-account pages.
+
+Builds a temporary record_book.db at growing sizes, with one customer
+holding most of the transactions and bills, and measures the peak
+traced memory (tracemalloc) of /bills, /customer/<id> and
+/export-ledger/<id> through the Flask test client. The export is read
+chunk by chunk, the way a server streams it.
+
+Fails if any route's peak at the largest size exceeds --max-growth
+times its peak at the smallest size (plus 1 MB of slack), or its
+memory_budget.py budget.
+
+Usage:  python benchmarks/bench_memory.py [--sizes 1000,10000,50000] [--max-growth 2]
+"""
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as record_book_app
+import cli_logic
+import db
+import memory_budget
+
+BIG_CUSTOMER = 1
+SLACK_BYTES = 1024 * 1024
+
+ROUTES = [
+    ('/bills', '/bills'),
+    ('/customer/<int:customer_id>', f'/customer/{BIG_CUSTOMER}'),
+    ('/export-ledger/<int:customer_id>', f'/export-ledger/{BIG_CUSTOMER}'),
+]
+
+
+def build(db_path, rows):
+    record_book_app.initialize_database(db_path)
+    with db.transaction(db_path, foreign_keys=False) as conn:
+        conn.executemany(
+            "INSERT INTO customers (name, email, phone, registration_date) VALUES (?, ?, ?, ?)",
+            [(f"Customer {i}", f"customer{i}@example.com", "0000000000", "2024-01-01") for i in range(50)]
+        )
+        conn.executemany("""
+            INSERT INTO transactions (customer_id, transaction_type, amount, tax_amount, total_amount,
+                                      description, transaction_date, due_date, status)
+            VALUES (?, 'Sale', 10000, 1800, 11800, ?, ?, ?, 'Unpaid')
+        """, [(BIG_CUSTOMER if i % 10 else 1 + i % 50, f"Order {i} " + "x" * 40,
+               f"2024-{1 + i % 12:02d}-{1 + i % 28:02d}", "2024-12-31") for i in range(rows)])
+        conn.executemany("""
+            INSERT INTO monthly_bills (customer_id, bill_number, bill_month, subtotal, total_amount,
+                                       paid_amount, due_amount, bill_date, due_date, status)
+            VALUES (?, ?, '2024-01', 100000, 118000, 0, 118000, ?, '2024-02-01', 'Unpaid')
+        """, [(BIG_CUSTOMER if i % 10 else 1 + i % 50, f"INV{i:08d}",
+               f"2024-{1 + i % 12:02d}-{1 + i % 28:02d}") for i in range(rows)])
+
+
+def measure(client, url):
+    """Peak traced bytes while requesting url and reading its body chunk by chunk."""
+    gc.collect()
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    baseline = tracemalloc.get_traced_memory()[0]
+    response = client.get(url, buffered=False)
+    size = 0
+    for chunk in response.response:
+        size += len(chunk)
+    response.close()
+    peak = tracemalloc.get_traced_memory()[1] - baseline
+    tracemalloc.stop()
+    return response.status_code, size, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='1000,10000,50000', help="transactions and bills per run")
+    parser.add_argument('--max-growth', type=float, default=2.0)
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(',')]
+
+    results = {route: [] for route, _ in ROUTES}
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in sizes:
+            db_path = os.path.join(tmp, f"record_book_{rows}.db")
+            build(db_path, rows)
+            record_book_app.app.config['DATABASE'] = db_path
+            cli_logic.DB_FILE = db_path  # the ledger export reads through cli_logic
+            client = record_book_app.app.test_client()
+            with client.session_transaction() as session:
+                session['logged_in'] = True
+            for route, url in ROUTES:
+                measure(client, url)  # warm up templates and caches
+                status, size, peak = measure(client, url)
+                results[route].append(peak)
+                print(f"{rows:>8} rows  {route:<36} {status}  {size / 1024:8.0f} KB body  "
+                      f"peak {peak / 1024 / 1024:7.2f} MB")
+        db.close_all()
+
+    failures = []
+    for route, peaks in results.items():
+        bound = peaks[0] * args.max_growth + SLACK_BYTES
+        if peaks[-1] > bound:
+            failures.append(f"{route}: {peaks[-1] / 1024 / 1024:.2f} MB at {sizes[-1]} rows, "
+                            f"bound {bound / 1024 / 1024:.2f} MB")
+        budget = memory_budget.budget_mb(route) * 1024 * 1024
+        if max(peaks) > budget:
+            failures.append(f"{route}: {max(peaks) / 1024 / 1024:.2f} MB over its {budget / 1024 / 1024:.0f} MB budget")
+    for failure in failures:
+        print("FAIL " + failure)
+    print("OK" if not failures else f"{len(failures)} failure(s)")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,279 @@
+"""
+REAL rupees vs. integer paise for the record book's money aggregates.
+
+Builds a monthly_bills table the way it was before money.py (REAL
+rupees), copies it and migrates the copy with app.initialize_database()
+(money.migrate_to_paise), then on both:
+
+  times     the aggregates behind the dashboard, the customer list and
+            the notifiers, and formatting every per-customer result
+  checks    that totals reconcile: grand totals against the exact sum of
+            the generated amounts, billed - paid = due, per-customer
+            outstanding adding up to the total unpaid, and subtotal + tax
+            = total on every bill
+  refuses   that the migration stops, converting nothing, when a bill
+            holds an amount too large for integer paise (instead of
+            writing a clamped 2**63 - 1 that later overflows SUM)
+
+The paise database must reconcile exactly; the REAL one is reported for
+comparison (its drift is why amounts moved to paise).
+
+With --database, only runs the reconciliation checks against an existing
+record_book.db (for one still in REAL rupees, also lists the amounts the
+migration would refuse).
+
+Usage:  python benchmarks/bench_money.py [--bills 500000] [--customers 5000] [--runs 10]
+        python benchmarks/bench_money.py --database record_book.db
+"""
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as record_book_app
+import money
+
+# monthly_bills and its indexes as created before amounts moved to integer paise
+LEGACY_BILLS_TABLE = """
+    CREATE TABLE monthly_bills (
+        bill_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        customer_id INTEGER,
+        bill_number TEXT UNIQUE NOT NULL,
+        bill_month TEXT NOT NULL,
+        subtotal REAL NOT NULL,
+        tax_amount REAL DEFAULT 0,
+        total_amount REAL NOT NULL,
+        paid_amount REAL DEFAULT 0,
+        due_amount REAL NOT NULL,
+        bill_date TEXT NOT NULL,
+        due_date TEXT NOT NULL,
+        status TEXT DEFAULT 'Unpaid',
+        sent_date TEXT,
+        last_reminder_date TEXT,
+        reminder_count INTEGER DEFAULT 0
+    );
+    CREATE INDEX idx_monthly_bills_bill_date ON monthly_bills (bill_date);
+    CREATE INDEX idx_monthly_bills_customer_date ON monthly_bills (customer_id, bill_date);
+"""
+
+MONTH = '2025-06'
+
+QUERIES = {
+    'total unpaid': "SELECT COALESCE(SUM(due_amount), 0) FROM monthly_bills WHERE status = 'Unpaid'",
+    'month revenue': f"SELECT COALESCE(SUM(paid_amount), 0) FROM monthly_bills WHERE strftime('%Y-%m', bill_date) = '{MONTH}'",
+    'billed/paid/due': "SELECT SUM(total_amount), SUM(paid_amount), SUM(due_amount) FROM monthly_bills",
+    'outstanding by customer': """
+        SELECT customer_id, COALESCE(SUM(CASE WHEN status = 'Unpaid' THEN due_amount ELSE 0 END), 0)
+        FROM monthly_bills GROUP BY customer_id
+    """,
+}
+
+
+def generate_bills(bills, customers, rng):
+    """Bills as tuples with amounts in integer paise."""
+    for k in range(bills):
+        subtotal = rng.randint(100, 2_000_000)
+        tax = money.percent_of(subtotal, 18)
+        total = subtotal + tax
+        paid = rng.choice((0, total, total, rng.randint(0, total)))
+        year, month = divmod(2023 * 12 + k % 36, 12)
+        bill_date = f"{year}-{month + 1:02d}-01"
+        yield (1 + k % customers, f"INV{k:08d}", bill_date[:7], subtotal, tax, total, paid, total - paid,
+               bill_date, bill_date, 'Paid' if paid == total else 'Unpaid')
+
+
+def build(legacy_db, paise_db, bills, customers, rng):
+    """Writes the same bills as REAL rupees to legacy_db and migrates a copy to paise_db. Returns the bills."""
+    rows = list(generate_bills(bills, customers, rng))
+    conn = sqlite3.connect(legacy_db)
+    conn.executescript(LEGACY_BILLS_TABLE)
+    conn.executemany("""
+        INSERT INTO monthly_bills (customer_id, bill_number, bill_month, subtotal, tax_amount, total_amount,
+                                   paid_amount, due_amount, bill_date, due_date, status)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, [row[:3] + tuple(amount / 100 for amount in row[3:8]) + row[8:] for row in rows])
+    conn.commit()
+    conn.close()
+
+    shutil.copyfile(legacy_db, paise_db)
+    start = time.perf_counter()
+    record_book_app.initialize_database(paise_db)
+    print(f"migrated {bills} bills to paise in {time.perf_counter() - start:.2f} s")
+    return rows
+
+
+def time_query(conn, sql, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = conn.execute(sql).fetchall()
+        times.append(time.perf_counter() - start)
+    return result, times
+
+
+def time_formatting(rows, format_amount, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        for _, amount in rows:
+            format_amount(amount)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def reconcile(conn, expected=None, unit=1):
+    """
+    Returns a list of reconciliation failures (empty if the books balance).
+    expected is {column: exact total in paise} when the true totals are
+    known; unit is how many paise one stored unit is (100 for REAL rupees).
+    """
+    failures = []
+    try:
+        return _reconcile(conn, failures, expected, unit)
+    except sqlite3.OperationalError as e:
+        # e.g. "integer overflow": the aggregates behind the dashboard cannot run at all
+        return failures + [f"aggregate failed: {e}"]
+
+
+def _reconcile(conn, failures, expected, unit):
+    billed, paid, due = conn.execute(QUERIES['billed/paid/due']).fetchone()
+    totals = {'total_amount': billed or 0, 'paid_amount': paid or 0, 'due_amount': due or 0}
+    for column, exact in (expected or {}).items():
+        if totals[column] != exact / unit:
+            failures.append(f"SUM({column}) = {totals[column]!r}, expected exactly {money.format_paise(exact)}")
+    if totals['total_amount'] - totals['paid_amount'] != totals['due_amount']:
+        failures.append(f"billed - paid = {totals['total_amount'] - totals['paid_amount']!r}, "
+                        f"but SUM(due_amount) = {totals['due_amount']!r}")
+
+    unpaid = conn.execute(QUERIES['total unpaid']).fetchone()[0]
+    by_customer = sum(row[1] for row in conn.execute(QUERIES['outstanding by customer']))
+    if by_customer != unpaid:
+        failures.append(f"per-customer outstanding adds up to {by_customer!r}, total unpaid is {unpaid!r}")
+
+    mismatched = conn.execute(
+        "SELECT COUNT(*) FROM monthly_bills WHERE subtotal + tax_amount != total_amount"
+        " OR total_amount - paid_amount != due_amount"
+    ).fetchone()[0]
+    if mismatched:
+        failures.append(f"{mismatched} bill(s) where subtotal + tax != total or total - paid != due")
+    return failures
+
+
+def check_database(path):
+    conn = sqlite3.connect(path)
+    try:
+        stored_as = {row[0] for row in conn.execute(
+            "SELECT DISTINCT typeof(total_amount) FROM monthly_bills "
+            "UNION SELECT DISTINCT typeof(due_amount) FROM monthly_bills "
+            "UNION SELECT DISTINCT typeof(paid_amount) FROM monthly_bills")}
+        failures = reconcile(conn)
+        unconvertible = money.out_of_range_amounts(conn.cursor())
+    finally:
+        conn.close()
+    if stored_as - {'integer'}:
+        failures.append(f"amounts stored as {', '.join(sorted(stored_as))}, not integer paise")
+    if unconvertible:
+        failures.append(str(money.AmountOutOfRange(unconvertible)))
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    print("FAIL" if failures else "OK: books reconcile exactly")
+    return 1 if failures else 0
+
+
+def check_refuses_out_of_range(legacy_db, tmp):
+    """
+    Adds a bill worth 1e36 rupees to a copy of the REAL database and checks
+    that migrating it raises AmountOutOfRange naming that bill and leaves
+    every amount REAL. Returns a list of failures.
+    """
+    path = os.path.join(tmp, 'record_book_out_of_range.db')
+    shutil.copyfile(legacy_db, path)
+    conn = sqlite3.connect(path)
+    rowid = conn.execute("""
+        INSERT INTO monthly_bills (customer_id, bill_number, bill_month, subtotal, tax_amount, total_amount,
+                                   paid_amount, due_amount, bill_date, due_date, status)
+        VALUES (1, 'INVHUGE', '2025-06', 1e36, 0, 1e36, 0, 1e36, '2025-06-01', '2025-06-01', 'Unpaid')
+    """).lastrowid
+    conn.commit()
+    conn.close()
+
+    failures = []
+    try:
+        record_book_app.initialize_database(path)
+        failures.append("migration converted a bill worth 1e36 rupees instead of refusing")
+    except money.AmountOutOfRange as e:
+        if ('monthly_bills', rowid, 'due_amount', 1e36) not in e.amounts:
+            failures.append(f"migration refused, but did not name bill rowid {rowid}: {e}")
+    conn = sqlite3.connect(path)
+    types = {row[1]: row[2] for row in conn.execute("PRAGMA table_info(monthly_bills)")}
+    conn.close()
+    if types.get('due_amount') != 'REAL':
+        failures.append(f"refused migration still changed monthly_bills.due_amount to {types.get('due_amount')}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--bills', type=int, default=500000)
+    parser.add_argument('--customers', type=int, default=5000)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--database', help="only reconcile this record_book.db")
+    args = parser.parse_args()
+
+    if args.database:
+        return check_database(args.database)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_db = os.path.join(tmp, 'record_book_real.db')
+        paise_db = os.path.join(tmp, 'record_book.db')
+        rows = build(legacy_db, paise_db, args.bills, args.customers, random.Random(11))
+        expected = {
+            'total_amount': sum(row[5] for row in rows),
+            'paid_amount': sum(row[6] for row in rows),
+            'due_amount': sum(row[7] for row in rows),
+        }
+        print(f"{args.bills} bills, {args.customers} customers")
+
+        failed = False
+        for label, path, unit, format_amount in (
+                ('REAL', legacy_db, money.PAISE_PER_RUPEE, lambda amount: f"₹{amount:,.2f}"),
+                ('paise', paise_db, 1, money.format_paise)):
+            conn = sqlite3.connect(path)
+            conn.execute("SELECT COUNT(*) FROM monthly_bills").fetchone()  # warm the page cache
+            timings = []
+            for name, sql in QUERIES.items():
+                result, times = time_query(conn, sql, args.runs)
+                timings.append(f"{name} {statistics.median(times) * 1000:.1f} ms")
+                if name == 'outstanding by customer':
+                    format_times = time_formatting(result, format_amount, args.runs)
+                    timings.append(f"format {len(result)} amounts {statistics.median(format_times) * 1000:.1f} ms")
+            failures = reconcile(conn, expected, unit)
+            conn.close()
+
+            print(f"{label:>5}: " + ", ".join(timings))
+            for failure in failures:
+                print(f"       {'FAIL' if label == 'paise' else 'drift'}: {failure}")
+            if not failures:
+                print("       reconciles exactly")
+            failed = failed or (label == 'paise' and bool(failures))
+
+        failures = check_refuses_out_of_range(legacy_db, tmp)
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        if not failures:
+            print("out-of-range amount: migration refused it and converted nothing")
+        failed = failed or bool(failures)
+
+    print("FAIL" if failed else "OK")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
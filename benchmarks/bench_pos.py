@@ -0,0 +1,95 @@
+"""
+Lunch-rush benchmark for the canteen point-of-sale path.
+
+Builds a temporary super_app.db with a menu, then has several counters
+(threads) ring up random multi-line orders through
+canteen_logic.place_order for a fixed time. Reports sustained
+orders/second, latency percentiles and how many orders each group
+commit carried. Run with --max-batch 1 to compare against one commit
+per order.
+
+Usage:  python benchmarks/bench_pos.py [--counters 8] [--seconds 10] [--items 40] [--max-batch 256]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import canteen_logic
+import db
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--counters', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--items', type=int, default=40)
+    parser.add_argument('--max-batch', type=int, default=256)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        canteen_logic.DB_FILE = os.path.join(tmp, 'super_app.db')
+        canteen_logic.initialize_canteen_schema()
+        db.get_pool(canteen_logic.DB_FILE).size = args.counters + 2
+        with db.transaction(canteen_logic.DB_FILE) as conn:
+            conn.executemany(
+                "INSERT INTO menu_items (name, price) VALUES (?, ?)",
+                [(f"Item {i}", 10 + (i % 12) * 5) for i in range(args.items)]
+            )
+        writer = canteen_logic.get_sales_writer()
+        writer.max_batch = args.max_batch
+
+        deadline = time.perf_counter() + args.seconds
+        latencies = [[] for _ in range(args.counters)]
+        errors = [0] * args.counters
+
+        def counter(index):
+            rng = random.Random(index)
+            while time.perf_counter() < deadline:
+                lines = [(rng.randint(1, args.items), rng.randint(1, 3)) for _ in range(rng.randint(1, 4))]
+                start = time.perf_counter()
+                message, order = canteen_logic.place_order(lines, counter=str(index))
+                latencies[index].append(time.perf_counter() - start)
+                if order is None:
+                    errors[index] += 1
+
+        threads = [threading.Thread(target=counter, args=(i,)) for i in range(args.counters)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+        writer.close()
+
+        with db.get_pool(canteen_logic.DB_FILE).connection() as conn:
+            stored = conn.execute("SELECT COUNT(*) FROM canteen_orders").fetchone()[0]
+        db.get_pool(canteen_logic.DB_FILE).close_all()
+
+    all_latencies = sorted(l for per_counter in latencies for l in per_counter)
+    orders = len(all_latencies)
+    print(f"{args.counters} counters, {elapsed:.1f} s, max_batch={args.max_batch}")
+    print(f"orders: {orders} ({sum(errors)} errors, {stored} stored) -> {orders / elapsed:.0f} orders/s")
+    print(f"latency ms: p50={percentile(all_latencies, 50) * 1000:.2f} "
+          f"p95={percentile(all_latencies, 95) * 1000:.2f} "
+          f"p99={percentile(all_latencies, 99) * 1000:.2f} "
+          f"max={all_latencies[-1] * 1000 if all_latencies else 0:.2f}")
+    if writer.batches:
+        print(f"commits: {writer.batches} ({writer.jobs / writer.batches:.1f} orders per commit)")
+    return 0 if stored == orders - sum(errors) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,197 @@
+"""
+Route timings against a generated dataset, compared with a stored baseline.
+
+Runs the main pages through the Flask test client against the databases
+made by generate_data.py, reading streamed bodies to the end, and times
+the bill run (POST /bills/generate) and the overdue / credit-limit
+notifiers on a throwaway copy of record_book.db. Mail settings are left
+empty in generated data, so no mail is sent.
+
+Each route reports the first (cold) request and the median and p95 of
+--repeat more. The medians are compared with
+benchmarks/baselines/routes-<scale>.json; a route more than --tolerance
+slower than its baseline (and at least --min-ms slower, to ignore noise
+on fast pages) fails the run. --save-baseline writes the current
+numbers as the new baseline instead.
+
+Timings only mean something on the machine that took them, so baselines
+are not committed (benchmarks/baselines/ is ignored): run with
+--save-baseline on a clean checkout first, then again after your change
+on the same machine. A baseline saved on another machine (or Python) is
+reported and not compared.
+
+Usage:  python benchmarks/generate_data.py --scale small
+        python benchmarks/bench_routes.py --save-baseline     # before the change
+        python benchmarks/bench_routes.py [--data-dir bench_data] [--scale small] [--repeat 10]
+                                          [--tolerance 0.25] [--save-baseline] [--only bills,alerts,...]
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as record_book_app
+import cli_logic
+import db
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+
+# Key under which a baseline records the machine it was taken on
+MACHINE_KEY = '_machine'
+
+# A middling customer alongside customer 1, the biggest account in generated data.
+TYPICAL_CUSTOMER = 500
+
+ROUTES = [
+    ('dashboard', 'GET', '/', None),
+    ('dashboard-stats', 'GET', '/dashboard-stats', None),
+    ('customers', 'GET', '/customers', None),
+    ('customer-detail-big', 'GET', '/customer/1', None),
+    ('customer-detail-typical', 'GET', f'/customer/{TYPICAL_CUSTOMER}', None),
+    ('transactions', 'GET', '/transactions', None),
+    ('bills', 'GET', '/bills', None),
+    ('bills-last-page', 'GET', '/bills?page=1000000', None),
+    ('alerts', 'GET', '/alerts', None),
+    ('export-ledger-big', 'GET', '/export-ledger/1', None),
+    ('web-cli-find', 'POST', '/web-cli', {'command': f'find customer{TYPICAL_CUSTOMER}@example.com'}),
+    ('web-cli-list', 'POST', '/web-cli', {'command': 'list'}),
+]
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def request_once(client, method, url, data):
+    start = time.perf_counter()
+    response = client.open(url, method=method, data=data, buffered=False)
+    size = sum(len(chunk) for chunk in response.response)
+    response.close()
+    return (time.perf_counter() - start) * 1000, response.status_code, size
+
+
+def time_route(client, method, url, data, repeat):
+    cold, status, size = request_once(client, method, url, data)
+    runs = [request_once(client, method, url, data)[0] for _ in range(repeat)]
+    return {'status': status, 'kb': round(size / 1024, 1), 'cold_ms': round(cold, 2),
+            'median_ms': round(statistics.median(runs), 2), 'p95_ms': round(percentile(runs, 0.95), 2)}
+
+
+def time_jobs(data_dir):
+    """Bill run and notifiers on a copy of record_book.db, timed once each."""
+    results = {}
+    app = record_book_app.app
+    with tempfile.TemporaryDirectory() as tmp:
+        copy = os.path.join(tmp, db.RECORD_BOOK_DB)
+        shutil.copy(os.path.join(data_dir, db.RECORD_BOOK_DB), copy)
+        app.config['DATABASE'] = copy
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['logged_in'] = True
+
+        start = time.perf_counter()
+        response = client.post('/bills/generate', data={'month': datetime.now().strftime('%Y-%m')})
+        results['bill-run'] = {'status': response.status_code, 'median_ms': round((time.perf_counter() - start) * 1000, 2)}
+
+        for name, job in (('overdue-notifier', record_book_app.check_overdue_payments),
+                          ('credit-limit-notifier', record_book_app.check_credit_limit_exceeded)):
+            start = time.perf_counter()
+            job()
+            results[name] = {'status': 'ok', 'median_ms': round((time.perf_counter() - start) * 1000, 2)}
+        db.get_pool(copy, foreign_keys=False).close_all()
+    return results
+
+
+def compare(results, baseline, tolerance, min_ms):
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name, {}).get('median_ms')
+        if before is None:
+            continue
+        after = result['median_ms']
+        if after > before * (1 + tolerance) and after - before >= min_ms:
+            regressions.append(f"{name}: {after:.1f} ms vs baseline {before:.1f} ms (+{(after / before - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--data-dir', default='bench_data')
+    parser.add_argument('--scale', default='small', help="baseline name; match the generate_data.py scale")
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--tolerance', type=float, default=0.25, help="allowed slowdown over baseline (0.25 = 25%%)")
+    parser.add_argument('--min-ms', type=float, default=5.0, help="ignore slowdowns smaller than this")
+    parser.add_argument('--only', help="comma-separated route or job names")
+    parser.add_argument('--skip-jobs', action='store_true', help="skip the bill run and notifiers")
+    parser.add_argument('--save-baseline', action='store_true')
+    args = parser.parse_args()
+
+    record_book_db = os.path.join(args.data_dir, db.RECORD_BOOK_DB)
+    super_app_db = os.path.join(args.data_dir, db.SUPER_APP_DB)
+    if not os.path.exists(record_book_db) or not os.path.exists(super_app_db):
+        print(f"No generated data in {args.data_dir}; run benchmarks/generate_data.py first")
+        return 1
+    only = set(args.only.split(',')) if args.only else None
+
+    app = record_book_app.app
+    app.config['DATABASE'] = record_book_db
+    app.config['SUPER_APP_DATABASE'] = super_app_db
+    cli_logic.DB_FILE = record_book_db  # the ledger export and web CLI read through cli_logic
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['logged_in'] = True
+
+    results = {}
+    for name, method, url, data in ROUTES:
+        if only and name not in only:
+            continue
+        results[name] = time_route(client, method, url, data, args.repeat)
+        r = results[name]
+        print(f"{name:<26} {r['status']}  {r['kb']:9.1f} KB  cold {r['cold_ms']:9.1f} ms  "
+              f"median {r['median_ms']:9.1f} ms  p95 {r['p95_ms']:9.1f} ms")
+    if not args.skip_jobs:
+        for name, result in time_jobs(args.data_dir).items():
+            if only and name not in only:
+                continue
+            results[name] = result
+            print(f"{name:<26} {result['status']}  {'':12} once {result['median_ms']:9.1f} ms")
+    app.config['DATABASE'] = record_book_db
+    db.close_all()
+
+    baseline_file = os.path.join(BASELINE_DIR, f"routes-{args.scale}.json")
+    machine = f"{platform.node()} {platform.machine()} Python {platform.python_version()}"
+    if args.save_baseline:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        with open(baseline_file, 'w', encoding='utf-8') as f:
+            json.dump({MACHINE_KEY: machine, **results}, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baseline saved to {baseline_file}")
+        return 0
+
+    if not os.path.exists(baseline_file):
+        print(f"No baseline at {baseline_file}; run with --save-baseline to create one")
+        return 0
+    with open(baseline_file, encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline.get(MACHINE_KEY) != machine:
+        print(f"Baseline {baseline_file} was taken on {baseline.get(MACHINE_KEY, 'another machine')}, "
+              f"not {machine}; run with --save-baseline here first")
+        return 0
+    regressions = compare(results, baseline, args.tolerance, args.min_ms)
+    for regression in regressions:
+        print("SLOWER " + regression)
+    print("OK" if not regressions else f"{len(regressions)} regression(s)")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+"""
+Failure check for group-commit writes (GROUP_COMMIT=1).
+
+Runs record_book-style writes through group_commit.write() while:
+
+  locked    another connection holds the write lock, so the writer's
+            BEGIN IMMEDIATE fails after the busy timeout
+  connect   the database cannot be opened at all
+
+Each caller must get the SQLite error itself, well within
+group_commit.WRITE_TIMEOUT_SECONDS (not a TimeoutError), and once the
+cause goes away the same writer must commit the next write.
+
+  timeout   a job stalls inside the writer past its caller's timeout, with
+            a second job queued behind it; the stalled caller must get
+            WritePending and its row must still commit once, the queued
+            caller must get WriteCancelled and its row must never appear
+
+Usage:  python benchmarks/check_group_commit_failures.py [--callers 8]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+import group_commit
+
+# Short busy timeout so the lock failure shows up quickly
+BUSY_TIMEOUT_MS = 200
+# "Promptly": the busy timeout plus the writer's linger, with plenty of slack
+PROMPT_SECONDS = 2.0
+
+
+def insert_note(conn, text):
+    conn.execute("INSERT INTO notes (text) VALUES (?)", (text,))
+    return text
+
+
+def concurrent_writes(db_path, callers, label):
+    """Runs one write per caller thread; returns [(error or None, seconds)]."""
+    outcomes = [None] * callers
+
+    def caller(index):
+        start = time.perf_counter()
+        try:
+            group_commit.write(db_path, insert_note, f"{label} {index}", foreign_keys=False)
+            error = None
+        except Exception as e:
+            error = e
+        outcomes[index] = (error, time.perf_counter() - start)
+
+    threads = [threading.Thread(target=caller, args=(i,)) for i in range(callers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return outcomes
+
+
+def check_failed(outcomes, label):
+    problems = []
+    for error, seconds in outcomes:
+        if not isinstance(error, sqlite3.Error):
+            problems.append(f"{label}: expected a sqlite3.Error, got {error!r}")
+        elif seconds > PROMPT_SECONDS:
+            problems.append(f"{label}: error took {seconds:.1f} s to reach the caller")
+    worst = max(seconds for _, seconds in outcomes)
+    print(f"{label:>8}: {len(outcomes)} callers failed with "
+          f"{sorted({type(e).__name__ + ': ' + str(e) for e, _ in outcomes})} in <= {worst:.2f} s")
+    return problems
+
+
+def check_recovered(db_path, label):
+    try:
+        group_commit.write(db_path, insert_note, f"{label} after", foreign_keys=False)
+    except Exception as e:
+        return [f"{label}: writer did not recover: {e!r}"]
+    print(f"{label:>8}: next write committed")
+    return []
+
+
+def check_timeout(db_path):
+    """A running job reports WritePending and commits once; a queued one is cancelled."""
+    problems = []
+    writer = group_commit.GroupCommitWriter(db_path, foreign_keys=False)
+    started, release = threading.Event(), threading.Event()
+
+    def stalled(conn):
+        started.set()
+        release.wait()
+        return insert_note(conn, 'timeout running')
+
+    outcomes = {}
+
+    def caller(label, job, *args):
+        try:
+            writer.run(job, *args, timeout=0.3)
+            outcomes[label] = None
+        except Exception as e:
+            outcomes[label] = e
+
+    running = threading.Thread(target=caller, args=('running', stalled))
+    running.start()
+    started.wait()
+    queued = threading.Thread(target=caller, args=('queued', insert_note, 'timeout queued'))
+    queued.start()
+    running.join()
+    queued.join()
+    release.set()
+    writer.close()
+
+    if not isinstance(outcomes['running'], group_commit.WritePending):
+        problems.append(f"timeout: running job expected WritePending, got {outcomes['running']!r}")
+    if not isinstance(outcomes['queued'], group_commit.WriteCancelled):
+        problems.append(f"timeout: queued job expected WriteCancelled, got {outcomes['queued']!r}")
+    with sqlite3.connect(db_path) as conn:
+        counts = dict(conn.execute("SELECT text, COUNT(*) FROM notes WHERE text LIKE 'timeout %' "
+                                   "GROUP BY text").fetchall())
+    if counts != {'timeout running': 1}:
+        problems.append(f"timeout: expected only the running job's row once, found {counts}")
+    print(f"{'timeout':>8}: running -> {type(outcomes['running']).__name__}, "
+          f"queued -> {type(outcomes['queued']).__name__}, rows {counts}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--callers', type=int, default=8)
+    args = parser.parse_args()
+
+    os.environ['GROUP_COMMIT'] = '1'
+    db.BUSY_TIMEOUT_MS = BUSY_TIMEOUT_MS
+    problems = []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # --- BEGIN IMMEDIATE fails: another connection holds the write lock ---
+        db_path = os.path.join(tmp, 'record_book.db')
+        with db.transaction(db_path, foreign_keys=False) as conn:
+            conn.execute("CREATE TABLE notes (id INTEGER PRIMARY KEY, text TEXT)")
+        holder = sqlite3.connect(db_path, isolation_level=None)
+        holder.execute("BEGIN IMMEDIATE")
+        try:
+            problems += check_failed(concurrent_writes(db_path, args.callers, 'locked'), 'locked')
+        finally:
+            holder.execute("ROLLBACK")
+            holder.close()
+        problems += check_recovered(db_path, 'locked')
+
+        # --- The caller stops waiting while its job runs or is still queued ---
+        problems += check_timeout(db_path)
+
+        # --- The connection cannot be opened: its directory does not exist yet ---
+        missing_dir = os.path.join(tmp, 'not-yet')
+        db_path = os.path.join(missing_dir, 'record_book.db')
+        problems += check_failed(concurrent_writes(db_path, args.callers, 'connect'), 'connect')
+        os.makedirs(missing_dir)
+        with sqlite3.connect(db_path) as conn:
+            conn.execute("CREATE TABLE notes (id INTEGER PRIMARY KEY, text TEXT)")
+        problems += check_recovered(db_path, 'connect')
+
+        for writer in list(group_commit._writers.values()):
+            writer.close()
+        db.close_all()
+
+    for problem in problems:
+        print(f"FAIL: {problem}")
+    print("FAIL" if problems else "OK")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
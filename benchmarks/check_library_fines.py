@@ -0,0 +1,107 @@
+"""
+End-to-end check that a library fine can be paid after the book is back.
+
+In a scratch super_app.db, a student borrows books and they go overdue
+(due dates moved into the past, nightly fines run). Then:
+
+  desk      one book is returned at the desk (return_book)
+  scan      one is returned through a desk-scan batch (process_scans)
+  unseen    one goes overdue after the last nightly run and is returned
+            before the next
+
+Each returned issue must still show its fine as outstanding, the next
+nightly run must keep it, pay_library_fines must take the total from the
+wallet, and afterwards nothing may be outstanding.
+
+Usage:  python benchmarks/check_library_fines.py
+"""
+import os
+import sys
+import tempfile
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+import library_fines
+import library_logic
+import money
+import wallet_logic
+
+STUDENT = 'S100'
+DAYS_LATE = {'desk': 10, 'scan': 6, 'unseen': 2}
+
+
+def expected_fine(days):
+    return min(days * library_fines.FINE_PER_DAY, library_fines.MAX_FINE_PER_ISSUE)
+
+
+def outstanding(db_path):
+    with db.get_pool(db_path).connection() as conn:
+        return {row['issue_id']: row['unpaid'] for row in wallet_logic.get_outstanding_fines(conn, STUDENT)
+                if row['unpaid'] > 0}
+
+
+def main():
+    problems = []
+    today = date.today()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'super_app.db')
+        library_logic.DB_FILE = wallet_logic.DB_FILE = db_path
+        library_logic.initialize_library_schema(db_path)
+        wallet_logic.initialize_wallet_schema(db_path)
+
+        issues = {}
+        for label, days in DAYS_LATE.items():
+            library_logic.add_book(f"Book {label}", "Author", 1)
+            with db.get_pool(db_path).connection() as conn:
+                book_id = conn.execute("SELECT MAX(book_id) FROM books").fetchone()[0]
+            print(library_logic.issue_book(book_id, STUDENT))
+            with db.transaction(db_path) as conn:
+                issue_id = conn.execute("SELECT MAX(issue_id) FROM book_issues").fetchone()[0]
+                conn.execute("UPDATE book_issues SET due_date = ? WHERE issue_id = ?",
+                             ((today - timedelta(days=days)).isoformat(), issue_id))
+            issues[label] = (book_id, issue_id)
+
+        # The last nightly run, before 'unseen' was overdue
+        found = library_fines.run_overdue_fines(db_path, (today - timedelta(days=DAYS_LATE['unseen'])).isoformat())
+        print(f"nightly run found {found} overdue issues")
+
+        print(library_logic.return_book(issues['desk'][0], STUDENT))
+        print(library_logic.process_scans([(issues['scan'][0], STUDENT, 'in')])[0])
+        print(library_logic.return_book(issues['unseen'][0], STUDENT))
+
+        expected = {issue_id: expected_fine(DAYS_LATE[label]) for label, (_, issue_id) in issues.items()}
+        for stage in ('after return', 'after the next nightly run'):
+            if stage != 'after return':
+                library_fines.run_overdue_fines(db_path, today.isoformat())
+            fines = outstanding(db_path)
+            if fines != expected:
+                problems.append(f"{stage}: outstanding fines {fines}, expected {expected}")
+            else:
+                print(f"{stage}: outstanding fines {fines}")
+
+        total = sum(expected.values())
+        print(wallet_logic.top_up(STUDENT, 500))
+        message = wallet_logic.pay_library_fines(STUDENT)
+        print(message)
+        if not message.startswith("Success") or f"₹{total:.2f}" not in message:
+            problems.append(f"paying ₹{total:.2f}: {message}")
+        wallet, _ = wallet_logic.get_wallet(STUDENT)
+        # The wallet holds integer paise
+        if wallet['balance'] != money.to_paise(500) - money.to_paise(total):
+            problems.append(f"wallet balance {money.format_paise(wallet['balance'])}, expected ₹{500 - total:.2f}")
+        if outstanding(db_path):
+            problems.append(f"still outstanding after paying: {outstanding(db_path)}")
+
+        db.close_all()
+
+    for problem in problems:
+        print(f"FAIL: {problem}")
+    print("FAIL" if problems else "OK")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,302 @@
+"""
+Deterministic synthetic data for record_book.db and super_app.db.
+
+Creates both databases in --out-dir with the app's own schema code and
+fills them at a chosen scale. The same --seed and --as-of always give
+the same rows. Accounts are skewed the way real ones are: a few
+customers hold most of the transactions, and recent months are the
+ones still unpaid. After loading, it runs the nightly jobs (risk
+scores, overdue fines, rollups) so every page has the data it expects.
+
+Student ids in super_app.db are customer ids as text, matching
+student_accounts.py.
+
+Scales (customers / transactions / bills / canteen sales):
+  small    2,000 /   100,000 /  24,000 /    40,000
+  medium  10,000 / 1,000,000 / 120,000 /   200,000
+  full    50,000 / 5,000,000 / 600,000 / 1,000,000
+
+Usage:  python benchmarks/generate_data.py [--scale small] [--out-dir bench_data] [--seed 42]
+                                           [--as-of YYYY-MM-DD] [--customers N] [--transactions N]
+                                           [--bills N] [--canteen-sales N] [--force]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as record_book_app
+import canteen_logic
+import db
+import library_fines
+import library_logic
+import money
+import risk_scoring
+import rollups
+import wallet_logic
+
+SCALES = {
+    'small': {'customers': 2000, 'transactions': 100000, 'bills': 24000, 'canteen_sales': 40000},
+    'medium': {'customers': 10000, 'transactions': 1000000, 'bills': 120000, 'canteen_sales': 200000},
+    'full': {'customers': 50000, 'transactions': 5000000, 'bills': 600000, 'canteen_sales': 1000000},
+}
+
+# Days of transaction, library and canteen history before --as-of.
+HISTORY_DAYS = 730
+
+# Rows per executemany call.
+CHUNK_SIZE = 50000
+
+FIRST_NAMES = ['Aarav', 'Vivaan', 'Aditya', 'Ananya', 'Diya', 'Isha', 'Kabir', 'Meera', 'Rohan', 'Saanvi',
+               'Arjun', 'Priya', 'Rahul', 'Kavya', 'Nikhil', 'Pooja', 'Siddharth', 'Tanvi', 'Varun', 'Zoya']
+LAST_NAMES = ['Sharma', 'Verma', 'Iyer', 'Reddy', 'Patel', 'Gupta', 'Nair', 'Mehta', 'Singh', 'Das',
+              'Joshi', 'Kulkarni', 'Banerjee', 'Chopra', 'Menon', 'Rao', 'Bose', 'Kapoor', 'Pillai', 'Shah']
+BUSINESS_WORDS = ['Traders', 'Stores', 'Enterprises', 'Agencies', 'Supplies', 'Kirana', 'Textiles', 'Foods']
+TITLE_WORDS = ['River', 'Garden', 'Moon', 'Silent', 'City', 'Tiger', 'Monsoon', 'Letters', 'Journey', 'Stars',
+               'History', 'Science', 'Secret', 'Mountain', 'Children', 'Ocean', 'Kingdom', 'Light', 'Fire', 'Time']
+MENU = [('Samosa', 15), ('Vada Pav', 20), ('Idli Sambar', 30), ('Masala Dosa', 45), ('Poha', 25), ('Upma', 25),
+        ('Veg Sandwich', 35), ('Chole Bhature', 60), ('Pav Bhaji', 50), ('Veg Thali', 80), ('Paneer Roll', 55),
+        ('Maggi', 30), ('Tea', 10), ('Coffee', 15), ('Lassi', 25), ('Lemon Soda', 20), ('Fruit Bowl', 40),
+        ('Veg Biryani', 70), ('Curd Rice', 40), ('Gulab Jamun', 20)]
+
+
+def skewed_id(rng, count):
+    """An id in 1..count, weighted towards low ids (a few big accounts)."""
+    return int(count * rng.random() ** 3) + 1
+
+
+def chunked(rows, size=CHUNK_SIZE):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def insert(conn, sql, rows):
+    count = 0
+    for chunk in chunked(rows):
+        conn.executemany(sql, chunk)
+        count += len(chunk)
+    return count
+
+
+def customer_rows(rng, count, as_of):
+    for i in range(1, count + 1):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        name = f"{first} {last}" if rng.random() < 0.6 else f"{last} {rng.choice(BUSINESS_WORDS)}"
+        registered = as_of - timedelta(days=HISTORY_DAYS + rng.randint(0, 365))
+        yield (name, f"customer{i}@example.com", f"9{rng.randint(100000000, 999999999)}",
+               f"{rng.randint(1, 200)} MG Road, Pune", None, rng.choice((500000, 1000000, 2500000, 5000000)),
+               rng.choice((15, 30, 45)), registered.strftime('%Y-%m-%d'),
+               'Active' if rng.random() < 0.95 else 'Inactive', 'email')
+
+
+def transaction_rows(rng, count, customers, as_of):
+    for _ in range(count):
+        day = as_of - timedelta(days=rng.randint(0, HISTORY_DAYS - 1))
+        amount = rng.randint(1, 400) * 2500
+        if rng.random() < 0.7:
+            tax = money.percent_of(amount, 18)
+            age = (as_of - day).days
+            status = 'Unpaid' if age < 60 and rng.random() < 0.6 else 'Paid'
+            yield (skewed_id(rng, customers), 'Sale', amount, tax, amount + tax, f"Invoice for goods #{rng.randint(1000, 99999)}",
+                   day.strftime('%Y-%m-%d'), (day + timedelta(days=30)).strftime('%Y-%m-%d'), status, None, None)
+        else:
+            yield (skewed_id(rng, customers), 'Payment', amount, 0, amount, "Payment received",
+                   day.strftime('%Y-%m-%d'), None, 'Paid', rng.choice(('Cash', 'UPI', 'Bank Transfer', 'Cheque')),
+                   f"REF{rng.randint(100000, 999999)}")
+
+
+def bill_rows(rng, count, customers, as_of):
+    # Bill k belongs to customer 1 + k % customers for the (k // customers)-th month back,
+    # so (customer, month) pairs are unique. Bill numbers follow app.generate_bill_number():
+    # prefix, bill-date month and a sequence within it (here the customer id).
+    first_of_month = as_of.replace(day=1)
+    for k in range(count):
+        customer_id = 1 + k % customers
+        months_back = k // customers + 1
+        year, month = divmod(first_of_month.year * 12 + first_of_month.month - 1 - months_back, 12)
+        bill_month = f"{year}-{month + 1:02d}"
+        bill_date = datetime(year, month + 1, 1) + timedelta(days=31)
+        bill_date = bill_date.replace(day=1)
+        due_date = bill_date + timedelta(days=30)
+        subtotal = rng.randint(10, 2000) * 1000
+        tax = money.percent_of(subtotal, 18)
+        total = subtotal + tax
+        if months_back > 3 or rng.random() < 0.4:
+            paid = total
+        elif rng.random() < 0.3:
+            paid = total // 2
+        else:
+            paid = 0
+        due = total - paid
+        yield (customer_id, f"INV{bill_date:%Y%m}{customer_id:04d}", bill_month, subtotal, tax, total,
+               paid, due, bill_date.strftime('%Y-%m-%d'), due_date.strftime('%Y-%m-%d'),
+               'Paid' if due == 0 else 'Unpaid', bill_date.strftime('%Y-%m-%d'))
+
+
+def build_record_book(path, rng, counts, as_of):
+    record_book_app.initialize_database(path)
+    with db.transaction(path, foreign_keys=False) as conn:
+        loaded = {
+            'customers': insert(conn, """
+                INSERT INTO customers (name, email, phone, address, gst_number, credit_limit, payment_days_limit,
+                                       registration_date, status, reminder_preference)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, customer_rows(rng, counts['customers'], as_of)),
+            'transactions': insert(conn, """
+                INSERT INTO transactions (customer_id, transaction_type, amount, tax_amount, total_amount, description,
+                                          transaction_date, due_date, status, payment_mode, reference_number)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, transaction_rows(rng, counts['transactions'], counts['customers'], as_of)),
+            'monthly_bills': insert(conn, """
+                INSERT INTO monthly_bills (customer_id, bill_number, bill_month, subtotal, tax_amount, total_amount,
+                                           paid_amount, due_amount, bill_date, due_date, status, sent_date)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, bill_rows(rng, counts['bills'], counts['customers'], as_of)),
+            'products': insert(conn, """
+                INSERT INTO products (name, description, hsn_code, price, tax_rate, category, stock_quantity)
+                VALUES (?, ?, ?, ?, 18.0, ?, ?)
+            """, ((f"Product {i}", None, f"{rng.randint(1000, 9999)}", rng.randint(10, 5000) * 100,
+                   rng.choice(('Grocery', 'Textile', 'Hardware', 'Stationery')), rng.randint(0, 500))
+                  for i in range(200))),
+            'email_log': insert(conn, """
+                INSERT INTO email_log (customer_id, email_type, sent_date, status, message)
+                VALUES (?, 'overdue_notice', ?, 'sent', 'Overdue reminder')
+            """, ((skewed_id(rng, counts['customers']),
+                   (as_of - timedelta(days=rng.randint(1, 60))).strftime('%Y-%m-%d'))
+                  for _ in range(counts['customers'] // 2))),
+        }
+    return loaded
+
+
+def build_super_app(path, rng, counts, as_of):
+    library_logic.initialize_library_schema(path)
+    canteen_logic.initialize_canteen_schema(path)
+    wallet_logic.initialize_wallet_schema(path)
+    students = counts['customers']
+    book_count = max(students // 10, 50)
+    issue_count = counts['canteen_sales'] // 2
+
+    with db.transaction(path) as conn:
+        copies = [rng.randint(2, 6) for _ in range(book_count)]
+        insert(conn, "INSERT INTO books (title, author, quantity) VALUES (?, ?, ?)",
+               ((f"The {rng.choice(TITLE_WORDS)} of {rng.choice(TITLE_WORDS)} {i}",
+                 f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}", copies[i]) for i in range(book_count)))
+
+        available = list(copies)
+        issues = []
+        for _ in range(issue_count):
+            book = skewed_id(rng, book_count)
+            issued = as_of - timedelta(days=rng.randint(0, HISTORY_DAYS - 1))
+            due = issued + timedelta(days=library_logic.LOAN_PERIOD_DAYS)
+            returned = issued + timedelta(days=rng.randint(1, library_logic.LOAN_PERIOD_DAYS + 20))
+            if returned > as_of and available[book - 1] > 0:
+                available[book - 1] -= 1
+                issues.append((book, str(rng.randint(1, students)), issued.strftime('%Y-%m-%d'), 'Issued',
+                               due.strftime('%Y-%m-%d'), None))
+            else:
+                returned = min(returned, as_of)
+                issues.append((book, str(rng.randint(1, students)), issued.strftime('%Y-%m-%d'), 'Returned',
+                               due.strftime('%Y-%m-%d'), returned.strftime('%Y-%m-%d')))
+        insert(conn, """
+            INSERT INTO book_issues (book_id, student_id, issue_date, status, due_date, return_date)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, issues)
+        conn.executemany("UPDATE books SET quantity = ? WHERE book_id = ?",
+                         [(quantity, book_id) for book_id, quantity in enumerate(available, start=1)])
+
+        conn.executemany("INSERT OR IGNORE INTO menu_items (name, price) VALUES (?, ?)", MENU)
+        prices = dict(conn.execute("SELECT item_id, price FROM menu_items").fetchall())
+        item_ids = sorted(prices)
+
+        # Orders of one to three lines until the sales target is reached
+        order_id = conn.execute("SELECT COALESCE(MAX(order_id), 0) FROM canteen_orders").fetchone()[0]
+        orders, sales = [], []
+        while len(sales) < counts['canteen_sales']:
+            order_id += 1
+            created = as_of - timedelta(days=rng.randint(0, HISTORY_DAYS - 1), minutes=rng.randint(0, 600))
+            lines = []
+            for _ in range(min(rng.randint(1, 3), counts['canteen_sales'] - len(sales))):
+                item = item_ids[skewed_id(rng, len(item_ids)) - 1]
+                quantity = rng.randint(1, 3)
+                lines.append((item, quantity, prices[item] * quantity, created.strftime('%Y-%m-%d'), order_id))
+            sales += lines
+            student = str(rng.randint(1, students)) if rng.random() < 0.5 else None
+            orders.append((order_id, str(rng.randint(1, 4)), student, sum(line[2] for line in lines),
+                           created.strftime('%Y-%m-%d %H:%M:%S')))
+        insert(conn, "INSERT INTO canteen_orders (order_id, counter, student_id, total_price, created_at) VALUES (?, ?, ?, ?, ?)",
+               orders)
+        insert(conn, "INSERT INTO canteen_sales (item_id, quantity, total_price, sale_date, order_id) VALUES (?, ?, ?, ?, ?)",
+               sales)
+
+        # Wallets funded by a single top-up each, so balances reconcile with the ledger
+        now = as_of.strftime('%Y-%m-%d %H:%M:%S')
+        wallets = [(str(student), money.to_paise(rng.randint(0, 40) * 25)) for student in range(1, students + 1, 3)]
+        wallets = [(student, balance) for student, balance in wallets if balance > 0]
+        insert(conn, "INSERT INTO wallets (student_id, balance, updated_at) VALUES (?, ?, ?)",
+               ((student, balance, now) for student, balance in wallets))
+        insert(conn, "INSERT INTO wallet_ledger (student_id, amount, kind, reference, created_at) VALUES (?, ?, 'topup', NULL, ?)",
+               ((student, balance, now) for student, balance in wallets))
+
+    return {'books': book_count, 'book_issues': len(issues), 'canteen_orders': len(orders),
+            'canteen_sales': len(sales), 'wallets': len(wallets)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scale', choices=SCALES, default='small')
+    parser.add_argument('--out-dir', default='bench_data')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--as-of', default=datetime.now().strftime('%Y-%m-%d'),
+                        help="last day of generated history (default today)")
+    for name in SCALES['small']:
+        parser.add_argument(f"--{name.replace('_', '-')}", type=int, help=f"override the scale's {name} count")
+    parser.add_argument('--force', action='store_true', help="replace existing databases in --out-dir")
+    args = parser.parse_args()
+
+    counts = dict(SCALES[args.scale])
+    for name in counts:
+        if getattr(args, name) is not None:
+            counts[name] = getattr(args, name)
+    as_of = datetime.strptime(args.as_of, '%Y-%m-%d')
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    record_book_db = os.path.join(args.out_dir, db.RECORD_BOOK_DB)
+    super_app_db = os.path.join(args.out_dir, db.SUPER_APP_DB)
+    for path in (record_book_db, super_app_db):
+        if os.path.exists(path):
+            if not args.force:
+                print(f"{path} exists; pass --force to replace it")
+                return 1
+            for suffix in ('', '-wal', '-shm'):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+
+    start = time.perf_counter()
+    loaded = build_record_book(record_book_db, random.Random(args.seed), counts, as_of)
+    loaded.update(build_super_app(super_app_db, random.Random(args.seed + 1), counts, as_of))
+    print(f"loaded in {time.perf_counter() - start:.1f} s: " + ", ".join(f"{k}={v}" for k, v in loaded.items()))
+
+    start = time.perf_counter()
+    today = as_of.strftime('%Y-%m-%d')
+    scored = risk_scoring.run_risk_scoring(record_book_db, today)
+    overdue = library_fines.run_overdue_fines(super_app_db, today)
+    with db.get_pool(super_app_db).connection() as conn:
+        written = rollups.backfill(conn)
+    print(f"nightly jobs in {time.perf_counter() - start:.1f} s: {scored} customers scored, {overdue} overdue issues, "
+          + ", ".join(f"{k}={v}" for k, v in written.items()))
+    db.close_all()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
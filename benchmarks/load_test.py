@@ -0,0 +1,332 @@
+"""
+Concurrent mixed-workload load test against a local multi-worker server.
+
+Copies a generated dataset (see generate_data.py) to a scratch
+directory, serves the app from --workers forked processes sharing one
+listening socket, each handling requests on threads, and drives it
+with simulated users for --seconds:
+
+  cashier    posts sales and payments to /transactions
+  counter    rings up canteen orders on /canteen/pos (some paid from wallets)
+  dashboard  polls /dashboard-stats, and the dashboard page every fifth poll
+  clerk      opens customer detail pages and the bills list
+  bill run   one POST /bills/generate partway through (--bill-run-at)
+
+Scenarios set how many of each run at once; --cashiers etc. override
+them. The report gives, per operation and overall, throughput and
+p50/p95/p99 latency, plus how many requests failed and how many hit
+"database is locked". Form posts like /transactions catch a failed write,
+flash the error and redirect, so their outcome is read from the flash
+left in the session cookie: a flashed error counts as a failed request,
+a flashed lock error as locked, and both count towards --max-error-rate.
+Lock errors are also counted inside the server (a db error hook in every
+worker, by route), including ones a retry or the writer absorbed.
+
+Usage:  python benchmarks/generate_data.py --scale small
+        python benchmarks/load_test.py [--scenario mixed] [--workers 4] [--seconds 30]
+                                       [--cashiers N] [--counters N] [--dashboards N] [--clerks N]
+                                       [--bill-run-at 0.5] [--think 0.05] [--data-dir bench_data]
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import queue
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+import metrics
+
+SCENARIOS = {
+    # Shop floor at peak: many cashiers, the owner watching the dashboard, a bill run mid-day
+    'cashiers': {'cashiers': 20, 'counters': 0, 'dashboards': 5, 'clerks': 2, 'bill_run': True},
+    # Canteen at lunch: every counter busy, nothing else happening
+    'lunch-rush': {'cashiers': 0, 'counters': 30, 'dashboards': 2, 'clerks': 0, 'bill_run': False},
+    'mixed': {'cashiers': 20, 'counters': 20, 'dashboards': 5, 'clerks': 3, 'bill_run': True},
+}
+
+ROLES = ('cashiers', 'counters', 'dashboards', 'clerks')
+
+REQUEST_TIMEOUT = 60
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+# --- Server side ---
+
+def start_server(data_dir, workers):
+    """
+    Serves the app on 127.0.0.1 from `workers` forked processes, each
+    threaded. Returns (url, processes, lock_errors queue).
+    """
+    from werkzeug.serving import make_server
+
+    import app as record_book_app
+    import canteen_logic
+    import cli_logic
+    import library_logic
+    import rollups
+    import wallet_logic
+
+    app = record_book_app.app
+    app.config['DATABASE'] = os.path.join(data_dir, db.RECORD_BOOK_DB)
+    app.config['SUPER_APP_DATABASE'] = os.path.join(data_dir, db.SUPER_APP_DB)
+    cli_logic.DB_FILE = app.config['DATABASE']
+    for module in (canteen_logic, library_logic, wallet_logic, rollups):
+        module.DB_FILE = app.config['SUPER_APP_DATABASE']
+
+    lock_errors = multiprocessing.get_context('fork').Queue()
+
+    def count_lock_error(conn, sql, error):
+        if metrics.error_kind(error) == 'locked':
+            from flask import has_request_context, request
+            route = request.url_rule.rule if has_request_context() and request.url_rule else 'background'
+            lock_errors.put(route)
+
+    db.add_error_hook(count_lock_error)
+    db.close_all()  # nothing opened in the parent may be shared with the workers
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    def serve():
+        sys.stdout = open(os.devnull, 'w')  # the bill run prints a line per emailed bill
+        server.serve_forever()
+
+    processes = [multiprocessing.get_context('fork').Process(target=serve, daemon=True) for _ in range(workers)]
+    for process in processes:
+        process.start()
+    return f"http://127.0.0.1:{server.server_port}", processes, lock_errors
+
+
+# --- Client side ---
+
+class Results:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.outcomes = {}
+
+    def add(self, operation, seconds, outcome):
+        with self.lock:
+            self.latencies.setdefault(operation, []).append(seconds)
+            self.outcomes.setdefault(operation, Counter())[outcome] += 1
+
+
+def session_cookie():
+    """A logged-in session cookie signed with the app's secret key."""
+    import app as record_book_app
+    app = record_book_app.app
+    return app.config.get('SESSION_COOKIE_NAME', 'session'), \
+        app.session_interface.get_signing_serializer(app).dumps({'logged_in': True})
+
+
+def flashed(response):
+    """The (category, message) flashes a response left in its session cookie."""
+    import app as record_book_app
+    app = record_book_app.app
+    value = response.cookies.get(app.config.get('SESSION_COOKIE_NAME', 'session'))
+    if not value:
+        return []
+    return app.session_interface.get_signing_serializer(app).loads(value).get('_flashes', [])
+
+
+def outcome_of(response):
+    if 'database is locked' in response.text:
+        return 'locked'
+    if response.status_code >= 500:
+        return 'error'
+    if response.status_code >= 400:
+        return 'declined'
+    # A redirecting form post reports a failed write only as a flash
+    errors = [message for category, message in flashed(response) if category == 'error']
+    if any('database is locked' in message for message in errors):
+        return 'locked'
+    return 'error' if errors else 'ok'
+
+
+def timed(results, operation, send):
+    start = time.perf_counter()
+    try:
+        outcome = outcome_of(send())
+    except Exception:
+        outcome = 'error'
+    results.add(operation, time.perf_counter() - start, outcome)
+
+
+def user(role, index, base_url, cookie, deadline, think, dataset, results):
+    import requests
+
+    rng = random.Random(f"{role}-{index}")
+    http = requests.Session()
+    http.cookies.set(*cookie)
+    polls = 0
+    while time.perf_counter() < deadline:
+        if role == 'cashiers':
+            customer_id = int(dataset['customers'] * rng.random() ** 3) + 1
+            form = {'customer_id': customer_id, 'amount': rng.randint(1, 400) * 25,
+                    'description': f"Counter {index} sale"}
+            if rng.random() < 0.75:
+                form['transaction_type'] = 'Sale/Credit'
+            else:
+                form.update(transaction_type='Payment', payment_mode='UPI', reference_number=f"LT{rng.randint(1, 10**6)}")
+            # A fresh session each time, so the response's flashes are this post's alone
+            http.cookies.clear()
+            http.cookies.set(*cookie)
+            timed(results, 'post transaction', lambda: http.post(f"{base_url}/transactions", data=form,
+                                                                 allow_redirects=False, timeout=REQUEST_TIMEOUT))
+        elif role == 'counters':
+            order = {'counter': str(index), 'lines': [{'item_id': rng.choice(dataset['menu']), 'quantity': rng.randint(1, 2)}
+                                                      for _ in range(rng.randint(1, 3))]}
+            if rng.random() < 0.3:
+                order['student_id'] = str(rng.randint(1, dataset['customers']))
+            timed(results, 'canteen order', lambda: http.post(f"{base_url}/canteen/pos", json=order,
+                                                              timeout=REQUEST_TIMEOUT))
+        elif role == 'dashboards':
+            polls += 1
+            if polls % 5 == 0:
+                timed(results, 'dashboard page', lambda: http.get(f"{base_url}/", timeout=REQUEST_TIMEOUT))
+            else:
+                timed(results, 'dashboard stats', lambda: http.get(f"{base_url}/dashboard-stats", timeout=REQUEST_TIMEOUT))
+            time.sleep(1.0)
+        elif role == 'clerks':
+            if rng.random() < 0.8:
+                customer_id = int(dataset['customers'] * rng.random() ** 3) + 1
+                timed(results, 'customer detail', lambda: http.get(f"{base_url}/customer/{customer_id}",
+                                                                   timeout=REQUEST_TIMEOUT))
+            else:
+                timed(results, 'bills list', lambda: http.get(f"{base_url}/bills", timeout=REQUEST_TIMEOUT))
+        if think:
+            time.sleep(rng.uniform(0, 2 * think))
+
+
+def bill_run(base_url, cookie, start_at, results):
+    import requests
+
+    time.sleep(start_at)
+    http = requests.Session()
+    http.cookies.set(*cookie)
+    timed(results, 'bill run', lambda: http.post(f"{base_url}/bills/generate",
+                                                 data={'month': datetime.now().strftime('%Y-%m')},
+                                                 allow_redirects=False, timeout=600))
+
+
+def load_dataset(data_dir):
+    with sqlite3.connect(os.path.join(data_dir, db.RECORD_BOOK_DB)) as conn:
+        customers = conn.execute("SELECT MAX(customer_id) FROM customers").fetchone()[0]
+    with sqlite3.connect(os.path.join(data_dir, db.SUPER_APP_DB)) as conn:
+        menu = [row[0] for row in conn.execute("SELECT item_id FROM menu_items")]
+    return {'customers': customers, 'menu': menu}
+
+
+def report(results, lock_routes, elapsed):
+    print(f"{'operation':<18} {'requests':>8} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} "
+          f"{'locked':>7} {'errors':>7} {'declined':>8}")
+    total = Counter()
+    everything = []
+    for operation in sorted(results.latencies):
+        latencies = results.latencies[operation]
+        outcomes = results.outcomes[operation]
+        everything += latencies
+        total.update(outcomes)
+        print(f"{operation:<18} {len(latencies):>8} {len(latencies) / elapsed:>8.1f} "
+              f"{percentile(latencies, 0.5) * 1000:>9.1f} {percentile(latencies, 0.95) * 1000:>9.1f} "
+              f"{percentile(latencies, 0.99) * 1000:>9.1f} {outcomes['locked']:>7} {outcomes['error']:>7} "
+              f"{outcomes['declined']:>8}")
+    if everything:
+        print(f"{'all':<18} {len(everything):>8} {len(everything) / elapsed:>8.1f} "
+              f"{percentile(everything, 0.5) * 1000:>9.1f} {percentile(everything, 0.95) * 1000:>9.1f} "
+              f"{percentile(everything, 0.99) * 1000:>9.1f} {total['locked']:>7} {total['error']:>7} "
+              f"{total['declined']:>8}")
+    server_locks = sum(lock_routes.values())
+    print(f"\n\"database is locked\" inside the server: {server_locks} "
+          f"({server_locks / max(len(everything), 1) * 100:.2f}% of requests)")
+    for route, count in lock_routes.most_common():
+        print(f"  {route:<40} {count}")
+    return len(everything), total
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scenario', choices=SCENARIOS, default='mixed')
+    parser.add_argument('--data-dir', default='bench_data')
+    parser.add_argument('--workers', type=int, default=4, help="server processes")
+    parser.add_argument('--seconds', type=float, default=30)
+    parser.add_argument('--think', type=float, default=0.05, help="mean pause between a user's requests, seconds")
+    parser.add_argument('--bill-run-at', type=float, default=0.5, help="fraction of the run before the bill run starts")
+    parser.add_argument('--no-bill-run', action='store_true')
+    for role in ROLES:
+        parser.add_argument(f"--{role}", type=int, help=f"override the scenario's number of {role}")
+    parser.add_argument('--max-error-rate', type=float, default=0.01,
+                        help="fail if more than this fraction of requests fail, lock errors included")
+    args = parser.parse_args()
+
+    if not all(os.path.exists(os.path.join(args.data_dir, name)) for name in (db.RECORD_BOOK_DB, db.SUPER_APP_DB)):
+        print(f"No generated data in {args.data_dir}; run benchmarks/generate_data.py first")
+        return 1
+    scenario = dict(SCENARIOS[args.scenario])
+    for role in ROLES:
+        if getattr(args, role) is not None:
+            scenario[role] = getattr(args, role)
+    if args.no_bill_run:
+        scenario['bill_run'] = False
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in (db.RECORD_BOOK_DB, db.SUPER_APP_DB):
+            shutil.copy(os.path.join(args.data_dir, name), os.path.join(tmp, name))
+        dataset = load_dataset(tmp)
+        base_url, processes, lock_errors = start_server(tmp, args.workers)
+        cookie = session_cookie()
+        print(f"{args.scenario}: " + ", ".join(f"{scenario[role]} {role}" for role in ROLES)
+              + (", bill run" if scenario['bill_run'] else "")
+              + f" against {args.workers} worker process(es) for {args.seconds:g} s")
+
+        results = Results()
+        start = time.perf_counter()
+        deadline = start + args.seconds
+        threads = [threading.Thread(target=user, args=(role, i, base_url, cookie, deadline, args.think, dataset, results))
+                   for role in ROLES for i in range(scenario[role])]
+        if scenario['bill_run']:
+            threads.append(threading.Thread(target=bill_run,
+                                            args=(base_url, cookie, args.seconds * args.bill_run_at, results)))
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+        time.sleep(0.2)  # let the workers' last lock reports arrive
+
+        for process in processes:
+            process.terminate()
+            process.join()
+        lock_routes = Counter()
+        while True:
+            try:
+                lock_routes[lock_errors.get_nowait()] += 1
+            except queue.Empty:
+                break
+
+    requests_made, outcomes = report(results, lock_routes, elapsed)
+    error_rate = (outcomes['error'] + outcomes['locked']) / max(requests_made, 1)
+    if error_rate > args.max_error_rate:
+        print(f"FAIL: {error_rate * 100:.2f}% of requests failed ({outcomes['locked']} on a locked database)")
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
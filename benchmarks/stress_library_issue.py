@@ -0,0 +1,69 @@
+"""
+Concurrency check for library_logic.issue_book.
+
+50 students (threads, each on its own pooled connection) try to issue
+the same title at the same instant. With N copies in stock exactly
+min(N, students) issues must succeed, the quantity must never go
+negative, and book_issues must hold exactly that many open rows.
+
+Usage:  python benchmarks/stress_library_issue.py [--students 50] [--copies 10]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db
+import library_logic
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--students', type=int, default=50)
+    parser.add_argument('--copies', type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        library_logic.DB_FILE = os.path.join(tmp, 'super_app.db')
+        library_logic.initialize_library_schema()
+        db.get_pool(library_logic.DB_FILE).size = args.students
+        library_logic.add_book("Concurrency in Practice", "Goetz", args.copies)
+
+        barrier = threading.Barrier(args.students)
+        results = [None] * args.students
+
+        def student(index):
+            barrier.wait()
+            results[index] = library_logic.issue_book(1, f"S{index:03d}")
+
+        threads = [threading.Thread(target=student, args=(i,)) for i in range(args.students)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+
+        with db.get_pool(library_logic.DB_FILE).connection() as conn:
+            quantity = conn.execute("SELECT quantity FROM books WHERE book_id = 1").fetchone()['quantity']
+            open_issues = conn.execute("SELECT COUNT(*) FROM book_issues WHERE status = 'Issued'").fetchone()[0]
+        db.get_pool(library_logic.DB_FILE).close_all()
+
+    issued = sum(1 for r in results if r.startswith("Success"))
+    print(f"{args.students} concurrent requests for {args.copies} copies in {elapsed * 1000:.1f} ms")
+    print(f"issued={issued} open_issues={open_issues} remaining_quantity={quantity}")
+
+    expected = min(args.students, args.copies)
+    if issued != expected or open_issues != expected or quantity != args.copies - expected:
+        print("FAIL: over- or under-issued")
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
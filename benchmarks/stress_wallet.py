@@ -0,0 +1,123 @@
+"""
+Contention check for wallet debits.
+
+Funds a few thousand wallets with a small balance, then has many threads
+hammer a hot subset of them for a fixed time: half ring up canteen orders
+paid from the wallet (through the group-commit sales writer), half take
+direct debits in their own BEGIN IMMEDIATE transactions. A snapshot is
+taken mid-run.
+
+Afterwards no balance may be negative, every wallet must equal its
+funding minus its successful debits, and snapshot + ledger must agree
+with every live balance. Reports debits/second.
+
+Usage:  python benchmarks/stress_wallet.py [--wallets 3000] [--hot 50] [--threads 16] [--seconds 10]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import canteen_logic
+import db
+import money
+import wallet_logic
+
+# Wallet amounts are integer paise; the menu price is rupees
+START_BALANCE = money.to_paise(2000)
+ITEM_PRICE = 15.0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--wallets', type=int, default=3000)
+    parser.add_argument('--hot', type=int, default=50, help="wallets that take most of the traffic")
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'super_app.db')
+        canteen_logic.DB_FILE = wallet_logic.DB_FILE = path
+        canteen_logic.initialize_canteen_schema()
+        wallet_logic.initialize_wallet_schema()
+        db.get_pool(path).size = args.threads + 2
+
+        students = [f"S{i:05d}" for i in range(args.wallets)]
+        with db.transaction(path) as conn:
+            conn.execute("INSERT INTO menu_items (name, price) VALUES ('Thali', ?)", (ITEM_PRICE,))
+            for student_id in students:
+                wallet_logic.credit(conn, student_id, START_BALANCE, 'topup')
+
+        deadline = time.perf_counter() + args.seconds
+        spent = [{} for _ in range(args.threads)]
+        counts = [[0, 0] for _ in range(args.threads)]   # [succeeded, declined]
+
+        def worker(index):
+            rng = random.Random(index)
+            while time.perf_counter() < deadline:
+                # 90% of traffic on the hot wallets
+                student_id = rng.choice(students[:args.hot] if rng.random() < 0.9 else students)
+                if index % 2 == 0:
+                    quantity = rng.randint(1, 2)
+                    _, order = canteen_logic.place_order([(1, quantity)], counter=str(index), student_id=student_id)
+                    ok, amount = order is not None, money.to_paise(ITEM_PRICE) * quantity
+                else:
+                    amount = money.to_paise(rng.choice((5, 10, 20)))
+                    try:
+                        with db.transaction(path) as conn:
+                            wallet_logic.debit(conn, student_id, amount, 'fine')
+                        ok = True
+                    except wallet_logic.WalletError:
+                        ok = False
+                if ok:
+                    spent[index][student_id] = spent[index].get(student_id, 0) + amount
+                    counts[index][0] += 1
+                else:
+                    counts[index][1] += 1
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.threads)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        time.sleep(args.seconds / 2)
+        wallet_logic.snapshot_wallets(path)
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+        canteen_logic.get_sales_writer().close()
+
+        with db.get_pool(path).connection() as conn:
+            balances = {row['student_id']: row['balance'] for row in conn.execute("SELECT student_id, balance FROM wallets")}
+        mismatches = wallet_logic.find_mismatches(path)
+        db.get_pool(path).close_all()
+
+    succeeded = sum(c[0] for c in counts)
+    declined = sum(c[1] for c in counts)
+    totals = {}
+    for per_thread in spent:
+        for student_id, amount in per_thread.items():
+            totals[student_id] = totals.get(student_id, 0) + amount
+
+    negative = [s for s, b in balances.items() if b < 0]
+    wrong = [s for s in students if balances[s] != START_BALANCE - totals.get(s, 0)]
+
+    print(f"{args.threads} threads on {args.wallets} wallets ({args.hot} hot) for {elapsed:.1f} s")
+    print(f"debits: {succeeded} succeeded, {declined} declined -> {succeeded / elapsed:.0f} debits/s "
+          f"({(succeeded + declined) / elapsed:.0f} attempts/s)")
+    print(f"negative balances: {len(negative)}, balance != funding - debits: {len(wrong)}, "
+          f"snapshot + ledger mismatches: {len(mismatches)}")
+    if negative or wrong or mismatches:
+        print("FAIL")
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,289 @@
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import db
+import money
+import popularity
+import rollups
+import wallet_logic
+from group_commit import GroupCommitWriter, WriteCancelled, WritePending
+
+DB_FILE = db.SUPER_APP_DB
+
+# Largest quantity of one item accepted on a single order line.
+MAX_LINE_QUANTITY = 100
+# Seconds to wait for the sales writer before giving up on an order.
+ORDER_TIMEOUT_SECONDS = 10
+
+
+def initialize_canteen_schema(db_path=None):
+    """Creates the canteen tables, the menu version trigger and indexes if missing."""
+    conn = db.connect(db_path or DB_FILE)
+    cursor = conn.cursor()
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS menu_items (
+            item_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            price REAL NOT NULL
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS canteen_orders (
+            order_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            counter TEXT,
+            student_id TEXT,
+            total_price REAL NOT NULL,
+            created_at TEXT NOT NULL
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS canteen_sales (
+            sale_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            item_id INTEGER,
+            quantity INTEGER NOT NULL,
+            total_price REAL NOT NULL,
+            sale_date TEXT NOT NULL,
+            order_id INTEGER REFERENCES canteen_orders (order_id),
+            FOREIGN KEY (item_id) REFERENCES menu_items (item_id)
+        )
+    """)
+    # Older databases predate multi-line orders and wallet payments
+    db.add_column_if_missing(cursor, 'canteen_sales', 'order_id', 'INTEGER REFERENCES canteen_orders (order_id)')
+    db.add_column_if_missing(cursor, 'canteen_orders', 'student_id', 'TEXT')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_canteen_sales_order ON canteen_sales (order_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_canteen_sales_date ON canteen_sales (sale_date)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_canteen_orders_student ON canteen_orders (student_id, created_at)")
+
+    # Any change to menu_items (from this or any other process) bumps a
+    # version number, which is how price caches know to reload.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS menu_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+    """)
+    cursor.execute("INSERT OR IGNORE INTO menu_version (id, version) VALUES (1, 0)")
+    for event in ('INSERT', 'UPDATE', 'DELETE'):
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS menu_items_version_{event.lower()} AFTER {event} ON menu_items BEGIN
+                UPDATE menu_version SET version = version + 1 WHERE id = 1;
+            END
+        """)
+
+    rollups.create_rollup_tables(cursor)
+
+    conn.commit()
+    conn.close()
+
+
+# --- Menu Cache ---
+
+# The menu is served from memory. Local writes drop the cache at once;
+# changes made by other processes are noticed through menu_version,
+# which is checked at most once per MENU_CHECK_SECONDS.
+MENU_CHECK_SECONDS = 1.0
+
+_menu_lock = threading.Lock()
+_menu = None            # {item_id: {'item_id', 'name', 'price'}}
+_menu_version = None
+_menu_checked_at = 0.0
+
+
+def invalidate_menu_cache():
+    """Drops the cached menu (call after menu_items changes)."""
+    global _menu
+    with _menu_lock:
+        _menu = None
+
+
+def get_menu():
+    """
+    Returns the current menu as {item_id: {'item_id', 'name', 'price'}}.
+    Served from memory; reloads only when menu_items has changed.
+    """
+    global _menu, _menu_version, _menu_checked_at
+    now = time.monotonic()
+    with _menu_lock:
+        if _menu is not None and now - _menu_checked_at < MENU_CHECK_SECONDS:
+            return _menu
+
+    with db.get_pool(DB_FILE).connection() as conn:
+        version = conn.execute("SELECT version FROM menu_version WHERE id = 1").fetchone()[0]
+        with _menu_lock:
+            if _menu is not None and version == _menu_version:
+                _menu_checked_at = now
+                return _menu
+        rows = conn.execute("SELECT item_id, name, price FROM menu_items ORDER BY name").fetchall()
+
+    menu = {row['item_id']: dict(row) for row in rows}
+    with _menu_lock:
+        _menu, _menu_version, _menu_checked_at = menu, version, now
+    return menu
+
+
+def get_menu_items():
+    """Returns the menu as a list of dicts, ordered by name."""
+    return list(get_menu().values())
+
+
+def add_menu_item(name, price):
+    """
+    Adds an item to the canteen menu.
+    Returns a success or error message string.
+    """
+    try:
+        price = round(float(price), 2)
+    except (TypeError, ValueError):
+        return "Error: Price must be a number."
+    if price < 0:
+        return "Error: Price cannot be negative."
+    if not name:
+        return "Error: Item name is required."
+
+    try:
+        with db.transaction(DB_FILE) as conn:
+            item_id = conn.execute(
+                "INSERT INTO menu_items (name, price) VALUES (?, ?)", (name, price)
+            ).lastrowid
+    except sqlite3.IntegrityError:
+        return f"Error: A menu item named '{name}' already exists."
+    invalidate_menu_cache()
+    return f"Success: Menu item '{name}' added with ID: {item_id}."
+
+
+# --- Point of Sale ---
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_sales_writer():
+    """Returns the process-wide group-commit writer for canteen sales."""
+    global _writer
+    with _writer_lock:
+        if _writer is None or _writer.db_path != DB_FILE:
+            _writer = GroupCommitWriter(DB_FILE, name="canteen-sales")
+        return _writer
+
+
+def price_order(lines):
+    """
+    Validates order lines against the cached menu.
+    lines is a list of (item_id, quantity) pairs; repeated items are merged.
+    Returns (priced_lines, total, error): priced_lines is a list of dicts
+    with item_id, name, quantity, unit_price and total_price.
+    """
+    menu = get_menu()
+    quantities = {}
+    for line in lines:
+        try:
+            item_id, quantity = int(line[0]), int(line[1])
+        except (TypeError, ValueError, IndexError, KeyError):
+            return None, None, f"Error: Invalid order line: {line!r}"
+        if item_id not in menu:
+            return None, None, f"Error: No menu item found with ID: {item_id}"
+        if quantity <= 0 or quantity > MAX_LINE_QUANTITY:
+            return None, None, f"Error: Quantity for item {item_id} must be between 1 and {MAX_LINE_QUANTITY}."
+        quantities[item_id] = quantities.get(item_id, 0) + quantity
+
+    if not quantities:
+        return None, None, "Error: An order needs at least one line."
+
+    priced = []
+    for item_id, quantity in quantities.items():
+        item = menu[item_id]
+        priced.append({
+            'item_id': item_id,
+            'name': item['name'],
+            'quantity': quantity,
+            'unit_price': item['price'],
+            'total_price': round(item['price'] * quantity, 2),
+        })
+    return priced, round(sum(line['total_price'] for line in priced), 2), None
+
+
+def _write_order(conn, counter, priced, total, sale_date, student_id):
+    """
+    Writer job: inserts the order, its sale lines and the sales rollups,
+    debiting the student's wallet when one is given. A short wallet
+    raises WalletError, which rolls back just this order.
+    """
+    order_id = conn.execute(
+        "INSERT INTO canteen_orders (counter, student_id, total_price, created_at) VALUES (?, ?, ?, ?)",
+        (counter, student_id, total, sale_date)
+    ).lastrowid
+    if student_id:
+        wallet_logic.debit(conn, student_id, money.to_paise(total), 'canteen', f"order {order_id}")
+    conn.executemany("""
+        INSERT INTO canteen_sales (item_id, quantity, total_price, sale_date, order_id)
+        VALUES (?, ?, ?, ?, ?)
+    """, [(line['item_id'], line['quantity'], line['total_price'], sale_date, order_id) for line in priced])
+    rollups.record_menu_sales(conn, sale_date[:10],
+                              {line['item_id']: (line['quantity'], line['total_price']) for line in priced})
+    return order_id
+
+
+def place_order(lines, counter=None, student_id=None):
+    """
+    Rings up a multi-line order: prices it from the menu cache and hands
+    the write to the sales writer, waiting for the batch to commit.
+    With a student_id the order is paid from that student's wallet in the
+    same transaction as the sale insert.
+    Returns (message, order): order is a dict with order_id, total and
+    lines on success, or None on error. If the writer is still running
+    the order when the wait times out, the message starts with "Pending:"
+    since the order (and its wallet debit) may yet commit.
+    """
+    priced, total, error = price_order(lines)
+    if error:
+        return error, None
+
+    student_id = str(student_id).strip() if student_id else None
+    sale_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    try:
+        order_id = get_sales_writer().run(_write_order, counter, priced, total, sale_date, student_id,
+                                          timeout=ORDER_TIMEOUT_SECONDS)
+    except wallet_logic.WalletError as e:
+        return f"Error: {e}", None
+    except WriteCancelled:
+        return "Error: Could not record order: the sales writer is busy. Nothing was charged; try again.", None
+    except WritePending:
+        charged = f" and charged to student {student_id}'s wallet" if student_id else ""
+        return (f"Pending: Order not confirmed yet; it may still be recorded{charged}. "
+                "Check recent orders before ringing it up again."), None
+    except sqlite3.Error as e:
+        return f"Error: Could not record order: {e}", None
+
+    order = {'order_id': order_id, 'total': total, 'lines': priced, 'student_id': student_id}
+    paid_by = f" from student {student_id}'s wallet" if student_id else ""
+    return f"Success: Order {order_id} recorded for ₹{total:.2f}{paid_by}.", order
+
+
+def get_recent_orders(limit=20):
+    """Fetches the most recent orders with their item counts."""
+    with db.get_pool(DB_FILE).connection() as conn:
+        return conn.execute("""
+            SELECT o.order_id, o.counter, o.student_id, o.total_price, o.created_at, SUM(s.quantity) AS items
+            FROM canteen_orders o
+            JOIN canteen_sales s ON s.order_id = o.order_id
+            GROUP BY o.order_id
+            ORDER BY o.order_id DESC
+            LIMIT ?
+        """, (limit,)).fetchall()
+
+
+def get_popular_items(window='week', k=10):
+    """
+    Best-selling menu items in a popularity window ('week', 'month' or 'term').
+    Returns a list of dicts with item_id, name and quantity.
+    """
+    menu = get_menu()
+    return [
+        {'item_id': item_id, 'name': menu[item_id]['name'], 'quantity': quantity}
+        for item_id, quantity in popularity.top_menu_items(window, k, DB_FILE) if item_id in menu
+    ]
@@ -0,0 +1,233 @@
+"""
+Analytics charts, rendered in the background and cached on disk.
+
+Each chart reads the daily rollup tables and is keyed by the
+data_versions counters of the data sets it draws from. A worker thread
+polls those versions and re-renders a chart (PNG and SVG) only when
+they change; the analytics page and the chart route just look up the
+current file, so no request ever imports or runs matplotlib.
+
+Files are named <chart>-<version>.<png|svg>. A chart with no data gets
+an <chart>-<version>.empty marker instead, so it is not retried until
+its data changes.
+
+Every worker process runs its own chart worker on the shared directory:
+each render writes to its own temporary file before renaming it into
+place, and readers treat a file removed under them as not rendered.
+"""
+import os
+import tempfile
+import threading
+from datetime import datetime, timedelta
+
+import db
+
+CHART_DIR = "chart_cache"
+
+# Seconds between data_versions checks (renders are also triggered on demand).
+POLL_SECONDS = 5
+
+# Days of history shown in the time-series charts.
+CHART_DAYS = 30
+
+FORMATS = {
+    'png': 'image/png',
+    'svg': 'image/svg+xml',
+}
+
+
+def _canteen_data(conn):
+    since = (datetime.now() - timedelta(days=CHART_DAYS - 1)).strftime('%Y-%m-%d')
+    rows = conn.execute("""
+        SELECT m.name, SUM(s.quantity) AS quantity
+        FROM menu_item_daily_sales s
+        JOIN menu_items m ON m.item_id = s.item_id
+        WHERE s.stat_date >= ?
+        GROUP BY s.item_id
+        ORDER BY quantity DESC
+        LIMIT 15
+    """, (since,)).fetchall()
+    return [(row['name'], row['quantity']) for row in rows]
+
+
+def _library_data(conn):
+    since = (datetime.now() - timedelta(days=CHART_DAYS - 1)).strftime('%Y-%m-%d')
+    rows = conn.execute("""
+        SELECT stat_date, SUM(issues) AS issues
+        FROM book_daily_issues
+        WHERE stat_date >= ?
+        GROUP BY stat_date
+        ORDER BY stat_date
+    """, (since,)).fetchall()
+    return [(row['stat_date'], row['issues']) for row in rows]
+
+
+def _draw_canteen(ax, data):
+    names = [name for name, _ in data][::-1]
+    quantities = [quantity for _, quantity in data][::-1]
+    ax.barh(names, quantities, color='#3b82f6')
+    ax.set_title(f"Items sold, last {CHART_DAYS} days")
+    ax.set_xlabel("Quantity")
+
+
+def _draw_library(ax, data):
+    dates = [datetime.strptime(day, '%Y-%m-%d') for day, _ in data]
+    ax.plot(dates, [issues for _, issues in data], marker='o', color='#10b981')
+    ax.set_title(f"Books issued per day, last {CHART_DAYS} days")
+    ax.set_ylabel("Issues")
+    ax.figure.autofmt_xdate()
+
+
+# name -> (data sets it depends on, data query, drawing function)
+CHARTS = {
+    'canteen': (('canteen_sales',), _canteen_data, _draw_canteen),
+    'library': (('book_issues',), _library_data, _draw_library),
+}
+
+
+def chart_version(name, versions):
+    """Returns the cache key for a chart given {data set: version}."""
+    sources = CHARTS[name][0]
+    return ".".join(str(versions.get(source, 0)) for source in sources)
+
+
+def _render(name, data, chart_dir, version):
+    """Draws one chart and writes its PNG and SVG atomically."""
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    # Figure/FigureCanvasAgg rather than pyplot: pyplot keeps global state
+    # and is not safe off the main thread.
+    figure = Figure(figsize=(8, 5), dpi=100)
+    FigureCanvasAgg(figure)
+    ax = figure.add_subplot()
+    CHARTS[name][2](ax, data)
+    figure.tight_layout()
+
+    for fmt in FORMATS:
+        path = os.path.join(chart_dir, f"{name}-{version}.{fmt}")
+        # A unique temporary name per render: other processes may be drawing the same chart.
+        # The leading dot keeps it out of _remove_old() and latest_rendered().
+        fd, tmp_path = tempfile.mkstemp(prefix=f".{name}-{version}.", suffix=f".{fmt}", dir=chart_dir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                figure.savefig(f, format=fmt)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+
+def _remove_old(name, chart_dir, keep_version):
+    try:
+        filenames = os.listdir(chart_dir)
+    except FileNotFoundError:
+        return
+    for filename in filenames:
+        if filename.startswith(f"{name}-") and not filename.startswith(f"{name}-{keep_version}."):
+            try:
+                os.remove(os.path.join(chart_dir, filename))
+            except OSError:
+                pass
+
+
+def current_chart(name, db_path=None, chart_dir=None):
+    """
+    Looks up the rendered chart for the current data version.
+    Returns (version, status) where status is 'ready', 'empty' or 'pending'.
+    """
+    chart_dir = chart_dir or CHART_DIR
+    with db.get_pool(db_path or db.SUPER_APP_DB).connection() as conn:
+        version = chart_version(name, db.get_data_versions(conn))
+    if os.path.exists(os.path.join(chart_dir, f"{name}-{version}.png")):
+        return version, 'ready'
+    if os.path.exists(os.path.join(chart_dir, f"{name}-{version}.empty")):
+        return version, 'empty'
+    return version, 'pending'
+
+
+def latest_rendered(name, chart_dir=None):
+    """
+    Returns the version of any rendered PNG for a chart (there is at most
+    one outside a render), or None. Used to show the previous chart while
+    the current version is still being drawn.
+    """
+    chart_dir = chart_dir or CHART_DIR
+    if not os.path.isdir(chart_dir):
+        return None
+    for filename in os.listdir(chart_dir):
+        if filename.startswith(f"{name}-") and filename.endswith(".png"):
+            return filename[len(name) + 1:-len(".png")]
+    return None
+
+
+def open_chart(name, version, fmt, chart_dir=None):
+    """
+    Opens a rendered chart file for reading (binary), or returns None if it
+    does not exist, including when another process has just replaced it.
+    """
+    if name not in CHARTS or fmt not in FORMATS:
+        return None
+    try:
+        return open(os.path.join(chart_dir or CHART_DIR, f"{name}-{version}.{fmt}"), 'rb')
+    except FileNotFoundError:
+        return None
+
+
+def render_stale_charts(db_path=None, chart_dir=None):
+    """
+    Renders every chart whose data version has no files yet.
+    Returns the names of the charts rendered.
+    """
+    chart_dir = chart_dir or CHART_DIR
+    os.makedirs(chart_dir, exist_ok=True)
+    rendered = []
+    with db.get_pool(db_path or db.SUPER_APP_DB).connection() as conn:
+        versions = db.get_data_versions(conn)
+        for name, (_, query, _) in CHARTS.items():
+            version = chart_version(name, versions)
+            if any(os.path.exists(os.path.join(chart_dir, f"{name}-{version}.{ext}")) for ext in ('png', 'empty')):
+                continue
+            data = query(conn)
+            if data:
+                _render(name, data, chart_dir, version)
+            else:
+                open(os.path.join(chart_dir, f"{name}-{version}.empty"), 'w').close()
+            _remove_old(name, chart_dir, version)
+            rendered.append(name)
+    return rendered
+
+
+# --- Background Worker ---
+
+_worker = None
+_worker_lock = threading.Lock()
+_wake = threading.Event()
+
+
+def request_render():
+    """Wakes the worker to check for stale charts now instead of at the next poll."""
+    _wake.set()
+
+
+def ensure_worker(db_path=None, chart_dir=None):
+    """Starts the per-process chart worker if it is not already running."""
+    global _worker
+    with _worker_lock:
+        if _worker is not None and _worker.is_alive():
+            return
+
+        def run():
+            while True:
+                try:
+                    render_stale_charts(db_path, chart_dir)
+                except Exception as e:
+                    print(f"Chart render error: {e}")
+                _wake.wait(POLL_SECONDS)
+                _wake.clear()
+
+        _worker = threading.Thread(target=run, name="chart-worker", daemon=True)
+        _worker.start()
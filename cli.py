@@ -0,0 +1,142 @@
+"""
+Standalone command-line interface over cli_logic.
+
+Runs without importing the Flask app or its web/analytics stack, so it
+starts fast enough for cron-driven maintenance scripts.
+
+Usage:
+    python -m cli list
+    python -m cli find someone@example.com
+    python -m cli toggle 12 [13 ...]
+    python -m cli edit 12 phone 9876543210
+    python -m cli edit-trans 101 status Paid
+    python -m cli edit-bill 55 paid_amount 1500
+    python -m cli bulk fixes.txt [--dry-run]      (use '-' to read stdin)
+    python -m cli export 12 [-o ledger.csv]
+"""
+import argparse
+import sys
+from datetime import datetime
+
+import cli_logic
+
+
+def cmd_list(args):
+    for c in cli_logic.get_all_customers():
+        print(f"ID: {c['customer_id']} | Name: {c['name']} | Status: {c['status']}")
+    return 0
+
+
+def cmd_find(args):
+    customer = cli_logic.find_customer_by_email(args.email)
+    if not customer:
+        print(f"No customer found with email: {args.email}")
+        return 1
+    for key, value in cli_logic.customer_for_display(customer).items():
+        print(f"{key}: {value}")
+    return 0
+
+
+def cmd_toggle(args):
+    if len(args.ids) == 1:
+        results = [cli_logic.toggle_customer_status(args.ids[0])]
+    else:
+        results = cli_logic.bulk_toggle_customer_status(args.ids)
+    return _print_results(results)
+
+
+def cmd_edit(args):
+    edit_functions = {
+        'edit': cli_logic.edit_customer_details,
+        'edit-trans': cli_logic.edit_transaction_details,
+        'edit-bill': cli_logic.edit_bill_details,
+    }
+    # Re-join the value so unquoted values with spaces still work
+    new_value = " ".join(args.value)
+    return _print_results([edit_functions[args.command](args.id, args.field, new_value)])
+
+
+def cmd_bulk(args):
+    if args.script == '-':
+        script_text = sys.stdin.read()
+    else:
+        with open(args.script, encoding='utf-8') as f:
+            script_text = f.read()
+
+    ok = True
+    for line in cli_logic.run_batch_script(script_text, dry_run=args.dry_run):
+        sys.stdout.write(line)
+        if "Error" in line or line.startswith("Batch aborted"):
+            ok = False
+    return 0 if ok else 1
+
+
+def cmd_export(args):
+    lines = cli_logic.iter_ledger_csv(args.id, datetime.now().strftime('%Y-%m-%d %H:%M'))
+    out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    written = 0
+    try:
+        for line in lines:
+            out.write(line)
+            written += 1
+    finally:
+        if args.output:
+            out.close()
+
+    if not written:
+        print(f"Error: No customer found with ID: {args.id}", file=sys.stderr)
+        return 1
+    return 0
+
+
+def _print_results(results):
+    for message in results:
+        print(message)
+    return 0 if all(message.startswith("Success") for message in results) else 1
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="cli", description="Record Book maintenance CLI")
+    parser.add_argument('--db', default=cli_logic.DB_FILE, help="path to record_book.db")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    sub.add_parser('list', help="View all customers").set_defaults(func=cmd_list)
+
+    p = sub.add_parser('find', help="Find a customer by email")
+    p.add_argument('email')
+    p.set_defaults(func=cmd_find)
+
+    p = sub.add_parser('toggle', help="Activate/Deactivate one or more customers")
+    p.add_argument('ids', nargs='+', type=int)
+    p.set_defaults(func=cmd_toggle)
+
+    for name, help_text in (('edit', "Edit customer details"),
+                            ('edit-trans', "Edit transaction details"),
+                            ('edit-bill', "Edit monthly bill details")):
+        p = sub.add_parser(name, help=help_text)
+        p.add_argument('id', type=int)
+        p.add_argument('field')
+        p.add_argument('value', nargs='+')
+        p.set_defaults(func=cmd_edit)
+
+    p = sub.add_parser('bulk', help="Run a batch script in one transaction")
+    p.add_argument('script', help="script file, or '-' for stdin")
+    p.add_argument('--dry-run', action='store_true', help="validate, then roll back")
+    p.set_defaults(func=cmd_bulk)
+
+    p = sub.add_parser('export', help="Export a customer ledger as CSV")
+    p.add_argument('id', type=int)
+    p.add_argument('-o', '--output', help="output file (default: stdout)")
+    p.set_defaults(func=cmd_export)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    cli_logic.DB_FILE = args.db
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,12 +1,44 @@
+import shlex
 import sqlite3
 
+import db
+import group_commit
+import money
+
 DB_FILE = "record_book.db"
 
+# Whitelists of fields that may be edited through the CLI.
+# We block changing 'customer_id' or 'transaction_type' to protect data integrity.
+CUSTOMER_EDITABLE_FIELDS = [
+    'name', 'email', 'phone', 'address', 'gst_number',
+    'credit_limit', 'payment_days_limit', 'status', 'reminder_preference'
+]
+
+TRANSACTION_EDITABLE_FIELDS = [
+    'amount', 'tax_amount', 'total_amount', 'description', 
+    'transaction_date', 'due_date', 'status', 
+    'payment_mode', 'reference_number'
+]
+
+BILL_EDITABLE_FIELDS = [
+    'bill_month', 'subtotal', 'tax_amount', 'total_amount', 
+    'paid_amount', 'due_amount', 'bill_date', 'due_date', 
+    'status', 'sent_date', 'last_reminder_date', 'reminder_count'
+]
+
+# Bulk edit targets: (table, primary key, allowed fields, label, plural used in messages)
+EDIT_TARGETS = {
+    'customer': ('customers', 'customer_id', CUSTOMER_EDITABLE_FIELDS, 'Customer', 'customers'),
+    'transaction': ('transactions', 'transaction_id', TRANSACTION_EDITABLE_FIELDS, 'Transaction', 'transactions'),
+    'bill': ('monthly_bills', 'bill_id', BILL_EDITABLE_FIELDS, 'Bill', 'monthly bills'),
+}
+
+# Keep IN (...) lists under SQLite's default host-parameter limit.
+SQL_CHUNK_SIZE = 500
+
 def get_db_conn():
-    """Helper function to get a database connection."""
-    conn = sqlite3.connect(DB_FILE)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """Helper function to get a pooled database connection (close() returns it)."""
+    return db.connect(DB_FILE, foreign_keys=False)
 
 def get_all_customers():
     """
@@ -32,31 +64,40 @@ def get_customer_by_id(customer_id):
     conn.close()
     return customer
 
+def customer_for_display(customer):
+    """
+    Returns a customer row as a dict with money fields (stored in paise)
+    as rupee strings, for printing.
+    """
+    shown = dict(customer)
+    for field in money.MONEY_COLUMNS['customers']:
+        if field in shown:
+            shown[field] = money.rupees_str(shown[field])
+    return shown
+
+def _toggle_status(conn, customer_id):
+    """Write job: flips a customer's status. Returns (name, new status), or None if not found."""
+    customer = conn.execute("SELECT name, status FROM customers WHERE customer_id = ?", (customer_id,)).fetchone()
+    if not customer:
+        return None
+    new_status = "Active" if customer['status'] == 'Inactive' else 'Inactive'
+    conn.execute("UPDATE customers SET status = ? WHERE customer_id = ?", (new_status, customer_id))
+    return customer['name'], new_status
+
 def toggle_customer_status(customer_id):
     """
     Toggles a customer's status between 'Active' and 'Inactive'.
     Returns a success or error message string.
     """
-    conn = get_db_conn()
-    cursor = conn.cursor()
-    
-    # First, get the customer to check their current status
-    customer = get_customer_by_id(customer_id)
-    if not customer:
-        conn.close()
-        return f"Error: No customer found with ID: {customer_id}"
-
-    # Determine the new status
-    new_status = "Active" if customer['status'] == 'Inactive' else 'Inactive'
-    
+    # Read and update in one write transaction (group commit when GROUP_COMMIT=1)
     try:
-        cursor.execute("UPDATE customers SET status = ? WHERE customer_id = ?", (new_status, customer_id))
-        conn.commit()
-        conn.close()
-        return f"Success: Customer {customer['name']} (ID: {customer_id}) status changed to {new_status}."
+        toggled = group_commit.write(DB_FILE, _toggle_status, customer_id, foreign_keys=False)
     except Exception as e:
-        conn.close()
         return f"Error: Could not update customer. {e}"
+    if toggled is None:
+        return f"Error: No customer found with ID: {customer_id}"
+    name, new_status = toggled
+    return f"Success: Customer {name} (ID: {customer_id}) status changed to {new_status}."
 
 def find_customer_by_email(email):
     """
@@ -70,119 +111,431 @@ def find_customer_by_email(email):
     conn.close()
     return customer
 
+def iter_ledger_csv(customer_id, generated_on, db_path=None):
+    """
+    Yields a customer's ledger from db_path (default DB_FILE) as CSV text,
+    one line at a time. Yields nothing if the customer does not exist.
+    """
+    conn = db.connect(db_path or DB_FILE, foreign_keys=False)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT name FROM customers WHERE customer_id = ?", (customer_id,))
+        customer = cursor.fetchone()
+        if not customer:
+            return
+        
+        yield f"Customer Ledger - {customer['name']}\n"
+        yield f"Generated on: {generated_on}\n\n"
+        yield "Date,Type,Description,Amount,Tax,Total,Status,Due Date\n"
+        
+        cursor.execute("""
+            SELECT transaction_date, transaction_type, description, amount, tax_amount, 
+                   total_amount, status, due_date 
+            FROM transactions 
+            WHERE customer_id = ? 
+            ORDER BY transaction_date ASC
+        """, (customer_id,))
+        for trans in cursor:
+            yield (f"{trans['transaction_date']},{trans['transaction_type']},{trans['description'] or ''},"
+                   f"{money.rupees_str(trans['amount'])},{money.rupees_str(trans['tax_amount'])},"
+                   f"{money.rupees_str(trans['total_amount'])},{trans['status']},{trans['due_date'] or ''}\n")
+    finally:
+        conn.close()
+
+def _stored_value(table, field, value):
+    """
+    Converts an edited value to how the table stores it: money fields are
+    typed in rupees and stored as integer paise. Raises ValueError for an
+    amount that is not a number.
+    """
+    if field in money.MONEY_COLUMNS.get(table, ()):
+        return money.to_paise(value)
+    return value
+
+def _update_field(conn, table, id_column, field, value, record_id):
+    """
+    Write job: sets one whitelisted field on one row. Returns the number of rows updated.
+    We can safely use an f-string for the names *because* callers check them against the whitelists.
+    """
+    return conn.execute(f"UPDATE {table} SET {field} = ? WHERE {id_column} = ?", (value, record_id)).rowcount
+
 def edit_transaction_details(transaction_id, field_to_edit, new_value):
     """
     Edits a single field for a transaction.
     Returns a success or error message string.
     """
-    # Whitelist of allowed fields.
-    # We block changing 'customer_id' or 'transaction_type' to protect data integrity.
-    allowed_fields = [
-        'amount', 'tax_amount', 'total_amount', 'description', 
-        'transaction_date', 'due_date', 'status', 
-        'payment_mode', 'reference_number'
-    ]
-    
     field_to_edit = field_to_edit.lower()
-    if field_to_edit not in allowed_fields:
+    if field_to_edit not in TRANSACTION_EDITABLE_FIELDS:
         return f"Error: Editing '{field_to_edit}' is not allowed on transactions."
 
-    conn = get_db_conn()
-    cursor = conn.cursor()
-    
-    # We can safely use f-string for the field name
-    # *because* we checked it against the 'allowed_fields' list.
-    sql_query = f"UPDATE transactions SET {field_to_edit} = ? WHERE transaction_id = ?"
-    
     try:
-        cursor.execute(sql_query, (new_value, transaction_id))
-        
-        if cursor.rowcount == 0:
-            conn.close()
-            return f"Error: No transaction found with ID: {transaction_id}"
-            
-        conn.commit()
-        conn.close()
-        return f"Success: Transaction {transaction_id}'s {field_to_edit} updated to '{new_value}'."
-    
+        stored_value = _stored_value('transactions', field_to_edit, new_value)
+    except ValueError:
+        return f"Error: '{new_value}' is not a valid amount for {field_to_edit}."
+
+    try:
+        updated = group_commit.write(DB_FILE, _update_field, 'transactions', 'transaction_id',
+                                     field_to_edit, stored_value, transaction_id, foreign_keys=False)
     except sqlite3.IntegrityError as e:
-        conn.close()
         return f"Database Error: {e}. Check if the value is valid (e.g., date format)."
     except Exception as e:
-        conn.close()
         return f"Error: Could not update transaction. {e}"
+    if updated == 0:
+        return f"Error: No transaction found with ID: {transaction_id}"
+    return f"Success: Transaction {transaction_id}'s {field_to_edit} updated to '{new_value}'."
 
 def edit_customer_details(customer_id, field_to_edit, new_value):
     """
     Edits a single field for a customer.
     Returns a success or error message string.
     """
-    allowed_fields = [
-        'name', 'email', 'phone', 'address', 'gst_number',
-        'credit_limit', 'payment_days_limit', 'status', 'reminder_preference'
-    ]
-    
     field_to_edit = field_to_edit.lower()
-    if field_to_edit not in allowed_fields:
+    if field_to_edit not in CUSTOMER_EDITABLE_FIELDS:
         return f"Error: Editing '{field_to_edit}' is not allowed on customers."
 
-    conn = get_db_conn()
-    cursor = conn.cursor()
-    
-    sql_query = f"UPDATE customers SET {field_to_edit} = ? WHERE customer_id = ?"
-    
     try:
-        cursor.execute(sql_query, (new_value, customer_id))
-        
-        if cursor.rowcount == 0:
-            conn.close()
-            return f"Error: No customer found with ID: {customer_id}"
-            
-        conn.commit()
-        conn.close()
-        return f"Success: Customer {customer_id}'s {field_to_edit} updated to '{new_value}'."
-    
+        stored_value = _stored_value('customers', field_to_edit, new_value)
+    except ValueError:
+        return f"Error: '{new_value}' is not a valid amount for {field_to_edit}."
+
+    try:
+        updated = group_commit.write(DB_FILE, _update_field, 'customers', 'customer_id',
+                                     field_to_edit, stored_value, customer_id, foreign_keys=False)
     except sqlite3.IntegrityError as e:
-        conn.close()
         return f"Database Error: {e}. Check if the value is valid (e.g., unique email)."
     except Exception as e:
-        conn.close()
         return f"Error: Could not update customer. {e}"
+    if updated == 0:
+        return f"Error: No customer found with ID: {customer_id}"
+    return f"Success: Customer {customer_id}'s {field_to_edit} updated to '{new_value}'."
 
 def edit_bill_details(bill_id, field_to_edit, new_value):
     """
     Edits a single field for a monthly bill.
     Returns a success or error message string.
     """
-    allowed_fields = [
-        'bill_month', 'subtotal', 'tax_amount', 'total_amount', 
-        'paid_amount', 'due_amount', 'bill_date', 'due_date', 
-        'status', 'sent_date', 'last_reminder_date', 'reminder_count'
-    ]
-    
     field_to_edit = field_to_edit.lower()
-    if field_to_edit not in allowed_fields:
+    if field_to_edit not in BILL_EDITABLE_FIELDS:
         return f"Error: Editing '{field_to_edit}' is not allowed on monthly bills."
 
+    try:
+        stored_value = _stored_value('monthly_bills', field_to_edit, new_value)
+    except ValueError:
+        return f"Error: '{new_value}' is not a valid amount for {field_to_edit}."
+
+    try:
+        updated = group_commit.write(DB_FILE, _update_field, 'monthly_bills', 'bill_id',
+                                     field_to_edit, stored_value, bill_id, foreign_keys=False)
+    except sqlite3.IntegrityError as e:
+        return f"Database Error: {e}. Check if the value is valid (e.g., date format)."
+    except Exception as e:
+        return f"Error: Could not update bill. {e}"
+    if updated == 0:
+        return f"Error: No bill found with ID: {bill_id}"
+    return f"Success: Bill {bill_id}'s {field_to_edit} updated to '{new_value}'."
+
+
+# --- Bulk Edits ---
+
+def _existing_ids(cursor, table, id_column, record_ids):
+    """Returns the subset of record_ids that exist in the table."""
+    found = set()
+    unique_ids = list(dict.fromkeys(record_ids))
+    for start in range(0, len(unique_ids), SQL_CHUNK_SIZE):
+        chunk = unique_ids[start:start + SQL_CHUNK_SIZE]
+        placeholders = ", ".join("?" for _ in chunk)
+        cursor.execute(f"SELECT {id_column} FROM {table} WHERE {id_column} IN ({placeholders})", chunk)
+        found.update(row[0] for row in cursor.fetchall())
+    return found
+
+def _apply_bulk_edits(cursor, target, edits):
+    """
+    Validates a list of (id, field, new_value) edits for one table against
+    its whitelist and applies the valid ones with one executemany per field.
+    Does not commit; the caller owns the transaction.
+    Returns a list of per-row message strings, in the same order as edits,
+    and the number of rows that were applied.
+    """
+    table, id_column, allowed_fields, label, plural = EDIT_TARGETS[target]
+    
+    results = [None] * len(edits)
+    normalized = []
+    for index, (record_id, field_to_edit, new_value) in enumerate(edits):
+        field_to_edit = str(field_to_edit).lower()
+        if field_to_edit not in allowed_fields:
+            results[index] = f"Error: Editing '{field_to_edit}' is not allowed on {plural}."
+            continue
+        try:
+            record_id = int(record_id)
+        except (TypeError, ValueError):
+            results[index] = f"Error: Invalid {label.lower()} ID: {record_id}"
+            continue
+        try:
+            stored_value = _stored_value(table, field_to_edit, new_value)
+        except ValueError:
+            results[index] = f"Error: '{new_value}' is not a valid amount for {field_to_edit}."
+            continue
+        normalized.append((index, record_id, field_to_edit, new_value, stored_value))
+    
+    existing = _existing_ids(cursor, table, id_column, [record_id for _, record_id, _, _, _ in normalized])
+    
+    # Group by field so each field is one prepared UPDATE run through executemany.
+    # Order within a field is preserved, so the last edit of a row wins.
+    by_field = {}
+    for index, record_id, field_to_edit, new_value, stored_value in normalized:
+        if record_id not in existing:
+            results[index] = f"Error: No {label.lower()} found with ID: {record_id}"
+            continue
+        by_field.setdefault(field_to_edit, []).append((index, record_id, new_value, stored_value))
+    
+    applied = 0
+    for field_to_edit, rows in by_field.items():
+        # Safe to format the field name: it passed the whitelist above.
+        cursor.executemany(
+            f"UPDATE {table} SET {field_to_edit} = ? WHERE {id_column} = ?",
+            [(stored_value, record_id) for _, record_id, _, stored_value in rows]
+        )
+        for index, record_id, new_value, _ in rows:
+            results[index] = f"Success: {label} {record_id}'s {field_to_edit} updated to '{new_value}'."
+        applied += len(rows)
+    
+    return results, applied
+
+def _run_bulk_edit(target, edits):
+    """
+    Runs _apply_bulk_edits for one table in a single transaction.
+    If the database rejects any row, the whole batch is rolled back.
+    Returns a list of per-row message strings.
+    """
+    edits = list(edits)
     conn = get_db_conn()
     cursor = conn.cursor()
     
-    sql_query = f"UPDATE monthly_bills SET {field_to_edit} = ? WHERE bill_id = ?"
+    try:
+        results, _ = _apply_bulk_edits(cursor, target, edits)
+        conn.commit()
+        return results
+    except sqlite3.IntegrityError as e:
+        conn.rollback()
+        return [f"Database Error: {e}. Batch rolled back, no changes were applied."] * len(edits)
+    except Exception as e:
+        conn.rollback()
+        return [f"Error: Could not apply bulk edit. {e}"] * len(edits)
+    finally:
+        conn.close()
+
+def bulk_edit_customer_details(edits):
+    """
+    Applies many (customer_id, field, new_value) edits in one transaction.
+    Returns a list of success or error message strings, one per edit.
+    """
+    return _run_bulk_edit('customer', edits)
+
+def bulk_edit_transaction_details(edits):
+    """
+    Applies many (transaction_id, field, new_value) edits in one transaction.
+    Returns a list of success or error message strings, one per edit.
+    """
+    return _run_bulk_edit('transaction', edits)
+
+def bulk_edit_bill_details(edits):
+    """
+    Applies many (bill_id, field, new_value) edits in one transaction.
+    Returns a list of success or error message strings, one per edit.
+    """
+    return _run_bulk_edit('bill', edits)
+
+def _apply_bulk_toggle(cursor, customer_ids):
+    """
+    Toggles the status of many customers with one executemany.
+    Does not commit; the caller owns the transaction.
+    Returns a list of per-customer message strings.
+    """
+    customer_ids = list(customer_ids)
+    current = {}
+    unique_ids = list(dict.fromkeys(customer_ids))
+    for start in range(0, len(unique_ids), SQL_CHUNK_SIZE):
+        chunk = unique_ids[start:start + SQL_CHUNK_SIZE]
+        placeholders = ", ".join("?" for _ in chunk)
+        cursor.execute(f"SELECT customer_id, name, status FROM customers WHERE customer_id IN ({placeholders})", chunk)
+        for row in cursor.fetchall():
+            current[row['customer_id']] = (row['name'], row['status'])
+    
+    results = []
+    updates = []
+    for customer_id in customer_ids:
+        if customer_id not in current:
+            results.append(f"Error: No customer found with ID: {customer_id}")
+            continue
+        name, status = current[customer_id]
+        new_status = "Active" if status == 'Inactive' else 'Inactive'
+        # Track the status in case the same customer is toggled twice in one batch
+        current[customer_id] = (name, new_status)
+        updates.append((new_status, customer_id))
+        results.append(f"Success: Customer {name} (ID: {customer_id}) status changed to {new_status}.")
+    
+    cursor.executemany("UPDATE customers SET status = ? WHERE customer_id = ?", updates)
+    return results
+
+def bulk_toggle_customer_status(customer_ids):
+    """
+    Toggles many customers between 'Active' and 'Inactive' in one transaction.
+    Returns a list of success or error message strings, one per customer ID.
+    """
+    customer_ids = list(customer_ids)
+    conn = get_db_conn()
+    cursor = conn.cursor()
     
     try:
-        cursor.execute(sql_query, (new_value, bill_id))
-        
-        if cursor.rowcount == 0:
-            conn.close()
-            return f"Error: No bill found with ID: {bill_id}"
-            
+        results = _apply_bulk_toggle(cursor, customer_ids)
         conn.commit()
+        return results
+    except Exception as e:
+        conn.rollback()
+        return [f"Error: Could not update customers. {e}"] * len(customer_ids)
+    finally:
         conn.close()
-        return f"Success: Bill {bill_id}'s {field_to_edit} updated to '{new_value}'."
+
+
+# --- Batch Scripts ---
+
+# Script commands and the bulk edit target each one maps to ('toggle' has none).
+BATCH_COMMANDS = {
+    'edit': 'customer',
+    'edit-trans': 'transaction',
+    'edit-bill': 'bill',
+    'toggle': None,
+}
+
+def parse_batch_script(script_text):
+    """
+    Parses a script of edit/edit-trans/edit-bill/toggle lines with shlex.
+    Blank lines and lines starting with '#' are skipped.
+    Returns (commands, errors): commands is a list of (line_no, cmd, args)
+    tuples and errors is a list of message strings.
+    """
+    commands = []
+    errors = []
+    
+    for line_no, line in enumerate(script_text.splitlines(), start=1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        
+        try:
+            parts = shlex.split(line)
+        except ValueError as e:
+            errors.append(f"[line {line_no}] Error: Could not parse line. {e}")
+            continue
+        
+        cmd = parts[0].lower()
+        if cmd not in BATCH_COMMANDS:
+            errors.append(f"[line {line_no}] Error: Command '{cmd}' is not allowed in batch mode.")
+            continue
+        
+        try:
+            record_id = int(parts[1])
+        except IndexError:
+            errors.append(f"[line {line_no}] Error: Command '{cmd}' requires more arguments.")
+            continue
+        except ValueError:
+            errors.append(f"[line {line_no}] Error: Invalid argument. Expected a number.")
+            continue
+        
+        if cmd == 'toggle':
+            commands.append((line_no, cmd, (record_id,)))
+            continue
+        
+        if len(parts) < 4:
+            errors.append(f"[line {line_no}] Error: '{cmd}' command needs 3 arguments.")
+            continue
+        
+        # Everything after the field is the value, so unquoted spaces still work
+        commands.append((line_no, cmd, (record_id, parts[2].lower(), " ".join(parts[3:]))))
+    
+    return commands, errors
+
+def _consecutive_runs(commands):
+    """Splits commands into runs of the same command, keeping script order."""
+    run = []
+    for command in commands:
+        if run and run[-1][1] != command[1]:
+            yield run
+            run = []
+        run.append(command)
+    if run:
+        yield run
+
+def _execute_batch(commands, dry_run):
+    """
+    Applies parsed batch commands in one BEGIN IMMEDIATE transaction and
+    commits only if every line succeeded and this is not a dry run;
+    otherwise rolls back. The transaction is closed before returning.
+    Returns the output lines.
+    """
+    lines = []
+    failed = 0
+    conn = get_db_conn()
+    cursor = conn.cursor()
+    
+    try:
+        cursor.execute("BEGIN IMMEDIATE")
+        for run in _consecutive_runs(commands):
+            cmd = run[0][1]
+            if cmd == 'toggle':
+                results = _apply_bulk_toggle(cursor, [args[0] for _, _, args in run])
+            else:
+                results, _ = _apply_bulk_edits(cursor, BATCH_COMMANDS[cmd], [args for _, _, args in run])
+            
+            for (line_no, _, _), message in zip(run, results):
+                if not message.startswith("Success"):
+                    failed += 1
+                lines.append(f"[line {line_no}] {message}\n")
+        
+        if dry_run:
+            conn.rollback()
+            lines.append(f"Dry run complete: {len(commands) - failed} ok, {failed} failed. "
+                         "Rolled back, no changes were applied.\n")
+        elif failed:
+            conn.rollback()
+            lines.append(f"Batch aborted: {failed} line(s) failed. Rolled back, no changes were applied.\n")
+        else:
+            conn.commit()
+            lines.append(f"Batch committed: {len(commands)} applied.\n")
     
     except sqlite3.IntegrityError as e:
-        conn.close()
-        return f"Database Error: {e}. Check if the value is valid (e.g., date format)."
+        conn.rollback()
+        lines.append(f"Database Error: {e}. Batch rolled back, no changes were applied.\n")
     except Exception as e:
+        conn.rollback()
+        lines.append(f"Error: Batch failed and was rolled back. {e}\n")
+    finally:
         conn.close()
-        return f"Error: Could not update bill. {e}"
\ No newline at end of file
+    return lines
+
+def run_batch_script(script_text, dry_run=False):
+    """
+    Parses, validates and executes a batch script in a single transaction
+    through the bulk edit path. Consecutive lines of the same command are
+    applied together with executemany. If any line fails, the whole batch
+    is rolled back.
+    With dry_run=True everything is validated against the database and
+    then rolled back.
+    Yields output lines. The per-line results are yielded only after the
+    transaction has been committed or rolled back, so a slow reader (e.g.
+    a streamed HTTP response) never holds the write lock.
+    """
+    commands, errors = parse_batch_script(script_text)
+    
+    if errors:
+        for error in errors:
+            yield error + "\n"
+        yield f"Batch aborted: {len(errors)} line(s) could not be parsed. No changes were applied.\n"
+        return
+    
+    if not commands:
+        yield "Batch script is empty.\n"
+        return
+    
+    yield f"Parsed {len(commands)} command(s). {'Dry run' if dry_run else 'Executing'} in one transaction...\n"
+    yield from _execute_batch(commands, dry_run)
@@ -0,0 +1,388 @@
+"""
+Pooled SQLite connections for record_book.db and super_app.db.
+
+Every connection in the app comes from here. Each database file (or
+database plus a set of ATTACHed databases) gets one ConnectionPool, and
+connections are opened with the same pragmas in one place: WAL journal,
+busy timeout and, unless turned off for a database, foreign keys.
+
+Pooled connections are ordinary sqlite3.Connection objects (so pandas
+and `with conn:` work as before) whose close() hands them back to the
+pool instead of closing them.
+
+For questions that span both databases, attached() yields a connection
+to one database with the other ATTACHed under an alias, so a single
+SQL join replaces two connections and a Python-side merge.
+"""
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+RECORD_BOOK_DB = "record_book.db"
+SUPER_APP_DB = "super_app.db"
+
+DEFAULT_POOL_SIZE = 8
+BUSY_TIMEOUT_MS = 5000
+
+
+class PooledConnection(sqlite3.Connection):
+    """A sqlite3 connection whose close() returns it to its pool."""
+
+    _pool = None
+    _checked_out = False
+    # Cursor class used by cursor() and execute() (TimedCursor once statement hooks exist)
+    cursor_factory = sqlite3.Cursor
+
+    def cursor(self, factory=None):
+        return super().cursor(factory or self.cursor_factory)
+
+    # sqlite3.Connection.execute() would bypass a Python cursor subclass's
+    # execute(), so the shortcuts go through cursor() explicitly.
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+    def commit(self):
+        try:
+            super().commit()
+        except sqlite3.Error as e:
+            _report_error(self, "COMMIT", e)
+            raise
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.release(self)
+        else:
+            super().close()
+
+    def close_for_real(self):
+        super().close()
+
+
+def _apply_pragmas(conn, schema='main', foreign_keys=True):
+    """The connection pragmas, for the main database or an attached one."""
+    conn.execute(f"PRAGMA {schema}.journal_mode = WAL")
+    if schema == 'main':
+        conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+        conn.execute(f"PRAGMA foreign_keys = {'ON' if foreign_keys else 'OFF'}")
+
+
+_connect_hooks = []
+_statement_hooks = []
+_error_hooks = []
+
+
+def add_connect_hook(hook):
+    """
+    Registers hook(conn) to run on every connection opened from now on
+    (after the pragmas), e.g. to install a trace callback.
+    """
+    _connect_hooks.append(hook)
+
+
+def add_statement_hook(hook):
+    """
+    Registers hook(conn, sql, parameters, seconds), called once per
+    statement on connections opened from now on, when the statement
+    finishes: straight after execute() if it returns no rows, otherwise
+    once its rows are exhausted or the cursor moves on or goes away.
+    seconds covers execution and fetching.
+    """
+    _statement_hooks.append(hook)
+
+
+def add_error_hook(hook):
+    """
+    Registers hook(conn, sql, error), called when a statement or commit
+    on a connection opened from now on raises sqlite3.Error, e.g. to
+    count "database is locked" failures. The error is still raised.
+    """
+    _error_hooks.append(hook)
+
+
+def _report_error(conn, sql, error):
+    for hook in _error_hooks:
+        hook(conn, sql, error)
+
+
+class TimedCursor(sqlite3.Cursor):
+    """A cursor that times each statement and reports it to the statement (and error) hooks."""
+
+    _statement = None
+    _elapsed = 0.0
+
+    def _finish(self):
+        if self._statement is not None:
+            sql, parameters = self._statement
+            self._statement = None
+            for hook in _statement_hooks:
+                hook(self.connection, sql, parameters, self._elapsed)
+
+    def _run(self, method, sql, parameters, *args):
+        self._finish()
+        start = time.perf_counter()
+        try:
+            return method(sql, *args)
+        except sqlite3.Error as e:
+            _report_error(self.connection, sql, e)
+            raise
+        finally:
+            self._elapsed = time.perf_counter() - start
+            self._statement = (sql, parameters)
+            if self.description is None:
+                self._finish()
+
+    def execute(self, sql, parameters=()):
+        return self._run(super().execute, sql, parameters, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._run(super().executemany, sql, None, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self._run(super().executescript, sql_script, None)
+
+    def _fetch(self, method, *args):
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            self._elapsed += time.perf_counter() - start
+
+    def fetchone(self):
+        row = self._fetch(super().fetchone)
+        if row is None:
+            self._finish()
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._fetch(super().fetchmany, self.arraysize if size is None else size)
+        if not rows:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        rows = self._fetch(super().fetchall)
+        self._finish()
+        return rows
+
+    def __next__(self):
+        try:
+            return self._fetch(super().__next__)
+        except StopIteration:
+            self._finish()
+            raise
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        try:
+            self._finish()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """
+    Keeps up to `size` idle connections to one database file. When every
+    pooled connection is in use, extra ones are opened on demand and
+    closed when released, so nested or bursty use never blocks.
+    """
+
+    def __init__(self, db_path, size=DEFAULT_POOL_SIZE, foreign_keys=True, attach=None):
+        self.db_path = db_path
+        self.size = size
+        self.foreign_keys = foreign_keys
+        self.attach = dict(attach or {})
+        self._idle = queue.LifoQueue()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False,
+                               factory=PooledConnection)
+        conn.row_factory = sqlite3.Row
+        _apply_pragmas(conn, foreign_keys=self.foreign_keys)
+        for alias, path in self.attach.items():
+            conn.execute(f"ATTACH DATABASE ? AS {alias}", (path,))
+            _apply_pragmas(conn, schema=alias)
+        if _statement_hooks or _error_hooks:
+            conn.cursor_factory = TimedCursor
+        for hook in _connect_hooks:
+            hook(conn)
+        conn._pool = self
+        return conn
+
+    def acquire(self):
+        """Takes an idle connection, or opens a new one."""
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        conn._checked_out = True
+        return conn
+
+    def release(self, conn):
+        """
+        Returns a connection to the pool, discarding any open transaction
+        and per-use settings. Releasing twice is a no-op.
+        """
+        if not conn._checked_out:
+            return
+        conn._checked_out = False
+        if conn.in_transaction:
+            conn.rollback()
+        conn.row_factory = sqlite3.Row
+        if self._idle.qsize() < self.size:
+            self._idle.put(conn)
+        else:
+            conn.close_for_real()
+
+    @contextmanager
+    def connection(self):
+        """Context manager yielding a pooled connection."""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close_all(self):
+        """Closes idle connections (used by tests/benchmarks and at shutdown)."""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close_for_real()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path, foreign_keys=True, attach=None):
+    """
+    Returns the shared pool for a database file (plus any ATTACHed
+    {alias: path} databases), creating it on first use. Connections with
+    and without foreign key enforcement come from separate pools.
+    """
+    key = (db_path, bool(foreign_keys), tuple(sorted((attach or {}).items())))
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = _pools[key] = ConnectionPool(db_path, foreign_keys=foreign_keys, attach=attach)
+    return pool
+
+
+def connect(db_path, foreign_keys=True):
+    """
+    Drop-in replacement for sqlite3.connect: returns a pooled connection
+    with sqlite3.Row rows; conn.close() gives it back to the pool.
+    """
+    return get_pool(db_path, foreign_keys).acquire()
+
+
+@contextmanager
+def attached(db_path, foreign_keys=True, **aliases):
+    """
+    Context manager yielding a pooled connection to db_path with other
+    databases ATTACHed, e.g. attached(RECORD_BOOK_DB, super=SUPER_APP_DB)
+    lets one query join customers with super.canteen_orders.
+    """
+    with get_pool(db_path, foreign_keys, attach=aliases).connection() as conn:
+        yield conn
+
+
+def close_all():
+    """Closes the idle connections of every pool."""
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close_all()
+
+
+def add_column_if_missing(cursor, table, column, definition):
+    """Adds a column to an existing table (SQLite has no ADD COLUMN IF NOT EXISTS)."""
+    columns = {row[1] for row in cursor.execute(f"PRAGMA table_info({table})")}
+    if column not in columns:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+def create_data_versions_table(cursor):
+    """Creates the data_versions table (one counter per data set) if missing."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS data_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+
+
+def bump_data_version(conn, name):
+    """
+    Increments a data set's version in the caller's transaction, so caches
+    keyed by version (rendered charts, etc.) know the data has changed.
+    """
+    conn.execute("""
+        INSERT INTO data_versions (name, version) VALUES (?, 1)
+        ON CONFLICT (name) DO UPDATE SET version = version + 1
+    """, (name,))
+
+
+def get_data_versions(conn):
+    """Returns {name: version} for every tracked data set."""
+    return {row[0]: row[1] for row in conn.execute("SELECT name, version FROM data_versions")}
+
+
+def create_job_runs_table(cursor):
+    """Creates the job_runs table (the date each scheduled job last ran) if missing."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS job_runs (
+            name TEXT PRIMARY KEY,
+            last_run TEXT NOT NULL
+        )
+    """)
+
+
+def record_job_run(conn, name, run_date):
+    """
+    Records that a job ran for run_date (YYYY-MM-DD). Call in the
+    transaction that stores the job's results, so the two always agree
+    even when the job finds nothing to store.
+    """
+    conn.execute("""
+        INSERT INTO job_runs (name, last_run) VALUES (?, ?)
+        ON CONFLICT (name) DO UPDATE SET last_run = excluded.last_run
+    """, (name, run_date))
+
+
+def last_job_run(conn, name):
+    """Returns the date a job last ran, or None if it never has."""
+    row = conn.execute("SELECT last_run FROM job_runs WHERE name = ?", (name,)).fetchone()
+    return row[0] if row else None
+
+
+@contextmanager
+def transaction(db_path, foreign_keys=True):
+    """
+    Context manager yielding a pooled connection inside BEGIN IMMEDIATE.
+    Commits on success and rolls back on any exception.
+    """
+    with get_pool(db_path, foreign_keys).connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except Exception:
+            conn.rollback()
+            raise
+        else:
+            conn.commit()
@@ -0,0 +1,213 @@
+"""
+HTTP conditional caching for record_book.db pages, driven by data versions.
+
+Triggers on customers, transactions, monthly_bills, customer_risk and
+settings bump a per-table counter in data_versions (the same table and
+helpers charts.py uses in super_app.db) and, for rows that belong to a
+customer, a per-customer counter in customer_versions. Because they are
+triggers, every writer counts: app routes, the CLI, the bill run and the
+nightly jobs alike. An UPDATE bumps its customer once (and the old
+customer too only if the row moved), and the nightly risk job writes only
+the scores that changed, so unchanged customers keep their cached pages.
+
+@conditional(tables) on a GET view reads the counters it depends on (one
+small query), derives an ETag and Last-Modified from them, and answers
+If-None-Match / If-Modified-Since with 304 before the view runs any of
+its own SQL. The ETag also covers the URL (page numbers, filters) and
+today's date, since the pages show "overdue" relative to today.
+
+With FRAGMENT_CACHE_MB > 0 the rendered body is also kept in a
+per-process LRU of that many megabytes, keyed by the same ETag, so a
+browser without the page cached still skips the queries and the render
+while nothing changed.
+
+Responses carrying flashed messages are never cached or answered with 304.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from functools import wraps
+
+import db
+
+TRACKED_TABLES = ('customers', 'transactions', 'monthly_bills', 'customer_risk', 'settings')
+
+# Tables whose rows belong to one customer, and the column that says which
+CUSTOMER_TABLES = {
+    'customers': 'customer_id',
+    'transactions': 'customer_id',
+    'monthly_bills': 'customer_id',
+    'customer_risk': 'customer_id',
+}
+
+# A body bigger than this share of the fragment cache is not cached
+MAX_FRAGMENT_SHARE = 0.25
+
+_NOW = "strftime('%Y-%m-%d %H:%M:%S', 'now')"
+
+
+def _bump_table_sql(table):
+    return f"""
+        INSERT INTO data_versions (name, version, changed_at) VALUES ('{table}', 1, {_NOW})
+        ON CONFLICT (name) DO UPDATE SET version = version + 1, changed_at = excluded.changed_at;"""
+
+
+def _bump_customer_sql(customer_id, when='1'):
+    # SELECT ... WHERE rather than VALUES so the bump can be conditional
+    return f"""
+        INSERT INTO customer_versions (customer_id, version, changed_at) SELECT {customer_id}, 1, {_NOW} WHERE {when}
+        ON CONFLICT (customer_id) DO UPDATE SET version = version + 1, changed_at = excluded.changed_at;"""
+
+
+def create_version_tables(cursor):
+    """
+    Creates data_versions, customer_versions and the triggers that bump
+    them. Idempotent; the triggers are recreated every time so existing
+    databases pick up changes to them.
+    """
+    db.create_data_versions_table(cursor)
+    db.add_column_if_missing(cursor, 'data_versions', 'changed_at', 'TEXT')
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS customer_versions (
+            customer_id INTEGER PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0,
+            changed_at TEXT
+        )
+    """)
+    for table in TRACKED_TABLES:
+        column = CUSTOMER_TABLES.get(table)
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            body = _bump_table_sql(table)
+            if column and event == 'UPDATE':
+                body += _bump_customer_sql(f"NEW.{column}")
+                body += _bump_customer_sql(f"OLD.{column}", when=f"OLD.{column} IS NOT NEW.{column}")
+            elif column:
+                body += _bump_customer_sql(f"{'NEW' if event == 'INSERT' else 'OLD'}.{column}")
+            cursor.execute(f"DROP TRIGGER IF EXISTS {table}_version_{event.lower()}")
+            cursor.execute(f"""
+                CREATE TRIGGER {table}_version_{event.lower()}
+                AFTER {event} ON {table} BEGIN {body}
+                END
+            """)
+
+
+def _parse_time(value):
+    if not value:
+        return None
+    return datetime.strptime(value, '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+
+
+def current_version(db_path, tables, customer_id=None):
+    """
+    Returns (version key, last modified) for a set of tables and
+    optionally one customer, in a single query.
+    """
+    placeholders = ", ".join("?" for _ in tables)
+    with db.get_pool(db_path, foreign_keys=False).connection() as conn:
+        rows = conn.execute(f"""
+            SELECT name, version, changed_at FROM data_versions WHERE name IN ({placeholders})
+            UNION ALL
+            SELECT 'customer', version, changed_at FROM customer_versions WHERE customer_id = ?
+        """, (*tables, customer_id)).fetchall()
+    key = ",".join(f"{row[0]}:{row[1]}" for row in sorted(rows, key=lambda row: row[0]))
+    changed = [_parse_time(row[2]) for row in rows if row[2]]
+    # "Overdue" changes at midnight even when no data does
+    today = datetime.now().astimezone().replace(hour=0, minute=0, second=0, microsecond=0).astimezone(timezone.utc)
+    return key, max(changed + [today])
+
+
+class FragmentCache:
+    """A thread-safe LRU of rendered bodies keyed by (path, ETag), bounded in bytes."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """value is (body bytes, mimetype)."""
+        size = len(value[0])
+        if size > self.max_bytes * MAX_FRAGMENT_SHARE:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.bytes -= len(old[0])
+            self._items[key] = value
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self.bytes -= len(evicted[0])
+
+
+_fragment_caches = {}
+
+
+def _fragment_cache(app):
+    max_bytes = int(app.config.get('FRAGMENT_CACHE_MB', 0) * 1024 * 1024)
+    if max_bytes <= 0:
+        return None
+    cache = _fragment_caches.get(app.name)
+    if cache is None or cache.max_bytes != max_bytes:
+        cache = _fragment_caches[app.name] = FragmentCache(max_bytes)
+    return cache
+
+
+def conditional(tables, customer_arg=None):
+    """
+    Decorates a view whose GET output depends only on `tables` (and, with
+    customer_arg, on that view argument's customer) plus its URL.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            from flask import current_app, make_response, request, session
+
+            if request.method not in ('GET', 'HEAD') or session.get('_flashes'):
+                return view(*args, **kwargs)
+
+            customer_id = kwargs.get(customer_arg) if customer_arg else None
+            version, last_modified = current_version(current_app.config['DATABASE'], tables, customer_id)
+            etag = hashlib.sha1(f"{request.full_path}|{version}|{datetime.now():%Y-%m-%d}".encode()).hexdigest()[:20]
+
+            # Last-Modified has one-second resolution, so it is only trusted once that second is over
+            settled = last_modified < datetime.now(timezone.utc) - timedelta(seconds=1)
+            if etag in request.if_none_match or (
+                    not request.if_none_match and request.if_modified_since and settled
+                    and request.if_modified_since >= last_modified):
+                response = current_app.response_class(status=304)
+            else:
+                cache = _fragment_cache(current_app)
+                cached = cache.get((request.full_path, etag)) if cache else None
+                if cached is not None:
+                    body, mimetype = cached
+                    response = current_app.response_class(body, mimetype=mimetype)
+                else:
+                    response = make_response(view(*args, **kwargs))
+                    # Only plain, complete 200s are reusable (no redirects, streams or new flashes)
+                    if response.status_code != 200 or response.is_streamed or session.get('_flashes'):
+                        return response
+                    if cache:
+                        cache.put((request.full_path, etag), (response.get_data(), response.mimetype))
+
+            response.set_etag(etag)
+            response.last_modified = last_modified
+            # The browser keeps the page but must revalidate it every time
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,65 @@
+"""
+Single-leader election between server worker processes.
+
+Background jobs (the hourly notifier and the nightly risk, fines and
+wallet jobs) must run in exactly one process, however many workers the
+server starts. Every worker calls run_as_leader(); the first to take an
+exclusive lock on LOCK_FILE runs the job, the others wait and retry, so
+if the leader dies another worker takes over within RETRY_SECONDS.
+
+The lock is an OS file lock (flock, or msvcrt on Windows), released by
+the OS when its process exits, so a crashed leader never leaves a stale
+lock behind.
+"""
+import os
+import threading
+import time
+
+LOCK_FILE = "background_jobs.lock"
+
+# How often a follower tries to take over the lock.
+RETRY_SECONDS = 30
+
+
+def try_lock(path=LOCK_FILE):
+    """Takes the exclusive lock without blocking. Returns the open lock file, or None if held elsewhere."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    handle = open(path, 'a+')
+    try:
+        if os.name == 'nt':
+            import msvcrt
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return None
+    handle.seek(0)
+    handle.truncate()
+    handle.write(f"{os.getpid()}\n")
+    handle.flush()
+    return handle
+
+
+def run_as_leader(job, path=LOCK_FILE, retry_seconds=RETRY_SECONDS, name="leader"):
+    """
+    Starts a daemon thread that waits until this process holds the lock
+    and then runs job() (which normally loops forever). Returns the thread.
+    """
+    def run():
+        while True:
+            handle = try_lock(path)
+            if handle is not None:
+                break
+            time.sleep(retry_seconds)
+        print(f"Background jobs running in process {os.getpid()}")
+        try:
+            job()
+        finally:
+            handle.close()
+
+    thread = threading.Thread(target=run, name=name, daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,148 @@
+"""
+Nightly overdue detection and fine computation for the library.
+
+Reads every open issue whose due date has passed (an index range scan on
+book_issues(status, due_date)), computes overdue days and fines for all
+of them in one vectorized pass, and replaces the open rows of the
+library_overdue table that the library and analytics pages read directly.
+
+A late return does not remove the fine: returning the book stamps the
+row's returned_on and freezes its fine as of the return date
+(freeze_returned_fines), and the nightly run keeps those rows so the
+fine can still be paid.
+
+Run nightly from cron with:  python library_fines.py [path/to/super_app.db]
+"""
+import sys
+from datetime import datetime
+
+import db
+
+DB_FILE = "super_app.db"
+
+# Name of the nightly run in job_runs.
+JOB_NAME = 'library_fines'
+
+# Fine per day overdue, and the most a single issue can accrue (₹).
+FINE_PER_DAY = 2.0
+MAX_FINE_PER_ISSUE = 200.0
+
+
+def create_overdue_table(cursor):
+    """Creates the library_overdue summary table and job_runs if missing."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS library_overdue (
+            issue_id INTEGER PRIMARY KEY,
+            book_id INTEGER NOT NULL,
+            student_id TEXT NOT NULL,
+            title TEXT,
+            due_date TEXT NOT NULL,
+            days_overdue INTEGER NOT NULL,
+            fine REAL NOT NULL,
+            computed_on TEXT NOT NULL,
+            returned_on TEXT
+        )
+    """)
+    # Older tables dropped a row as soon as its book came back
+    db.add_column_if_missing(cursor, 'library_overdue', 'returned_on', 'TEXT')
+    db.create_job_runs_table(cursor)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_library_overdue_student ON library_overdue (student_id)")
+
+
+def compute_overdue_fines(conn, today=None):
+    """
+    Computes overdue days and fines for every open, past-due issue, plus
+    any issue returned late that has no library_overdue row yet (its fine
+    stops at the return date).
+    Returns a pandas DataFrame with the library_overdue columns.
+    """
+    import numpy as np
+    import pandas as pd
+
+    today = pd.Timestamp(today or datetime.now().strftime('%Y-%m-%d'))
+
+    overdue = pd.read_sql_query("""
+        SELECT i.issue_id, i.book_id, i.student_id, b.title, i.due_date, NULL AS returned_on
+        FROM book_issues i
+        LEFT JOIN books b ON i.book_id = b.book_id
+        WHERE i.status = 'Issued' AND i.due_date < :today
+        UNION ALL
+        SELECT i.issue_id, i.book_id, i.student_id, b.title, i.due_date, i.return_date
+        FROM book_issues i
+        LEFT JOIN books b ON i.book_id = b.book_id
+        WHERE i.status = 'Returned' AND i.return_date > i.due_date AND i.return_date <= :today
+          AND NOT EXISTS (SELECT 1 FROM library_overdue o WHERE o.issue_id = i.issue_id)
+    """, conn, params={'today': today.strftime('%Y-%m-%d')})
+
+    until = pd.to_datetime(overdue['returned_on'], errors='coerce').fillna(today)
+    days = (until - pd.to_datetime(overdue['due_date'], errors='coerce')).dt.days
+    overdue['days_overdue'] = days.fillna(0).clip(lower=0).astype(int)
+    overdue['fine'] = np.minimum(overdue['days_overdue'] * FINE_PER_DAY, MAX_FINE_PER_ISSUE).round(2)
+    overdue['computed_on'] = today.strftime('%Y-%m-%d')
+    return overdue[overdue['days_overdue'] > 0]
+
+
+def freeze_returned_fines(conn, issue_ids, returned_on):
+    """
+    Marks the library_overdue rows of issues just returned on returned_on
+    (YYYY-MM-DD) and fixes their fine at the days overdue up to that date.
+    Late issues the nightly run has not seen yet get their row here.
+    Call inside the transaction that marks the issues returned.
+    """
+    conn.executemany(f"""
+        INSERT INTO library_overdue (issue_id, book_id, student_id, title, due_date,
+                                     days_overdue, fine, computed_on, returned_on)
+        SELECT i.issue_id, i.book_id, i.student_id, b.title, i.due_date, late.days,
+               ROUND(MIN(late.days * {FINE_PER_DAY}, {MAX_FINE_PER_ISSUE}), 2), :returned_on, :returned_on
+        FROM book_issues i
+        LEFT JOIN books b ON i.book_id = b.book_id,
+             (SELECT CAST(julianday(:returned_on) - julianday(due_date) AS INTEGER) AS days
+              FROM book_issues WHERE issue_id = :issue_id) late
+        WHERE i.issue_id = :issue_id AND late.days > 0
+        ON CONFLICT (issue_id) DO UPDATE SET
+            days_overdue = excluded.days_overdue, fine = excluded.fine,
+            computed_on = excluded.computed_on, returned_on = excluded.returned_on
+    """, [{'issue_id': issue_id, 'returned_on': returned_on} for issue_id in issue_ids])
+
+
+def run_overdue_fines(db_path=DB_FILE, today=None):
+    """
+    Recomputes the open rows of the library_overdue table, keeping the
+    frozen fines of returned issues, and records the run in job_runs, in
+    one transaction.
+    Returns the number of overdue issues found.
+    """
+    conn = db.connect(db_path)
+    try:
+        create_overdue_table(conn.cursor())
+        overdue = compute_overdue_fines(conn, today)
+        rows = list(overdue[['issue_id', 'book_id', 'student_id', 'title', 'due_date',
+                             'days_overdue', 'fine', 'computed_on', 'returned_on']].itertuples(index=False, name=None))
+        with conn:
+            conn.execute("DELETE FROM library_overdue WHERE returned_on IS NULL")
+            # OR IGNORE: a book returned since the read above already has its frozen row
+            conn.executemany("""
+                INSERT OR IGNORE INTO library_overdue (issue_id, book_id, student_id, title, due_date,
+                                                       days_overdue, fine, computed_on, returned_on)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+            db.record_job_run(conn, JOB_NAME, today or datetime.now().strftime('%Y-%m-%d'))
+        return len(rows)
+    finally:
+        conn.close()
+
+
+def last_computed_date(db_path=DB_FILE):
+    """Returns the date of the last fines run (even one that found nothing overdue), or None if never run."""
+    conn = db.connect(db_path)
+    try:
+        create_overdue_table(conn.cursor())
+        return db.last_job_run(conn, JOB_NAME)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    db_path = sys.argv[1] if len(sys.argv) > 1 else DB_FILE
+    count = run_overdue_fines(db_path)
+    print(f"Found {count} overdue issues in {db_path}")
@@ -0,0 +1,476 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import db
+import library_fines
+import popularity
+import rollups
+
+DB_FILE = db.SUPER_APP_DB
+
+# Books are due back this many days after issue.
+LOAN_PERIOD_DAYS = 14
+
+
+def due_date_for(issue_date):
+    """Returns the YYYY-MM-DD due date for a datetime issue date."""
+    return (issue_date + timedelta(days=LOAN_PERIOD_DAYS)).strftime('%Y-%m-%d')
+
+
+def initialize_library_schema(db_path=None):
+    """Creates the library tables and their lookup indexes if missing."""
+    conn = db.connect(db_path or DB_FILE)
+    cursor = conn.cursor()
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS books (
+            book_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            author TEXT NOT NULL,
+            quantity INTEGER NOT NULL
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS book_issues (
+            issue_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            book_id INTEGER,
+            student_id TEXT NOT NULL,
+            issue_date TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'Issued',
+            due_date TEXT,
+            return_date TEXT,
+            FOREIGN KEY (book_id) REFERENCES books (book_id)
+        )
+    """)
+
+    # Older databases predate due dates: add the column and backfill it
+    db.add_column_if_missing(cursor, 'book_issues', 'due_date', 'TEXT')
+    db.add_column_if_missing(cursor, 'book_issues', 'return_date', 'TEXT')
+    cursor.execute(f"""
+        UPDATE book_issues SET due_date = date(issue_date, '+{LOAN_PERIOD_DAYS} days')
+        WHERE due_date IS NULL
+    """)
+
+    # "What does this student have out?" and "who has this title?"
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_book_issues_student_status ON book_issues (student_id, status)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_book_issues_book_status ON book_issues (book_id, status)")
+    # Overdue scans: status = 'Issued' AND due_date < today
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_book_issues_status_due ON book_issues (status, due_date)")
+
+    library_fines.create_overdue_table(cursor)
+    rollups.create_rollup_tables(cursor)
+
+    # Full-text index over title/author, kept in sync with books by triggers.
+    # prefix='2 3' adds prefix indexes so type-ahead queries stay cheap.
+    fts_exists = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'books_fts'"
+    ).fetchone()
+    cursor.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
+            title, author,
+            content='books', content_rowid='book_id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS books_fts_insert AFTER INSERT ON books BEGIN
+            INSERT INTO books_fts (rowid, title, author) VALUES (new.book_id, new.title, new.author);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS books_fts_delete AFTER DELETE ON books BEGIN
+            INSERT INTO books_fts (books_fts, rowid, title, author) VALUES ('delete', old.book_id, old.title, old.author);
+        END
+    """)
+    # Only title/author changes touch the index; quantity updates do not.
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS books_fts_update AFTER UPDATE OF title, author ON books BEGIN
+            INSERT INTO books_fts (books_fts, rowid, title, author) VALUES ('delete', old.book_id, old.title, old.author);
+            INSERT INTO books_fts (rowid, title, author) VALUES (new.book_id, new.title, new.author);
+        END
+    """)
+    if not fts_exists:
+        # Index the books that existed before the search index was added
+        cursor.execute("INSERT INTO books_fts (books_fts) VALUES ('rebuild')")
+
+    conn.commit()
+    conn.close()
+
+
+def get_all_books():
+    """
+    Fetches all books.
+    Returns a list of book rows.
+    """
+    with db.get_pool(DB_FILE).connection() as conn:
+        return conn.execute("SELECT book_id, title, author, quantity FROM books ORDER BY title").fetchall()
+
+
+def get_open_issues(limit=100):
+    """
+    Fetches the most recent books that are currently issued.
+    Returns a list of issue rows joined with the book title.
+    """
+    with db.get_pool(DB_FILE).connection() as conn:
+        return conn.execute("""
+            SELECT i.issue_id, i.book_id, i.student_id, i.issue_date, i.due_date, b.title
+            FROM book_issues i
+            JOIN books b ON i.book_id = b.book_id
+            WHERE i.status = 'Issued'
+            ORDER BY i.issue_id DESC
+            LIMIT ?
+        """, (limit,)).fetchall()
+
+
+def get_popular_books(window='week', k=10):
+    """
+    Most-issued books in a popularity window ('week', 'month' or 'term').
+    Returns a list of dicts with book_id, title, author and issues.
+    """
+    top = popularity.top_books(window, k, DB_FILE)
+    if not top:
+        return []
+    placeholders = ", ".join("?" for _ in top)
+    with db.get_pool(DB_FILE).connection() as conn:
+        titles = {row['book_id']: row for row in conn.execute(
+            f"SELECT book_id, title, author FROM books WHERE book_id IN ({placeholders})",
+            [book_id for book_id, _ in top]
+        )}
+    return [
+        {'book_id': book_id, 'title': titles[book_id]['title'], 'author': titles[book_id]['author'], 'issues': issues}
+        for book_id, issues in top if book_id in titles
+    ]
+
+
+def get_overdue_summary(limit=50):
+    """
+    Reads the nightly library_overdue summary of books still out.
+    Returns (totals, rows): totals has 'issues', 'students', 'total_fine'
+    and 'computed_on'; rows are the most overdue issues first.
+    """
+    with db.get_pool(DB_FILE).connection() as conn:
+        totals = conn.execute("""
+            SELECT COUNT(*) AS issues,
+                   COUNT(DISTINCT student_id) AS students,
+                   COALESCE(SUM(fine), 0) AS total_fine,
+                   MAX(computed_on) AS computed_on
+            FROM library_overdue
+            WHERE returned_on IS NULL
+        """).fetchone()
+        rows = conn.execute("""
+            SELECT issue_id, book_id, student_id, title, due_date, days_overdue, fine
+            FROM library_overdue
+            WHERE returned_on IS NULL
+            ORDER BY days_overdue DESC
+            LIMIT ?
+        """, (limit,)).fetchall()
+    return totals, rows
+
+
+def add_book(title, author, quantity):
+    """
+    Adds a book to the catalog.
+    Returns a success or error message string.
+    """
+    try:
+        quantity = int(quantity)
+    except (TypeError, ValueError):
+        return "Error: Quantity must be a whole number."
+    if quantity < 0:
+        return "Error: Quantity cannot be negative."
+
+    with db.transaction(DB_FILE) as conn:
+        cursor = conn.execute(
+            "INSERT INTO books (title, author, quantity) VALUES (?, ?, ?)", (title, author, quantity)
+        )
+        book_id = cursor.lastrowid
+    invalidate_search_cache()
+    return f"Success: Book '{title}' added with ID: {book_id}."
+
+
+def issue_book(book_id, student_id):
+    """
+    Issues one copy of a book to a student.
+    Availability is decremented with a single conditional UPDATE, so
+    concurrent issues can never take the quantity below zero.
+    Returns a success or error message string.
+    """
+    with db.transaction(DB_FILE) as conn:
+        already_issued = conn.execute("""
+            SELECT 1 FROM book_issues
+            WHERE student_id = ? AND book_id = ? AND status = 'Issued'
+        """, (student_id, book_id)).fetchone()
+        if already_issued:
+            return f"Error: Student {student_id} already has book {book_id}."
+
+        cursor = conn.execute(
+            "UPDATE books SET quantity = quantity - 1 WHERE book_id = ? AND quantity > 0", (book_id,)
+        )
+        if cursor.rowcount == 0:
+            exists = conn.execute("SELECT 1 FROM books WHERE book_id = ?", (book_id,)).fetchone()
+            if not exists:
+                return f"Error: No book found with ID: {book_id}"
+            return f"Error: No copies of book {book_id} are available."
+
+        now = datetime.now()
+        today = now.strftime('%Y-%m-%d')
+        conn.execute("""
+            INSERT INTO book_issues (book_id, student_id, issue_date, due_date, status)
+            VALUES (?, ?, ?, ?, 'Issued')
+        """, (book_id, student_id, today, due_date_for(now)))
+        rollups.record_book_activity(conn, today, issues={book_id: 1})
+
+    invalidate_search_cache()
+    return f"Success: Book {book_id} issued to student {student_id}."
+
+
+def return_book(book_id, student_id):
+    """
+    Marks a student's oldest open issue of a book as returned and puts
+    the copy back into stock, in one transaction.
+    Returns a success or error message string.
+    """
+    with db.transaction(DB_FILE) as conn:
+        issue = conn.execute("""
+            SELECT issue_id FROM book_issues
+            WHERE book_id = ? AND student_id = ? AND status = 'Issued'
+            ORDER BY issue_id LIMIT 1
+        """, (book_id, student_id)).fetchone()
+        if not issue:
+            return f"Error: Student {student_id} has no open issue of book {book_id}."
+
+        today = datetime.now().strftime('%Y-%m-%d')
+        conn.execute(
+            "UPDATE book_issues SET status = 'Returned', return_date = ? WHERE issue_id = ?", (today, issue['issue_id'])
+        )
+        # A returned book stops accruing, even before the nightly refresh; its fine stays due
+        library_fines.freeze_returned_fines(conn, [issue['issue_id']], today)
+
+        conn.execute("UPDATE books SET quantity = quantity + 1 WHERE book_id = ?", (book_id,))
+        rollups.record_book_activity(conn, today, returns={book_id: 1})
+
+    invalidate_search_cache()
+    return f"Success: Book {book_id} returned by student {student_id}."
+
+
+# --- Batch Desk Scans ---
+
+SCAN_ACTIONS = {
+    'issue': 'issue', 'out': 'issue', 'checkout': 'issue',
+    'return': 'return', 'in': 'return', 'checkin': 'return',
+}
+
+# Keep IN (...) lists under SQLite's default host-parameter limit.
+SQL_CHUNK_SIZE = 500
+
+
+def _chunks(values, size=SQL_CHUNK_SIZE):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def process_scans(scans):
+    """
+    Applies a list of scanned (book_id, student_id, action) tuples in one
+    transaction. Actions are 'issue'/'checkout'/'out' or
+    'return'/'checkin'/'in'.
+
+    Stock and open issues for the scanned titles are read once under the
+    write lock, every scan is checked in order against that snapshot, and
+    the resulting inserts/updates are written with executemany.
+    Returns a list of success or error message strings, one per scan.
+    """
+    scans = list(scans)
+    results = [None] * len(scans)
+    valid = []
+
+    for index, scan in enumerate(scans):
+        try:
+            book_id, student_id, action = scan
+            book_id = int(book_id)
+        except (TypeError, ValueError):
+            results[index] = f"Error: Invalid scan: {scan!r}"
+            continue
+        student_id = str(student_id).strip()
+        action = SCAN_ACTIONS.get(str(action).lower())
+        if not student_id or action is None:
+            results[index] = f"Error: Invalid scan: {scan!r}"
+            continue
+        valid.append((index, book_id, student_id, action))
+
+    if not valid:
+        return results
+
+    now = datetime.now()
+    today = now.strftime('%Y-%m-%d')
+    due_date = due_date_for(now)
+    book_ids = {book_id for _, book_id, _, _ in valid}
+
+    with db.transaction(DB_FILE) as conn:
+        stock = {}
+        open_issues = {}
+        for chunk in _chunks(book_ids):
+            placeholders = ", ".join("?" for _ in chunk)
+            for row in conn.execute(f"SELECT book_id, quantity FROM books WHERE book_id IN ({placeholders})", chunk):
+                stock[row['book_id']] = row['quantity']
+            for row in conn.execute(f"""
+                SELECT issue_id, book_id, student_id FROM book_issues
+                WHERE status = 'Issued' AND book_id IN ({placeholders})
+                ORDER BY issue_id
+            """, chunk):
+                open_issues.setdefault((row['book_id'], row['student_id']), []).append(row['issue_id'])
+
+        new_issues = []      # [book_id, student_id, issue_date, due_date, status, return_date]
+        returned_ids = []
+        deltas = {}
+        issue_counts = {}
+        return_counts = {}
+
+        for index, book_id, student_id, action in valid:
+            if book_id not in stock:
+                results[index] = f"Error: No book found with ID: {book_id}"
+                continue
+            key = (book_id, student_id)
+
+            if action == 'issue':
+                if open_issues.get(key):
+                    results[index] = f"Error: Student {student_id} already has book {book_id}."
+                    continue
+                if stock[book_id] <= 0:
+                    results[index] = f"Error: No copies of book {book_id} are available."
+                    continue
+                issue = [book_id, student_id, today, due_date, 'Issued', None]
+                new_issues.append(issue)
+                open_issues.setdefault(key, []).append(issue)
+                stock[book_id] -= 1
+                deltas[book_id] = deltas.get(book_id, 0) - 1
+                issue_counts[book_id] = issue_counts.get(book_id, 0) + 1
+                results[index] = f"Success: Book {book_id} issued to student {student_id}."
+            else:
+                if not open_issues.get(key):
+                    results[index] = f"Error: Student {student_id} has no open issue of book {book_id}."
+                    continue
+                issue = open_issues[key].pop(0)
+                if isinstance(issue, list):
+                    # Issued and returned within this same batch
+                    issue[4:6] = ['Returned', today]
+                else:
+                    returned_ids.append((issue,))
+                stock[book_id] += 1
+                deltas[book_id] = deltas.get(book_id, 0) + 1
+                return_counts[book_id] = return_counts.get(book_id, 0) + 1
+                results[index] = f"Success: Book {book_id} returned by student {student_id}."
+
+        conn.executemany("""
+            INSERT INTO book_issues (book_id, student_id, issue_date, due_date, status, return_date)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, new_issues)
+        conn.executemany(
+            "UPDATE book_issues SET status = 'Returned', return_date = ? WHERE issue_id = ?",
+            [(today, issue_id) for (issue_id,) in returned_ids]
+        )
+        library_fines.freeze_returned_fines(conn, [issue_id for (issue_id,) in returned_ids], today)
+        conn.executemany(
+            "UPDATE books SET quantity = quantity + ? WHERE book_id = ?",
+            [(delta, book_id) for book_id, delta in deltas.items() if delta]
+        )
+        rollups.record_book_activity(conn, today, issues=issue_counts, returns=return_counts)
+
+    if deltas:
+        invalidate_search_cache()
+    return results
+
+
+# --- Catalog Search ---
+
+SEARCH_PAGE_SIZE = 20
+MAX_SEARCH_PAGE_SIZE = 100
+
+# Search results are cached per process. Local writes clear the cache
+# immediately; the TTL bounds staleness from writes made by other workers.
+SEARCH_CACHE_SIZE = 512
+SEARCH_CACHE_TTL_SECONDS = 30
+
+_search_cache = OrderedDict()
+_search_cache_lock = threading.Lock()
+_search_cache_generation = 0
+
+
+def invalidate_search_cache():
+    """Drops all cached search results (call after books or quantities change)."""
+    global _search_cache_generation
+    with _search_cache_lock:
+        _search_cache.clear()
+        _search_cache_generation += 1
+
+
+def _fts_query(text):
+    """
+    Turns free text into an FTS5 query: every word must match as a prefix
+    of a title/author token. Returns None if there are no usable words.
+    """
+    words = [w for w in "".join(c if c.isalnum() else " " for c in text).split() if w]
+    if not words:
+        return None
+    return " ".join(f'"{w}"*' for w in words)
+
+
+def search_books(query="", page=1, per_page=SEARCH_PAGE_SIZE):
+    """
+    Searches the catalog by title/author prefix tokens, best matches first.
+    An empty query lists the catalog by title.
+    Returns a dict with 'total', 'page', 'per_page' and 'books' (list of dicts).
+    """
+    page = max(int(page), 1)
+    per_page = min(max(int(per_page), 1), MAX_SEARCH_PAGE_SIZE)
+    fts_query = _fts_query(query or "")
+    key = (fts_query, page, per_page)
+
+    now = time.monotonic()
+    with _search_cache_lock:
+        cached = _search_cache.get(key)
+        if cached and now - cached[0] < SEARCH_CACHE_TTL_SECONDS:
+            _search_cache.move_to_end(key)
+            return cached[1]
+        generation = _search_cache_generation
+
+    offset = (page - 1) * per_page
+    with db.get_pool(DB_FILE).connection() as conn:
+        if fts_query:
+            total = conn.execute(
+                "SELECT COUNT(*) FROM books_fts WHERE books_fts MATCH ?", (fts_query,)
+            ).fetchone()[0]
+            rows = conn.execute("""
+                SELECT b.book_id, b.title, b.author, b.quantity
+                FROM books_fts f
+                JOIN books b ON b.book_id = f.rowid
+                WHERE books_fts MATCH ?
+                ORDER BY f.rank
+                LIMIT ? OFFSET ?
+            """, (fts_query, per_page, offset)).fetchall()
+        else:
+            total = conn.execute("SELECT COUNT(*) FROM books").fetchone()[0]
+            rows = conn.execute("""
+                SELECT book_id, title, author, quantity FROM books
+                ORDER BY title LIMIT ? OFFSET ?
+            """, (per_page, offset)).fetchall()
+
+    result = {
+        'total': total,
+        'page': page,
+        'per_page': per_page,
+        'books': [dict(row) for row in rows],
+    }
+
+    with _search_cache_lock:
+        if generation != _search_cache_generation:
+            return result  # a write landed while we were querying; don't cache
+        _search_cache[key] = (now, result)
+        _search_cache.move_to_end(key)
+        while len(_search_cache) > SEARCH_CACHE_SIZE:
+            _search_cache.popitem(last=False)
+    return result
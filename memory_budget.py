@@ -0,0 +1,137 @@
+"""
+Sampled peak-memory measurement per request, with per-route budgets.
+
+With MEMORY_SAMPLE_RATE > 0 (e.g. 0.05 for one request in twenty), a
+sampled request runs with tracemalloc on and its peak traced memory is
+recorded when the response is closed, so a streamed body is included.
+Only one request is measured at a time; tracemalloc sees every thread,
+so the figure is an upper bound when other requests overlap it.
+
+Each route has a budget in MB (ROUTE_BUDGETS_MB, else
+MEMORY_BUDGET_MB). Requests over budget are logged to
+logs/memory_budget.log; every sample also feeds the
+http_request_peak_memory_bytes histogram in metrics.py.
+
+benchmarks/bench_memory.py checks that the big-account pages stay
+within a fixed bound as their row counts grow.
+"""
+import logging
+import os
+import random
+import threading
+import tracemalloc
+from logging.handlers import RotatingFileHandler
+
+import metrics
+
+LOG_FILE = os.path.join("logs", "memory_budget.log")
+
+DEFAULT_BUDGET_MB = 64
+
+# Budgets for the pages that list a customer's or every bill/transaction.
+ROUTE_BUDGETS_MB = {
+    '/bills': 32,
+    '/customer/<int:customer_id>': 32,
+    '/export-ledger/<int:customer_id>': 16,
+}
+
+PEAK_MEMORY = metrics.Histogram(
+    'http_request_peak_memory_bytes', "Peak traced memory of sampled requests.", ('route',),
+    buckets=tuple(mb * 1024 * 1024 for mb in (1, 2, 4, 8, 16, 32, 64, 128, 256, 512))
+)
+OVER_BUDGET = metrics.Counter('http_request_memory_over_budget_total',
+                              "Sampled requests whose peak memory exceeded the route budget.", ('route',))
+
+_logger = logging.getLogger("memory_budget")
+_logger.propagate = False
+# Held while a sampled request is being traced.
+_tracing = threading.Lock()
+
+
+def sample_rate():
+    return float(os.getenv('MEMORY_SAMPLE_RATE', '0'))
+
+
+def budget_mb(route, budgets=None):
+    budgets = ROUTE_BUDGETS_MB if budgets is None else budgets
+    return budgets.get(route, float(os.getenv('MEMORY_BUDGET_MB', DEFAULT_BUDGET_MB)))
+
+
+def start_trace():
+    """
+    Starts tracing for one measurement if no other is running.
+    Returns a token for finish_trace(), or None if tracing is busy.
+    """
+    if not _tracing.acquire(blocking=False):
+        return None
+    started_here = not tracemalloc.is_tracing()
+    if started_here:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    return started_here, tracemalloc.get_traced_memory()[0]
+
+
+def finish_trace(token):
+    """Stops a measurement and returns its peak in bytes above the starting point."""
+    started_here, baseline = token
+    try:
+        peak = tracemalloc.get_traced_memory()[1] - baseline
+        if started_here:
+            tracemalloc.stop()
+    finally:
+        _tracing.release()
+    return max(peak, 0)
+
+
+def record(route, peak, budgets=None):
+    """Records one sampled request; logs it if it went over the route's budget."""
+    PEAK_MEMORY.observe(peak, route)
+    limit = budget_mb(route, budgets)
+    if peak > limit * 1024 * 1024:
+        OVER_BUDGET.inc(route)
+        _logger.warning(f"{route}: peak {peak / 1024 / 1024:.1f} MB over {limit} MB budget")
+
+
+def init_app(app, rate=None):
+    """Installs the sampling hooks if MEMORY_SAMPLE_RATE (or rate) is above zero."""
+    from flask import g, request
+
+    rate = sample_rate() if rate is None else rate
+    app.config.setdefault('MEMORY_SAMPLE_RATE', rate)
+    app.config.setdefault('MEMORY_BUDGETS_MB', dict(ROUTE_BUDGETS_MB))
+    if rate <= 0:
+        return
+    if not _logger.handlers:
+        os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
+        handler = RotatingFileHandler(LOG_FILE, maxBytes=1024 * 1024, backupCount=3, encoding='utf-8')
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        _logger.addHandler(handler)
+
+    @app.before_request
+    def _start_memory_sample():
+        if random.random() >= app.config['MEMORY_SAMPLE_RATE']:
+            return
+        token = start_trace()
+        if token is None:
+            return
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+
+        def finish():
+            record(route, finish_trace(token), app.config['MEMORY_BUDGETS_MB'])
+
+        g.memory_sample_finish = finish
+
+    @app.after_request
+    def _finish_memory_sample_on_close(response):
+        # Measured until the server closes the response, so a streamed body counts
+        finish = g.pop('memory_sample_finish', None)
+        if finish is not None:
+            response.call_on_close(finish)
+        return response
+
+    @app.teardown_request
+    def _finish_failed_memory_sample(exc):
+        # Only left over if the request failed before after_request ran
+        finish = g.pop('memory_sample_finish', None)
+        if finish is not None:
+            finish()
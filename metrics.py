@@ -0,0 +1,240 @@
+"""
+Request, SQL, email and Gemini metrics in Prometheus text format.
+
+Turned on with METRICS_ENABLED=1. init_app() then times every request
+per route, counts the SQL statements each request issues (through a
+trace callback installed on every pooled connection) and the time spent
+in SQLite (through a db statement hook), counts SQLite errors such as
+"database is locked" (a db error hook), and serves everything at /metrics.
+With it off none of that is installed and /metrics does not exist; the
+email outbox and Gemini metrics are still updated, which costs a lock
+and a bisect per email or API call.
+
+Set METRICS_TOKEN to require "Authorization: Bearer <token>" on /metrics.
+"""
+import bisect
+import os
+import threading
+import time
+
+import db
+
+# Latency buckets in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Statements-per-request buckets
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 5000)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """A monotonically increasing count, per label values."""
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return self._header() + [f"{self.name}{_labels(self.label_names, k)} {_number(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    """A value that goes up and down, per label values."""
+    kind = 'gauge'
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return self._header() + [f"{self.name}{_labels(self.label_names, k)} {_number(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    """Observation counts in fixed buckets, plus their sum, per label values."""
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def render(self):
+        with self._lock:
+            items = sorted((k, (list(counts), total)) for k, (counts, total) in self._values.items())
+        lines = self._header()
+        for labels, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+
+REGISTRY = []
+
+REQUEST_SECONDS = Histogram('http_request_duration_seconds', "Request latency by route.", ('route', 'method'))
+REQUESTS = Counter('http_requests_total', "Requests by route and status code.", ('route', 'method', 'status'))
+REQUEST_SQL_STATEMENTS = Histogram('http_request_sql_statements', "SQL statements issued per request.",
+                                   ('route',), COUNT_BUCKETS)
+REQUEST_SQL_SECONDS = Histogram('http_request_sql_seconds', "Time spent in SQLite per request.", ('route',))
+SQL_STATEMENTS = Counter('sql_statements_total', "SQL statements executed on pooled connections (all threads).")
+# kind is locked ("database is locked" / busy after the busy timeout) or other
+SQL_ERRORS = Counter('sql_errors_total', "Statements and commits that raised a SQLite error, by kind.", ('kind',))
+EMAIL_OUTBOX = Gauge('email_outbox_depth', "Emails handed to a sender thread and not yet sent or failed.")
+EMAILS = Counter('emails_total', "Emails sent, by result.", ('result',))
+# outcome is ok, http_error (non-200 reply) or error (no reply)
+GEMINI_SECONDS = Histogram('gemini_request_duration_seconds', "Gemini API call latency, by outcome.", ('outcome',))
+
+
+def render():
+    """Returns every metric in Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# --- Per-request SQL accounting ---
+
+_request = threading.local()
+
+
+def _trace(statement):
+    # Statements run by triggers are reported as "-- TRIGGER ..." comments
+    if statement.startswith('--'):
+        return
+    SQL_STATEMENTS.inc()
+    if getattr(_request, 'active', False):
+        _request.sql_statements += 1
+
+
+def _add_sql_time(conn, sql, parameters, seconds):
+    if getattr(_request, 'active', False):
+        _request.sql_seconds += seconds
+
+
+def error_kind(error):
+    """'locked' for SQLITE_BUSY / SQLITE_LOCKED errors, else 'other'."""
+    message = str(error)
+    return 'locked' if 'database is locked' in message or 'database table is locked' in message else 'other'
+
+
+def _count_sql_error(conn, sql, error):
+    SQL_ERRORS.inc(error_kind(error))
+
+
+def instrument_connection(conn):
+    """Connect hook: counts the statements run on a new pooled connection."""
+    conn.set_trace_callback(_trace)
+
+
+# --- Email outbox ---
+
+def email_queued():
+    EMAIL_OUTBOX.inc()
+
+
+def email_finished(sent):
+    EMAIL_OUTBOX.dec()
+    EMAILS.inc('sent' if sent else 'failed')
+
+
+# --- Flask wiring ---
+
+def is_enabled():
+    return os.getenv('METRICS_ENABLED', '') in ('1', 'true', 'yes')
+
+
+def init_app(app, enabled=None):
+    """
+    Installs the request timing hooks, the SQL connect hook and the
+    /metrics route when metrics are enabled. Call before the first
+    connection is opened; connections already pooled are not traced.
+    """
+    from flask import Response, abort, g, request
+
+    app.config.setdefault('METRICS_ENABLED', is_enabled() if enabled is None else enabled)
+    if not app.config['METRICS_ENABLED']:
+        return
+    app.config.setdefault('METRICS_TOKEN', os.getenv('METRICS_TOKEN', ''))
+    db.add_connect_hook(instrument_connection)
+    db.add_statement_hook(_add_sql_time)
+    db.add_error_hook(_count_sql_error)
+
+    @app.before_request
+    def _start_request_metrics():
+        g.metrics_start = time.perf_counter()
+        _request.active = True
+        _request.sql_statements = 0
+        _request.sql_seconds = 0.0
+
+    @app.after_request
+    def _record_request_metrics(response):
+        start = g.pop('metrics_start', None)
+        if start is not None:
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            REQUEST_SECONDS.observe(time.perf_counter() - start, route, request.method)
+            REQUESTS.inc(route, request.method, str(response.status_code))
+            REQUEST_SQL_STATEMENTS.observe(_request.sql_statements, route)
+            REQUEST_SQL_SECONDS.observe(_request.sql_seconds, route)
+            _request.active = False
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        token = app.config['METRICS_TOKEN']
+        if token and request.headers.get('Authorization') != f"Bearer {token}":
+            abort(401)
+        return Response(render(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,166 @@
+"""
+Money in record_book.db: integer paise (1 rupee = 100 paise).
+
+Amounts are converted only at the edges: to_paise() when a rupee amount
+comes in (forms, the CLI, JSON payloads) and format_paise(), rupees_str()
+or to_rupees() when one goes out (pages, emails, exports, JSON). In between, SQL SUMs
+and Python arithmetic work on whole numbers, so totals over any number
+of bills are exact and reconcile to the paisa.
+
+Databases created while amounts were REAL rupees are converted in place
+by migrate_to_paise(), which initialize_database() runs on every start
+(and initialize_wallet_schema() for the super_app.db wallet tables).
+It refuses to convert a table holding an amount that is not a finite
+number of paise below 2**63, rather than let SQLite's CAST clamp it.
+"""
+import re
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+PAISE_PER_RUPEE = 100
+
+# Every money column in record_book.db
+MONEY_COLUMNS = {
+    'customers': ('credit_limit',),
+    'transactions': ('amount', 'tax_amount', 'total_amount'),
+    'monthly_bills': ('subtotal', 'tax_amount', 'total_amount', 'paid_amount', 'due_amount'),
+    'products': ('price',),
+    'customer_risk': ('outstanding',),
+}
+
+_ONE_PAISA = Decimal('0.01')
+
+# Amounts must stay below this many paise to fit a signed 64-bit INTEGER.
+MAX_PAISE = 2 ** 63
+
+# Offending rows listed in a migration error.
+MAX_REPORTED_AMOUNTS = 20
+
+
+class AmountOutOfRange(ValueError):
+    """Legacy amounts that cannot be stored as integer paise; .amounts lists (table, rowid, column, value)."""
+
+    def __init__(self, amounts):
+        self.amounts = amounts
+        listed = "; ".join(f"{table} rowid {rowid}: {column} = {value!r}"
+                           for table, rowid, column, value in amounts[:MAX_REPORTED_AMOUNTS])
+        more = f" (and {len(amounts) - MAX_REPORTED_AMOUNTS} more)" if len(amounts) > MAX_REPORTED_AMOUNTS else ""
+        super().__init__(f"Cannot convert {len(amounts)} amount(s) to integer paise, "
+                         f"fix or remove them and restart: {listed}{more}")
+
+
+def to_paise(rupees):
+    """
+    Converts a rupee amount (str, int, float or Decimal) to integer paise,
+    rounding half up to the nearest paisa. Raises ValueError if it is not
+    a number.
+    """
+    try:
+        value = Decimal(str(rupees).strip())
+    except InvalidOperation:
+        raise ValueError(f"Not an amount: {rupees!r}")
+    if not value.is_finite():
+        raise ValueError(f"Not an amount: {rupees!r}")
+    return int(value.quantize(_ONE_PAISA, rounding=ROUND_HALF_UP) * PAISE_PER_RUPEE)
+
+
+def to_rupees(paise):
+    """Integer paise as an exact Decimal rupee amount, e.g. 123450 -> Decimal('1234.50')."""
+    return Decimal(int(paise or 0)).scaleb(-2)
+
+
+def format_paise(paise, symbol='₹'):
+    """
+    Formats integer paise as e.g. '₹1,234.50'. paise / 100 is the nearest
+    double to the exact amount, which always prints back to the same two
+    decimals for anything under about 10^13 rupees.
+    """
+    return f"{symbol}{(paise or 0) / PAISE_PER_RUPEE:,.2f}"
+
+
+def rupees_str(paise):
+    """Integer paise as a plain rupee string, e.g. '1234.50', for exports and form values."""
+    return f"{(paise or 0) / PAISE_PER_RUPEE:.2f}"
+
+
+def percent_of(paise, rate):
+    """rate percent of an amount in paise (e.g. tax), rounded half up to whole paise."""
+    share = Decimal(int(paise)) * Decimal(str(rate)) / 100
+    return int(share.quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def _declared_types(cursor, table):
+    return {row[1]: row[2].upper() for row in cursor.execute(f"PRAGMA table_info({table})")}
+
+
+def _legacy_columns(cursor, money_columns):
+    """{table: [money columns still declared REAL]} for tables that need converting."""
+    legacy = {}
+    for table, columns in money_columns.items():
+        types = _declared_types(cursor, table)
+        found = [column for column in columns if types.get(column) == 'REAL']
+        if found:
+            legacy[table] = found
+    return legacy
+
+
+def out_of_range_amounts(cursor, money_columns=MONEY_COLUMNS):
+    """
+    Returns [(table, rowid, column, value), ...] for legacy REAL amounts
+    that are not finite or whose paise would not fit in 2**63.
+    """
+    bad = []
+    for table, columns in _legacy_columns(cursor, money_columns).items():
+        for column in columns:
+            # inf * 100 and NaN never compare below the limit, so they are caught too
+            bad.extend((table, rowid, column, value) for rowid, value in cursor.execute(f"""
+                SELECT rowid, {column} FROM {table}
+                WHERE {column} IS NOT NULL AND NOT (abs({column} * {PAISE_PER_RUPEE}) < {float(MAX_PAISE)!r})
+                ORDER BY rowid
+            """))
+    return bad
+
+
+def migrate_to_paise(cursor, money_columns=MONEY_COLUMNS):
+    """
+    Rebuilds any table of money_columns ({table: (columns, ...)}, default
+    the record_book.db ones) whose money columns are still REAL rupees with
+    INTEGER paise columns, rounding each amount to the nearest paisa.
+    Uses SQLite's create-copy-drop-rename procedure, so run it with
+    foreign keys off and before the table's indexes and triggers are
+    (re)created. Returns the names of the tables it converted.
+    Raises AmountOutOfRange, before converting anything, if any amount
+    cannot be stored as integer paise.
+    """
+    bad = out_of_range_amounts(cursor, money_columns)
+    if bad:
+        raise AmountOutOfRange(bad)
+
+    converted = []
+    for table, legacy in _legacy_columns(cursor, money_columns).items():
+        types = _declared_types(cursor, table)
+
+        create_sql = cursor.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+        ).fetchone()[0]
+        for column in legacy:
+            create_sql = re.sub(
+                rf"\b{column}\s+REAL\b(\s+NOT NULL)?(\s+DEFAULT\s+([0-9.]+))?",
+                lambda m: f"{column} INTEGER{m.group(1) or ''}"
+                          + (f" DEFAULT {to_paise(m.group(3))}" if m.group(3) else ''),
+                create_sql,
+            )
+        create_sql = re.sub(rf"^\s*CREATE TABLE\s+(IF NOT EXISTS\s+)?{table}\b",
+                            f"CREATE TABLE {table}_paise", create_sql)
+
+        names = list(types)
+        select = ", ".join(
+            f"CAST(ROUND({name} * {PAISE_PER_RUPEE}) AS INTEGER)" if name in legacy else name
+            for name in names
+        )
+        cursor.execute(f"DROP TABLE IF EXISTS {table}_paise")
+        cursor.execute(create_sql)
+        cursor.execute(f"INSERT INTO {table}_paise ({', '.join(names)}) SELECT {select} FROM {table}")
+        cursor.execute(f"DROP TABLE {table}")
+        cursor.execute(f"ALTER TABLE {table}_paise RENAME TO {table}")
+        converted.append(table)
+    return converted
@@ -0,0 +1,148 @@
+"""
+Most-borrowed books and best-selling canteen items.
+
+Write paths update the daily rollups (see rollups.py) in the same
+transaction as the issue/sale, which also bumps the data set's
+data_versions counter. The in-memory TopK trackers below are loaded from
+the daily rollups, so "top 10 this week/term" never touches book_issues
+or canteen_sales, and are reloaded when that counter changes: checked at
+most once per CHECK_SECONDS, so issues and sales recorded by any worker
+process show up in every worker.
+"""
+import heapq
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+import db
+
+# Named ranking windows, in days (including today).
+WINDOWS = {
+    'week': 7,
+    'month': 30,
+    'term': 120,
+}
+
+
+# Each window keeps its top LEADER_SIZE items sorted; top(k) for k up to
+# this size is a slice, larger k falls back to a heap selection.
+LEADER_SIZE = 100
+
+# Seconds between data_versions checks for a tracker.
+CHECK_SECONDS = 2.0
+
+
+class TopK:
+    """
+    In-memory per-day counters with running totals for each window.
+
+    Totals are rebuilt from the per-day counters on load and when the
+    date rolls over; each window's sorted leader list is selected on the
+    first top() after that. version is the data_versions value the
+    counters were loaded at.
+    """
+
+    def __init__(self, windows=WINDOWS):
+        self.windows = dict(windows)
+        self.horizon = max(self.windows.values())
+        self._daily = defaultdict(Counter)
+        self._totals = {name: Counter() for name in self.windows}
+        self._leaders = {}
+        self._today = None
+        self._lock = threading.Lock()
+        self.loaded = False
+        self.version = None
+        self.checked_at = 0.0
+
+    def _window_start(self, days):
+        return (datetime.strptime(self._today, '%Y-%m-%d') - timedelta(days=days - 1)).strftime('%Y-%m-%d')
+
+    def _roll_to(self, today):
+        """Drops days past the horizon and recomputes window totals."""
+        self._today = today
+        oldest = self._window_start(self.horizon)
+        for day in [d for d in self._daily if d < oldest]:
+            del self._daily[day]
+        for name, days in self.windows.items():
+            start = self._window_start(days)
+            totals = Counter()
+            for day, counts in self._daily.items():
+                if start <= day <= today:
+                    totals.update(counts)
+            self._totals[name] = totals
+        self._leaders.clear()
+
+    def _check_date(self):
+        today = datetime.now().strftime('%Y-%m-%d')
+        if today != self._today:
+            self._roll_to(today)
+
+    def load(self, rows, today=None, version=None):
+        """Replaces all counters with (stat_date, item_id, count) rows."""
+        today = today or datetime.now().strftime('%Y-%m-%d')
+        daily = defaultdict(Counter)
+        for stat_date, item_id, count in rows:
+            daily[stat_date][item_id] += count
+        with self._lock:
+            self._daily = daily
+            self._roll_to(today)
+            self.loaded = True
+            self.version = version
+
+    def top(self, window='week', k=10):
+        """Returns [(item_id, count), ...] for the k most popular items in a window."""
+        with self._lock:
+            self._check_date()
+            if k > LEADER_SIZE:
+                return heapq.nlargest(k, self._totals[window].items(), key=lambda item: item[1])
+            if window not in self._leaders:
+                self._leaders[window] = heapq.nlargest(
+                    LEADER_SIZE, self._totals[window].items(), key=lambda item: item[1]
+                )
+            return self._leaders[window][:k]
+
+
+BOOKS = TopK()
+MENU_ITEMS = TopK()
+
+# tracker -> (data set in data_versions, rollup query)
+SOURCES = {
+    'books': (BOOKS, 'book_issues',
+              "SELECT stat_date, book_id, issues FROM book_daily_issues WHERE stat_date >= ?"),
+    'menu_items': (MENU_ITEMS, 'canteen_sales',
+                   "SELECT stat_date, item_id, quantity FROM menu_item_daily_sales WHERE stat_date >= ?"),
+}
+
+
+def _refresh(name, db_path, force=False):
+    """Reloads a tracker from its rollup table if its data set has changed since it was loaded."""
+    tracker, data_set, query = SOURCES[name]
+    now = time.monotonic()
+    if not force and tracker.loaded and now - tracker.checked_at < CHECK_SECONDS:
+        return
+    with db.get_pool(db_path).connection() as conn:
+        # Read the version first: a write landing in between only causes one extra reload
+        version = db.get_data_versions(conn).get(data_set, 0)
+        if force or not tracker.loaded or version != tracker.version:
+            since = (datetime.now() - timedelta(days=max(WINDOWS.values()) - 1)).strftime('%Y-%m-%d')
+            tracker.load(conn.execute(query, (since,)).fetchall(), version=version)
+    tracker.checked_at = now
+
+
+def load_from_rollups(db_path=db.SUPER_APP_DB):
+    """Rebuilds BOOKS and MENU_ITEMS from the rollup tables (run at startup)."""
+    for name in SOURCES:
+        _refresh(name, db_path, force=True)
+
+
+def top_books(window='week', k=10, db_path=db.SUPER_APP_DB):
+    """Most-issued books in a window: [(book_id, issues), ...]."""
+    _refresh('books', db_path)
+    return BOOKS.top(window, k)
+
+
+def top_menu_items(window='week', k=10, db_path=db.SUPER_APP_DB):
+    """Best-selling menu items in a window: [(item_id, quantity), ...]."""
+    _refresh('menu_items', db_path)
+    return MENU_ITEMS.top(window, k)
@@ -0,0 +1,254 @@
+"""
+On-demand per-request profiling.
+
+A logged-in admin adds ?_profile=1 (or the header X-Profile: 1) to any
+page to run that one request under cProfile, or ?_profile=sample to
+sample its stack every SAMPLE_INTERVAL seconds instead (low overhead,
+closer to real timings). The results go to PROFILE_DIR:
+
+  <id>.prof    cProfile stats, for pstats/snakeviz        (cProfile mode)
+  <id>.txt     top functions by cumulative / sampled time
+  <id>.folded  collapsed stacks, one "a;b;c count" line per stack, for
+               flamegraph.pl, speedscope or inferno
+
+and the response carries X-Profile-Id plus a Link header to each file;
+app.py serves them under /admin/profiles. Only the newest
+PROFILE_KEEP profiles are kept. The body of a streamed response is
+produced after the request hooks run, so it is not profiled.
+
+In sample mode a .folded count is a number of samples. In cProfile mode
+it is microseconds, rebuilt from the caller graph: cProfile only records
+caller -> callee edges, so a function's time is split across the paths
+that reach it in proportion to each caller's share of it.
+"""
+import cProfile
+import io
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from datetime import datetime
+
+PROFILE_DIR = "profiles"
+PROFILE_KEEP = 200
+
+# Seconds between stack samples in sample mode.
+SAMPLE_INTERVAL = 0.001
+
+# Functions listed in the .txt summary.
+SUMMARY_LINES = 40
+
+# Stacks under this fraction of the request's time are left out of a
+# cProfile .folded file, which bounds the walk over the caller graph.
+FOLDED_MIN_SHARE = 0.0001
+
+MODES = {
+    '1': 'cprofile',
+    'cprofile': 'cprofile',
+    'sample': 'sample',
+}
+
+
+class StackSampler:
+    """Samples one thread's Python stack from a background thread."""
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def folded(self):
+        """Collapsed stacks, most frequent first."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def summary(self):
+        """Leaf functions by share of samples."""
+        total = sum(self.stacks.values()) or 1
+        own = Counter()
+        for stack, count in self.stacks.items():
+            own[stack.rsplit(";", 1)[-1]] += count
+        lines = [f"{total} samples every {self.interval * 1000:g} ms", "", "  self%  samples  function"]
+        for function, count in own.most_common(SUMMARY_LINES):
+            lines.append(f"{count / total * 100:7.1f}  {count:7d}  {function}")
+        return "\n".join(lines) + "\n"
+
+
+def _label(func):
+    filename, _, name = func
+    return f"{os.path.basename(filename)}:{name}" if filename != '~' else name
+
+
+def folded_from_stats(stats, min_share=FOLDED_MIN_SHARE):
+    """
+    Collapsed stacks from pstats.Stats, counted in microseconds, most time
+    first. Each function's time on a path is its total scaled by the share
+    of it that the path's caller accounts for; recursive calls are folded
+    into the first frame.
+    """
+    callees = defaultdict(list)
+    for func, (_, _, _, _, callers) in stats.stats.items():
+        for caller, edge in callers.items():
+            callees[caller].append((func, edge[3]))
+    roots = [func for func, entry in stats.stats.items() if not entry[4]]
+    total = sum(stats.stats[func][3] for func in roots)
+    floor = total * min_share
+    stacks = Counter()
+
+    def walk(func, path, on_path, seconds):
+        _, _, own, cumulative, _ = stats.stats[func]
+        scale = seconds / cumulative if cumulative else 0.0
+        path = path + [_label(func)]
+        stacks[";".join(path)] += own * scale
+        on_path = on_path | {func}
+        for callee, edge_seconds in callees.get(func, ()):
+            if callee not in on_path and edge_seconds * scale >= floor:
+                walk(callee, path, on_path, edge_seconds * scale)
+
+    for root in roots:
+        if stats.stats[root][3] >= floor:
+            walk(root, [], frozenset(), stats.stats[root][3])
+    lines = [(stack, round(seconds * 1e6)) for stack, seconds in stacks.most_common()]
+    return "".join(f"{stack} {us}\n" for stack, us in lines if us > 0)
+
+
+def requested_mode(request, session):
+    """Returns 'cprofile' or 'sample' if this request asked to be profiled by an admin, else None."""
+    flag = request.args.get('_profile') or request.headers.get('X-Profile')
+    if not flag or not session.get('logged_in'):
+        return None
+    return MODES.get(flag.lower())
+
+
+def _profile_id(path):
+    slug = re.sub(r"[^A-Za-z0-9]+", "-", path).strip("-")[:40] or "root"
+    return f"{datetime.now():%Y%m%d-%H%M%S}-{slug}-{uuid.uuid4().hex[:6]}"
+
+
+def _prune(profile_dir, keep):
+    ids = sorted({name.rsplit(".", 1)[0] for name in os.listdir(profile_dir)})
+    for old in ids[:-keep] if keep else ids:
+        for ext in ('prof', 'txt', 'folded'):
+            path = os.path.join(profile_dir, f"{old}.{ext}")
+            if os.path.exists(path):
+                os.remove(path)
+
+
+class RequestProfile:
+    """One profiled request: start() before the view, finish() after it."""
+
+    def __init__(self, mode, path):
+        self.mode = mode
+        self.id = _profile_id(path)
+        self.started = None
+        self._profiler = None
+        self._sampler = None
+
+    def start(self):
+        self.started = time.perf_counter()
+        if self.mode == 'sample':
+            self._sampler = StackSampler(threading.get_ident())
+            self._sampler.start()
+        else:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    def stop(self):
+        if self._profiler is not None:
+            self._profiler.disable()
+        else:
+            self._sampler.stop()
+
+    def finish(self, profile_dir, keep=PROFILE_KEEP):
+        """Stops profiling and writes the files. Returns their names."""
+        elapsed = time.perf_counter() - self.started
+        os.makedirs(profile_dir, exist_ok=True)
+        header = f"{self.id}: {elapsed * 1000:.1f} ms ({self.mode})\n\n"
+        files = []
+        self.stop()
+        if self._profiler is not None:
+            self._profiler.dump_stats(os.path.join(profile_dir, f"{self.id}.prof"))
+            text = io.StringIO()
+            stats = pstats.Stats(self._profiler, stream=text)
+            stats.sort_stats('cumulative').print_stats(SUMMARY_LINES)
+            summary = text.getvalue()
+            folded = folded_from_stats(stats)
+            files.append(f"{self.id}.prof")
+        else:
+            folded = self._sampler.folded()
+            summary = self._sampler.summary()
+        with open(os.path.join(profile_dir, f"{self.id}.folded"), 'w', encoding='utf-8') as f:
+            f.write(folded)
+        files.append(f"{self.id}.folded")
+        with open(os.path.join(profile_dir, f"{self.id}.txt"), 'w', encoding='utf-8') as f:
+            f.write(header + summary)
+        files.append(f"{self.id}.txt")
+        _prune(profile_dir, keep)
+        return files
+
+
+def list_profiles(profile_dir):
+    """Returns [(id, [file names])] for saved profiles, newest first."""
+    if not os.path.isdir(profile_dir):
+        return []
+    profiles = {}
+    for name in os.listdir(profile_dir):
+        profile_id, _, ext = name.rpartition(".")
+        if ext in ('prof', 'txt', 'folded'):
+            profiles.setdefault(profile_id, []).append(name)
+    return [(profile_id, sorted(names)) for profile_id, names in sorted(profiles.items(), reverse=True)]
+
+
+def init_app(app):
+    """Installs the request hooks; the files are served by app.py's /admin/profiles routes."""
+    from flask import g, request, session, url_for
+
+    app.config.setdefault('PROFILE_DIR', PROFILE_DIR)
+
+    @app.before_request
+    def _start_profile():
+        mode = requested_mode(request, session)
+        if mode:
+            g.request_profile = RequestProfile(mode, request.path)
+            g.request_profile.start()
+
+    @app.after_request
+    def _finish_profile(response):
+        profile = g.pop('request_profile', None)
+        if profile is not None:
+            files = profile.finish(app.config['PROFILE_DIR'])
+            response.headers['X-Profile-Id'] = profile.id
+            response.headers['Link'] = ", ".join(
+                f'<{url_for("admin_profile_file", filename=name)}>; rel="profile"' for name in files
+            )
+        return response
+
+    @app.teardown_request
+    def _abandon_profile(exc):
+        # Only left over if the request failed before after_request ran
+        profile = g.pop('request_profile', None)
+        if profile is not None:
+            profile.stop()
@@ -0,0 +1,196 @@
+"""
+Offline risk scoring for every customer.
+
+Computes a payment reliability score (1-10) and a Low/Medium/High risk band
+for all customers in one vectorized pass over monthly_bills and transactions,
+and stores the results in the customer_risk table. The customers and alerts
+pages sort and filter on that table, so Gemini is only needed for the
+narrative explanation of a single customer.
+
+Run nightly from cron with:  python risk_scoring.py [path/to/record_book.db]
+"""
+import sys
+from datetime import datetime
+
+import db
+
+DB_FILE = "record_book.db"
+
+# Weights for the reliability score components (they sum to 1.0).
+WEIGHT_BILL_PAID_RATIO = 0.4
+WEIGHT_TRANSACTION_PAID_RATE = 0.2
+WEIGHT_CREDIT_HEADROOM = 0.2
+WEIGHT_OVERDUE_AGE = 0.2
+
+# A bill this many days past due counts as fully delinquent.
+MAX_OVERDUE_DAYS = 90
+
+# Name of the scoring run in job_runs.
+JOB_NAME = 'risk_scoring'
+
+# Score thresholds for the risk bands.
+LOW_RISK_MIN_SCORE = 7.0
+MEDIUM_RISK_MIN_SCORE = 4.0
+
+
+def create_risk_table(conn):
+    """Creates the customer_risk table, its sort index and job_runs if missing."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS customer_risk (
+            customer_id INTEGER PRIMARY KEY,
+            reliability_score REAL NOT NULL,
+            risk_band TEXT NOT NULL,
+            outstanding INTEGER DEFAULT 0,
+            overdue_bills INTEGER DEFAULT 0,
+            max_days_overdue INTEGER DEFAULT 0,
+            paid_ratio REAL DEFAULT 1,
+            scored_at TEXT NOT NULL,
+            FOREIGN KEY (customer_id) REFERENCES customers (customer_id)
+        )
+    """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_customer_risk_band
+        ON customer_risk (risk_band, reliability_score)
+    """)
+    db.create_job_runs_table(conn)
+
+
+def compute_risk_scores(conn, today=None):
+    """
+    Scores every customer in one vectorized pass.
+    Returns a pandas DataFrame indexed by customer_id with the
+    customer_risk columns.
+    """
+    import numpy as np
+    import pandas as pd
+
+    today = pd.Timestamp(today or datetime.now().strftime('%Y-%m-%d'))
+
+    customers = pd.read_sql_query(
+        "SELECT customer_id, credit_limit FROM customers", conn, index_col='customer_id'
+    )
+    bills = pd.read_sql_query(
+        "SELECT customer_id, total_amount, paid_amount, due_amount, due_date, status FROM monthly_bills",
+        conn
+    )
+    transactions = pd.read_sql_query(
+        "SELECT customer_id, status FROM transactions WHERE transaction_type = 'Sale/Credit'",
+        conn
+    )
+
+    # --- Bill-level features ---
+    unpaid = bills['status'] == 'Unpaid'
+    due_dates = pd.to_datetime(bills['due_date'], errors='coerce')
+    days_overdue = (today - due_dates).dt.days.where(unpaid, 0).clip(lower=0).fillna(0)
+
+    bills = bills.assign(
+        outstanding=bills['due_amount'].where(unpaid, 0),
+        is_overdue=(unpaid & (days_overdue > 0)).astype(int),
+        days_overdue=days_overdue,
+    )
+    bill_stats = bills.groupby('customer_id').agg(
+        billed=('total_amount', 'sum'),
+        paid=('paid_amount', 'sum'),
+        outstanding=('outstanding', 'sum'),
+        overdue_bills=('is_overdue', 'sum'),
+        max_days_overdue=('days_overdue', 'max'),
+    )
+
+    # --- Transaction-level features ---
+    transactions['is_paid'] = (transactions['status'] == 'Paid').astype(int)
+    txn_stats = transactions.groupby('customer_id')['is_paid'].mean().rename('txn_paid_rate')
+
+    scores = customers.join(bill_stats, how='left').join(txn_stats, how='left')
+    scores[['billed', 'paid', 'outstanding', 'overdue_bills', 'max_days_overdue']] = (
+        scores[['billed', 'paid', 'outstanding', 'overdue_bills', 'max_days_overdue']].fillna(0)
+    )
+    # Customers with no credit history are treated as fully reliable.
+    scores['txn_paid_rate'] = scores['txn_paid_rate'].fillna(1.0)
+
+    billed = scores['billed'].to_numpy(dtype=float)
+    paid = scores['paid'].to_numpy(dtype=float)
+    paid_ratio = np.divide(paid, billed, out=np.ones_like(billed), where=billed > 0).clip(0, 1)
+
+    credit_limit = scores['credit_limit'].fillna(0).to_numpy(dtype=float)
+    outstanding = scores['outstanding'].to_numpy(dtype=float)
+    utilisation = np.divide(
+        outstanding, credit_limit,
+        out=np.where(outstanding > 0, 1.0, 0.0),
+        where=credit_limit > 0
+    ).clip(0, 1)
+
+    overdue_age = (scores['max_days_overdue'].to_numpy(dtype=float) / MAX_OVERDUE_DAYS).clip(0, 1)
+
+    raw = (
+        WEIGHT_BILL_PAID_RATIO * paid_ratio
+        + WEIGHT_TRANSACTION_PAID_RATE * scores['txn_paid_rate'].to_numpy(dtype=float)
+        + WEIGHT_CREDIT_HEADROOM * (1 - utilisation)
+        + WEIGHT_OVERDUE_AGE * (1 - overdue_age)
+    )
+    reliability = np.round(np.clip(raw * 10, 1, 10), 1)
+
+    scores['reliability_score'] = reliability
+    scores['risk_band'] = np.select(
+        [reliability >= LOW_RISK_MIN_SCORE, reliability >= MEDIUM_RISK_MIN_SCORE],
+        ['Low', 'Medium'],
+        default='High'
+    )
+    scores['paid_ratio'] = np.round(paid_ratio, 4)
+    scores['overdue_bills'] = scores['overdue_bills'].astype(int)
+    scores['max_days_overdue'] = scores['max_days_overdue'].astype(int)
+    scores['outstanding'] = scores['outstanding'].astype('int64')
+    scores['scored_at'] = today.strftime('%Y-%m-%d')
+
+    return scores[['reliability_score', 'risk_band', 'outstanding', 'overdue_bills',
+                   'max_days_overdue', 'paid_ratio', 'scored_at']]
+
+
+def run_risk_scoring(db_path=DB_FILE, today=None):
+    """
+    Recomputes risk scores for all customers and records the run in
+    job_runs, in one transaction. Only scores that changed are written
+    (scored_at is when a customer's score last changed), so the version
+    triggers leave unchanged customers' cached pages alone.
+    Returns the number of customers scored.
+    """
+    conn = db.connect(db_path, foreign_keys=False)
+    try:
+        create_risk_table(conn)
+        scores = compute_risk_scores(conn, today)
+        rows = list(scores.itertuples(index=True, name=None))
+        with conn:
+            stale = {row[0] for row in conn.execute("SELECT customer_id FROM customer_risk")} - set(scores.index)
+            conn.executemany("DELETE FROM customer_risk WHERE customer_id = ?", [(c,) for c in stale])
+            conn.executemany("""
+                INSERT INTO customer_risk (customer_id, reliability_score, risk_band, outstanding,
+                                           overdue_bills, max_days_overdue, paid_ratio, scored_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (customer_id) DO UPDATE SET
+                    reliability_score = excluded.reliability_score, risk_band = excluded.risk_band,
+                    outstanding = excluded.outstanding, overdue_bills = excluded.overdue_bills,
+                    max_days_overdue = excluded.max_days_overdue, paid_ratio = excluded.paid_ratio,
+                    scored_at = excluded.scored_at
+                WHERE (reliability_score, risk_band, outstanding, overdue_bills, max_days_overdue, paid_ratio)
+                      IS NOT (excluded.reliability_score, excluded.risk_band, excluded.outstanding,
+                              excluded.overdue_bills, excluded.max_days_overdue, excluded.paid_ratio)
+            """, rows)
+            db.record_job_run(conn, JOB_NAME, today or datetime.now().strftime('%Y-%m-%d'))
+        return len(rows)
+    finally:
+        conn.close()
+
+
+def last_scored_date(db_path=DB_FILE):
+    """Returns the date of the last scoring run (even one that scored no one), or None if never run."""
+    conn = db.connect(db_path, foreign_keys=False)
+    try:
+        create_risk_table(conn)
+        return db.last_job_run(conn, JOB_NAME)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    db_path = sys.argv[1] if len(sys.argv) > 1 else DB_FILE
+    count = run_risk_scoring(db_path)
+    print(f"Scored {count} customers in {db_path}")
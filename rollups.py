@@ -0,0 +1,351 @@
+"""
+Daily, weekly and monthly rollups of canteen sales and library circulation.
+
+Write paths call record_book_activity/record_menu_sales inside their own
+transaction, which upserts the day's row and the enclosing week's and
+month's rows and bumps the data set's data_versions counter. Reports
+then answer date-range questions from these small tables (whole months
+and weeks from the period tables, partial edges from the daily table)
+instead of grouping raw book_issues/canteen_sales rows.
+
+Weeks start on Monday; months on the 1st. Period rows are keyed by the
+period's first day (YYYY-MM-DD).
+
+Rebuild everything from the raw tables with:  python rollups.py [path/to/super_app.db]
+"""
+import sys
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import db
+
+DB_FILE = db.SUPER_APP_DB
+
+GRAINS = ('day', 'week', 'month')
+
+# Per data set: daily table, period table, id column, measures, and the
+# table/column that names an id.
+DATASETS = {
+    'canteen': {
+        'daily': 'menu_item_daily_sales',
+        'period': 'menu_item_period_sales',
+        'key': 'item_id',
+        'measures': ('quantity', 'revenue'),
+        'labels': ('menu_items', 'name'),
+    },
+    'library': {
+        'daily': 'book_daily_issues',
+        'period': 'book_period_stats',
+        'key': 'book_id',
+        'measures': ('issues', 'returns'),
+        'labels': ('books', 'title'),
+    },
+}
+
+
+def _table_exists(cursor, name):
+    return cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+    ).fetchone() is not None
+
+
+def create_rollup_tables(cursor):
+    """
+    Creates the rollup tables if missing. The first time they are created
+    (or gain their newer columns) they are backfilled from the raw tables.
+    """
+    db.create_data_versions_table(cursor)
+    needs_backfill = False
+
+    if not _table_exists(cursor, 'book_daily_issues'):
+        needs_backfill = True
+        cursor.execute("""
+            CREATE TABLE book_daily_issues (
+                stat_date TEXT NOT NULL,
+                book_id INTEGER NOT NULL,
+                issues INTEGER NOT NULL DEFAULT 0,
+                returns INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (stat_date, book_id)
+            ) WITHOUT ROWID
+        """)
+    if not _table_exists(cursor, 'menu_item_daily_sales'):
+        needs_backfill = True
+        cursor.execute("""
+            CREATE TABLE menu_item_daily_sales (
+                stat_date TEXT NOT NULL,
+                item_id INTEGER NOT NULL,
+                quantity INTEGER NOT NULL DEFAULT 0,
+                revenue REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (stat_date, item_id)
+            ) WITHOUT ROWID
+        """)
+    # Daily tables created before returns/revenue were tracked
+    for table, column, definition in (('book_daily_issues', 'returns', 'INTEGER NOT NULL DEFAULT 0'),
+                                      ('menu_item_daily_sales', 'revenue', 'REAL NOT NULL DEFAULT 0')):
+        if column not in {row[1] for row in cursor.execute(f"PRAGMA table_info({table})")}:
+            needs_backfill = True
+            db.add_column_if_missing(cursor, table, column, definition)
+
+    if not _table_exists(cursor, 'book_period_stats'):
+        needs_backfill = True
+        cursor.execute("""
+            CREATE TABLE book_period_stats (
+                grain TEXT NOT NULL,
+                period_start TEXT NOT NULL,
+                book_id INTEGER NOT NULL,
+                issues INTEGER NOT NULL DEFAULT 0,
+                returns INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (grain, period_start, book_id)
+            ) WITHOUT ROWID
+        """)
+    if not _table_exists(cursor, 'menu_item_period_sales'):
+        needs_backfill = True
+        cursor.execute("""
+            CREATE TABLE menu_item_period_sales (
+                grain TEXT NOT NULL,
+                period_start TEXT NOT NULL,
+                item_id INTEGER NOT NULL,
+                quantity INTEGER NOT NULL DEFAULT 0,
+                revenue REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (grain, period_start, item_id)
+            ) WITHOUT ROWID
+        """)
+
+    if needs_backfill:
+        backfill(cursor.connection)
+
+
+# --- Periods ---
+
+def _parse(day):
+    return day if isinstance(day, datetime) else datetime.strptime(str(day)[:10], '%Y-%m-%d')
+
+
+def period_start(day, grain):
+    """Returns the first day (datetime) of the week/month containing day."""
+    day = _parse(day)
+    if grain == 'week':
+        return day - timedelta(days=day.weekday())
+    if grain == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def period_end(start, grain):
+    """Returns the last day (datetime) of the week/month starting at start."""
+    if grain == 'week':
+        return start + timedelta(days=6)
+    if grain == 'month':
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+    return start
+
+
+def split_range(start, end, grain):
+    """
+    Splits [start, end] into the periods it overlaps.
+    Returns (period_start, first_day, last_day, whole) tuples of YYYY-MM-DD
+    strings; whole is True when the range covers the entire period.
+    """
+    day, end = _parse(start), _parse(end)
+    pieces = []
+    while day <= end:
+        p_start = period_start(day, grain)
+        p_end = period_end(p_start, grain)
+        last = min(end, p_end)
+        pieces.append((p_start.strftime('%Y-%m-%d'), day.strftime('%Y-%m-%d'), last.strftime('%Y-%m-%d'),
+                       day == p_start and last == p_end))
+        day = p_end + timedelta(days=1)
+    return pieces
+
+
+# --- Write path (caller owns the transaction) ---
+
+def _upsert(conn, dataset, stat_date, values):
+    """values: {id: (measure1, measure2)} added to the day, week and month rows."""
+    spec = DATASETS[dataset]
+    key, (m1, m2) = spec['key'], spec['measures']
+    conn.executemany(f"""
+        INSERT INTO {spec['daily']} (stat_date, {key}, {m1}, {m2}) VALUES (?, ?, ?, ?)
+        ON CONFLICT (stat_date, {key}) DO UPDATE SET {m1} = {m1} + excluded.{m1}, {m2} = {m2} + excluded.{m2}
+    """, [(stat_date, id_, a, b) for id_, (a, b) in values.items()])
+    starts = [(grain, period_start(stat_date, grain).strftime('%Y-%m-%d')) for grain in ('week', 'month')]
+    conn.executemany(f"""
+        INSERT INTO {spec['period']} (grain, period_start, {key}, {m1}, {m2}) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (grain, period_start, {key}) DO UPDATE SET {m1} = {m1} + excluded.{m1}, {m2} = {m2} + excluded.{m2}
+    """, [(grain, start, id_, a, b) for grain, start in starts for id_, (a, b) in values.items()])
+
+
+def record_book_activity(conn, stat_date, issues=None, returns=None):
+    """Adds {book_id: count} issues and returns to the day/week/month rollups."""
+    issues, returns = issues or {}, returns or {}
+    values = {book_id: (issues.get(book_id, 0), returns.get(book_id, 0)) for book_id in set(issues) | set(returns)}
+    if values:
+        _upsert(conn, 'library', stat_date, values)
+        db.bump_data_version(conn, 'book_issues')
+
+
+def record_menu_sales(conn, stat_date, sales):
+    """Adds {item_id: (quantity, revenue)} to the day/week/month rollups."""
+    if sales:
+        _upsert(conn, 'canteen', stat_date, sales)
+        db.bump_data_version(conn, 'canteen_sales')
+
+
+# --- Backfill ---
+
+def backfill(conn):
+    """
+    Rebuilds every rollup table from book_issues and canteen_sales with
+    vectorized pandas group-bys, in one transaction on conn.
+    Returns {table: rows written}.
+    """
+    import pandas as pd
+
+    def load(sql, table):
+        if not _table_exists(conn, table):
+            return None
+        return pd.read_sql_query(sql, conn)
+
+    frames = {}
+
+    issues = load("SELECT book_id, issue_date, return_date FROM book_issues WHERE book_id IS NOT NULL", 'book_issues')
+    if issues is not None and not issues.empty:
+        issued = (issues.assign(day=pd.to_datetime(issues['issue_date'].str[:10], errors='coerce'))
+                  .dropna(subset=['day']).groupby(['day', 'book_id']).size().rename('issues'))
+        returned = (issues.assign(day=pd.to_datetime(issues['return_date'].str[:10], errors='coerce'))
+                    .dropna(subset=['day']).groupby(['day', 'book_id']).size().rename('returns'))
+        frames['library'] = pd.concat([issued, returned], axis=1).fillna(0).astype(int).reset_index()
+
+    sales = load("SELECT item_id, quantity, total_price, sale_date FROM canteen_sales WHERE item_id IS NOT NULL",
+                 'canteen_sales')
+    if sales is not None and not sales.empty:
+        frames['canteen'] = (sales.assign(day=pd.to_datetime(sales['sale_date'].str[:10], errors='coerce'))
+                             .dropna(subset=['day'])
+                             .groupby(['day', 'item_id'])
+                             .agg(quantity=('quantity', 'sum'), revenue=('total_price', 'sum'))
+                             .reset_index())
+
+    written = {}
+    with conn:
+        for dataset, spec in DATASETS.items():
+            key, (m1, m2) = spec['key'], spec['measures']
+            conn.execute(f"DELETE FROM {spec['daily']}")
+            conn.execute(f"DELETE FROM {spec['period']}")
+            daily = frames.get(dataset)
+            if daily is None:
+                continue
+
+            rows = list(zip(daily['day'].dt.strftime('%Y-%m-%d'), daily[key].astype(int),
+                            daily[m1].tolist(), daily[m2].tolist()))
+            conn.executemany(f"INSERT INTO {spec['daily']} (stat_date, {key}, {m1}, {m2}) VALUES (?, ?, ?, ?)", rows)
+            written[spec['daily']] = len(rows)
+
+            period_rows = []
+            for grain, freq in (('week', 'W-SUN'), ('month', 'M')):
+                periods = (daily.assign(start=daily['day'].dt.to_period(freq).dt.start_time)
+                           .groupby(['start', key])[[m1, m2]].sum().reset_index())
+                period_rows += zip([grain] * len(periods), periods['start'].dt.strftime('%Y-%m-%d'),
+                                   periods[key].astype(int), periods[m1].tolist(), periods[m2].tolist())
+            conn.executemany(f"""
+                INSERT INTO {spec['period']} (grain, period_start, {key}, {m1}, {m2}) VALUES (?, ?, ?, ?, ?)
+            """, period_rows)
+            written[spec['period']] = len(period_rows)
+        db.bump_data_version(conn, 'book_issues')
+        db.bump_data_version(conn, 'canteen_sales')
+    return written
+
+
+# --- Queries ---
+
+def _sum_pieces(conn, spec, pieces, grain, key_id=None, group_by_key=False):
+    """
+    Sums measures over split_range pieces: whole periods from the period
+    table, partial ones from the daily table.
+    Yields (period_start, id or None, m1, m2) rows.
+    """
+    key, (m1, m2) = spec['key'], spec['measures']
+    id_filter = f" AND {key} = ?" if key_id is not None else ""
+    id_params = [key_id] if key_id is not None else []
+    select_key = f"{key}" if group_by_key else "NULL"
+    group = f" GROUP BY {key}" if group_by_key else ""
+
+    for p_start, first, last, whole in pieces:
+        if whole and grain != 'day':
+            sql = f"""SELECT {select_key}, SUM({m1}), SUM({m2}) FROM {spec['period']}
+                      WHERE grain = ? AND period_start = ?{id_filter}{group}"""
+            params = [grain, p_start] + id_params
+        else:
+            sql = f"""SELECT {select_key}, SUM({m1}), SUM({m2}) FROM {spec['daily']}
+                      WHERE stat_date BETWEEN ? AND ?{id_filter}{group}"""
+            params = [first, last] + id_params
+        for id_, a, b in conn.execute(sql, params):
+            if a is not None:
+                yield p_start, id_, a, b
+
+
+def series(dataset, start, end, grain='day', key_id=None, db_path=None):
+    """
+    Per-period totals for a data set over [start, end] (YYYY-MM-DD).
+    grain is 'day', 'week' or 'month'; key_id limits it to one item/book.
+    Returns a list of dicts: period plus the data set's two measures,
+    e.g. {'period': '2025-06-02', 'quantity': 41, 'revenue': 615.0}.
+    """
+    spec = DATASETS[dataset]
+    m1, m2 = spec['measures']
+    with db.get_pool(db_path or DB_FILE).connection() as conn:
+        if grain == 'day':
+            key_filter = f" AND {spec['key']} = ?" if key_id is not None else ""
+            rows = conn.execute(f"""
+                SELECT stat_date, SUM({m1}), SUM({m2}) FROM {spec['daily']}
+                WHERE stat_date BETWEEN ? AND ?{key_filter}
+                GROUP BY stat_date ORDER BY stat_date
+            """, [start, end] + ([key_id] if key_id is not None else [])).fetchall()
+            return [{'period': day, m1: a, m2: round(b, 2)} for day, a, b in rows]
+
+        result = []
+        for p_start, _, a, b in _sum_pieces(conn, spec, split_range(start, end, grain), grain, key_id):
+            result.append({'period': p_start, m1: a, m2: round(b, 2)})
+    return result
+
+
+def totals(dataset, start, end, limit=None, db_path=None):
+    """
+    Per-item (canteen) or per-title (library) totals over [start, end],
+    largest first. Whole months come from the monthly rollup and the
+    partial months at either end from the daily one.
+    Returns a list of dicts with the id, its name/title and both measures.
+    """
+    spec = DATASETS[dataset]
+    key, (m1, m2) = spec['key'], spec['measures']
+    label_table, label_column = spec['labels']
+    sums = defaultdict(lambda: [0, 0])
+    with db.get_pool(db_path or DB_FILE).connection() as conn:
+        pieces = split_range(start, end, 'month')
+        for _, id_, a, b in _sum_pieces(conn, spec, pieces, 'month', group_by_key=True):
+            sums[id_][0] += a
+            sums[id_][1] += b
+
+        ranked = sorted(sums.items(), key=lambda item: item[1][0], reverse=True)
+        if limit:
+            ranked = ranked[:limit]
+        labels = {}
+        ids = [id_ for id_, _ in ranked]
+        for offset in range(0, len(ids), 500):
+            chunk = ids[offset:offset + 500]
+            placeholders = ", ".join("?" for _ in chunk)
+            labels.update(conn.execute(
+                f"SELECT {key}, {label_column} FROM {label_table} WHERE {key} IN ({placeholders})", chunk
+            ).fetchall())
+
+    return [{key: id_, label_column: labels.get(id_), m1: a, m2: round(b, 2)} for id_, (a, b) in ranked]
+
+
+if __name__ == "__main__":
+    db_path = sys.argv[1] if len(sys.argv) > 1 else DB_FILE
+    conn = db.connect(db_path)
+    try:
+        create_rollup_tables(conn.cursor())
+        for table, count in backfill(conn).items():
+            print(f"{table}: {count} rows")
+    finally:
+        conn.close()
@@ -0,0 +1,251 @@
+"""
+Production launcher for the record book app.
+
+    python serve.py [--host 0.0.0.0] [--port 5000] [--workers 4] [--threads 8]
+                    [--preload | --no-preload] [--server auto|gunicorn|waitress|builtin]
+
+Runs the app from app.create_app() under one of:
+
+  gunicorn  pre-forked worker processes with a thread pool each (gthread)
+  waitress  one process with a thread pool (Windows-friendly)
+  builtin   pre-forked Werkzeug workers with a thread pool each, for when
+            neither is installed; a single threaded process where fork()
+            is not available
+
+auto picks gunicorn, then waitress, then builtin. The one-time startup
+work (creating and migrating the databases, app.initialize_app) runs
+once, in the master, before any worker starts. With --preload (the
+default) the master also imports the app, so forked workers share its
+memory; with --no-preload each worker imports it itself.
+
+Every worker starts its per-process services (app.start_worker_services),
+but the notifier and nightly jobs run in only one of them: whichever holds
+the leader lock (see leader.py). If that worker dies, another takes over.
+"""
+import argparse
+import multiprocessing
+import os
+import signal
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_THREADS = 8
+
+
+def default_workers():
+    # SQLite has one writer, so more processes mostly add contention past a few
+    return int(os.getenv('WEB_CONCURRENCY', min(4, os.cpu_count() or 1)))
+
+
+def load_app(config=None):
+    import app as record_book_app
+    return record_book_app.create_app(config)
+
+
+def initialize(config=None):
+    """The one-time startup work; leaves no pooled connections open for forked workers."""
+    import app as record_book_app
+    import db
+    record_book_app.create_app(config)
+    record_book_app.initialize_app()
+    db.close_all()
+
+
+def initialize_once(config, preload):
+    """Runs initialize() in this process if preloading, else in a short-lived child."""
+    if preload:
+        initialize(config)
+        return
+    process = multiprocessing.Process(target=initialize, args=(config,))
+    process.start()
+    process.join()
+    if process.exitcode != 0:
+        raise SystemExit(f"Startup initialization failed (exit code {process.exitcode})")
+
+
+def start_worker_services():
+    import app as record_book_app
+    record_book_app.start_worker_services()
+
+
+# --- gunicorn ---
+
+def run_gunicorn(args, config):
+    from gunicorn.app.base import BaseApplication
+
+    class RecordBookApplication(BaseApplication):
+        def load_config(self):
+            settings = {
+                'bind': f"{args.host}:{args.port}",
+                'workers': args.workers,
+                'threads': args.threads,
+                'worker_class': 'gthread',
+                'preload_app': args.preload,
+                'timeout': args.timeout,
+                'on_starting': lambda server: initialize_once(config, args.preload),
+                'post_worker_init': lambda worker: start_worker_services(),
+            }
+            for key, value in settings.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return load_app(config)
+
+    RecordBookApplication().run()
+
+
+# --- waitress ---
+
+def run_waitress(args, config):
+    import waitress
+
+    if args.workers > 1:
+        print("waitress runs a single process; ignoring --workers")
+    initialize(config)
+    application = load_app(config)
+    start_worker_services()
+    waitress.serve(application, host=args.host, port=args.port, threads=args.threads)
+
+
+# --- builtin (Werkzeug) ---
+
+def make_builtin_server(host, port, application, threads):
+    from werkzeug.serving import BaseWSGIServer
+
+    class ThreadPoolWSGIServer(BaseWSGIServer):
+        """Werkzeug's WSGI server handling requests on a fixed pool of threads."""
+
+        def serve_forever(self, poll_interval=0.5):
+            # Created here, after fork, so each worker gets its own threads
+            self.pool = ThreadPoolExecutor(threads, thread_name_prefix="request")
+            super().serve_forever(poll_interval)
+
+        def process_request(self, request, client_address):
+            self.pool.submit(self._handle, request, client_address)
+
+        def _handle(self, request, client_address):
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    return ThreadPoolWSGIServer(host, port, application)
+
+
+def run_builtin(args, config):
+    initialize_once(config, args.preload)
+    application = load_app(config) if args.preload else None
+    server = make_builtin_server(args.host, args.port, application, args.threads)
+
+    if not hasattr(os, 'fork'):
+        if args.workers > 1:
+            print("No fork() on this platform; serving from a single process")
+        server.app = load_app(config)
+        start_worker_services()
+        server.serve_forever()
+        return
+
+    def worker():
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        if server.app is None:
+            server.app = load_app(config)
+        start_worker_services()
+        try:
+            server.serve_forever()
+        finally:
+            os._exit(0)
+
+    children = set()
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            worker()
+        children.add(pid)
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for _ in range(args.workers):
+        spawn()
+    print(f"Serving on http://{args.host}:{server.server_port} with {args.workers} workers x {args.threads} threads")
+
+    # Replace workers that die, until asked to stop
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        children.discard(pid)
+        if not stopping:
+            print(f"Worker {pid} exited with status {status}; starting a new one")
+            time.sleep(1)
+            spawn()
+    server.server_close()
+
+
+SERVERS = {
+    'gunicorn': run_gunicorn,
+    'waitress': run_waitress,
+    'builtin': run_builtin,
+}
+
+
+def pick_server(name):
+    if name != 'auto':
+        return name
+    for candidate in ('gunicorn', 'waitress'):
+        if candidate == 'gunicorn' and os.name != 'posix':
+            continue
+        try:
+            __import__(candidate)
+            return candidate
+        except ImportError:
+            continue
+    return 'builtin'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the record book app with a production server.")
+    parser.add_argument('--host', default=os.getenv('HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(os.getenv('PORT', 5000)))
+    parser.add_argument('--workers', type=int, default=default_workers(), help="worker processes (WEB_CONCURRENCY)")
+    parser.add_argument('--threads', type=int, default=DEFAULT_THREADS, help="request threads per worker")
+    parser.add_argument('--preload', action=argparse.BooleanOptionalAction, default=True,
+                        help="import the app in the master before forking workers")
+    parser.add_argument('--server', choices=['auto', *SERVERS], default='auto')
+    parser.add_argument('--timeout', type=int, default=120, help="gunicorn worker timeout, seconds")
+    parser.add_argument('--database', help="record_book.db path")
+    parser.add_argument('--super-app-database', help="super_app.db path")
+    args = parser.parse_args(argv)
+
+    config = {}
+    if args.database:
+        config['DATABASE'] = args.database
+    if args.super_app_database:
+        config['SUPER_APP_DATABASE'] = args.super_app_database
+
+    server = pick_server(args.server)
+    print(f"Starting {server} server")
+    SERVERS[server](args, config)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
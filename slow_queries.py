@@ -0,0 +1,273 @@
+"""
+Slow-query log.
+
+Every statement on a pooled connection that takes longer than
+SLOW_QUERY_MS (execution plus fetching, see db.add_statement_hook) is
+handed to a background thread, which runs EXPLAIN QUERY PLAN for it on
+a connection from the same pool and appends one JSON line to a rotating
+log: the statement, the types of its bound parameters (never their
+values), the time taken, the route that ran it and the plan. Nothing
+extra runs on the request thread beyond the timing and a queue put.
+
+Each process writes its own file, slow_queries.<pid>.log, since a
+RotatingFileHandler is only safe with one process rotating the file.
+The admin page reads every process's file and rotated backups, and
+groups the entries by normalized statement, with literals and IN-lists
+collapsed, so the query shapes that keep scanning whole tables stand
+out.
+
+The log is off unless SLOW_QUERY_MS is set (e.g. SLOW_QUERY_MS=200).
+app.start_worker_services() installs it in each worker process.
+"""
+import glob
+import json
+import logging
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+import db
+
+LOG_FILE = os.path.join("logs", "slow_queries.log")
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUPS = 5
+# Logs of processes that have written nothing for this long are deleted.
+LOG_MAX_AGE_DAYS = 7
+
+_logger = logging.getLogger("slow_queries")
+_logger.propagate = False
+_queue = queue.Queue()
+_worker = None
+_worker_lock = threading.Lock()
+# Statements at or above this many ms are logged to _log_file (set by install()).
+_threshold = 0.0
+_log_file = LOG_FILE
+_hooked = False
+# The process whose file _logger's handler writes to
+_handler_pid = None
+
+
+def threshold_ms():
+    return float(os.getenv('SLOW_QUERY_MS', '0'))
+
+
+def process_log_file(log_file=None, pid=None):
+    """This process's log: logs/slow_queries.log becomes logs/slow_queries.<pid>.log."""
+    root, ext = os.path.splitext(log_file or LOG_FILE)
+    return f"{root}.{pid or os.getpid()}{ext}"
+
+
+def _mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+def log_files(log_file=None):
+    """Every process's log and rotated backups, least recently written first."""
+    root, ext = os.path.splitext(log_file or LOG_FILE)
+    paths = {path: _mtime(path) for path in glob.glob(f"{glob.escape(root)}*{ext}*")}
+    return sorted((path for path, mtime in paths.items() if mtime is not None), key=paths.get)
+
+
+def normalize(sql):
+    """Reduces a statement to its shape: literals become ?, IN-lists (...), whitespace collapsed."""
+    shape = re.sub(r"'(?:[^']|'')*'", "?", sql)
+    shape = re.sub(r"\b\d+(?:\.\d+)?\b", "?", shape)
+    shape = re.sub(r"\s+", " ", shape).strip()
+    shape = re.sub(r"\(\s*\?(?:\s*,\s*\?)+\s*\)", "(...)", shape)
+    return shape
+
+
+def _redact(value):
+    return None if value is None else f"<{type(value).__name__}>"
+
+
+def _parameters(parameters):
+    """Bound parameters with each value replaced by its type: values can be emails, phones, secrets."""
+    if parameters is None:
+        return None
+    if isinstance(parameters, dict):
+        return {key: _redact(value) for key, value in parameters.items()}
+    return [_redact(value) for value in parameters]
+
+
+def explain(conn, sql, parameters):
+    """Returns EXPLAIN QUERY PLAN output as indented lines, or [] if it cannot be explained."""
+    # parameters is None for executemany/executescript, which have no single binding to explain
+    if parameters is None or not re.match(r"\s*(SELECT|WITH|INSERT|UPDATE|DELETE|REPLACE)\b", sql, re.IGNORECASE):
+        return []
+    try:
+        rows = conn.cursor(sqlite3.Cursor).execute("EXPLAIN QUERY PLAN " + sql, parameters).fetchall()
+    except sqlite3.Error as e:
+        return [f"(no plan: {e})"]
+    depth = {0: -1}
+    lines = []
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, -1) + 1
+        lines.append("  " * depth[node_id] + detail)
+    return lines
+
+
+def _route():
+    try:
+        from flask import has_request_context, request
+    except ImportError:
+        return None
+    if has_request_context():
+        return request.url_rule.rule if request.url_rule else request.path
+    return None
+
+
+def _record(conn, sql, parameters, seconds):
+    """Statement hook: queues statements over the threshold."""
+    if _threshold <= 0 or seconds * 1000 < _threshold:
+        return
+    pool = getattr(conn, '_pool', None)
+    if pool is None:
+        return
+    _queue.put({
+        'at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'ms': round(seconds * 1000, 2),
+        'db': pool.db_path,
+        'route': _route(),
+        'sql': sql,
+        'params': _parameters(parameters),
+        '_pool': pool,
+        '_raw_params': parameters,
+    })
+    _ensure_worker()
+
+
+def _open_log():
+    """Points _logger at this process's file (again after a fork), pruning long-idle logs."""
+    global _handler_pid
+    if _handler_pid == os.getpid():
+        return
+    for handler in list(_logger.handlers):
+        _logger.removeHandler(handler)
+        handler.close()
+    os.makedirs(os.path.dirname(_log_file) or ".", exist_ok=True)
+    cutoff = time.time() - LOG_MAX_AGE_DAYS * 86400
+    for path in log_files(_log_file):
+        if (_mtime(path) or cutoff) < cutoff:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    handler = RotatingFileHandler(process_log_file(_log_file), maxBytes=LOG_MAX_BYTES,
+                                  backupCount=LOG_BACKUPS, encoding='utf-8')
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    _logger.addHandler(handler)
+    _logger.setLevel(logging.WARNING)
+    _handler_pid = os.getpid()
+
+
+def _write(entry):
+    _open_log()
+    pool = entry.pop('_pool')
+    parameters = entry.pop('_raw_params')
+    entry['shape'] = normalize(entry['sql'])
+    with pool.connection() as conn:
+        entry['plan'] = explain(conn, entry['sql'], parameters)
+    entry['full_scan'] = any(line.strip().startswith('SCAN') for line in entry['plan'])
+    _logger.warning(json.dumps(entry, default=str))
+
+
+def _ensure_worker():
+    global _worker
+    if _worker is not None:
+        return
+    with _worker_lock:
+        if _worker is not None:
+            return
+
+        def run():
+            while True:
+                entry = _queue.get()
+                try:
+                    _write(entry)
+                except Exception as e:
+                    print(f"Slow query log error: {e}")
+                finally:
+                    _queue.task_done()
+
+        _worker = threading.Thread(target=run, name="slow-query-log", daemon=True)
+        _worker.start()
+
+
+def install(log_file=None, threshold=None):
+    """
+    Starts recording statements slower than threshold ms (default
+    SLOW_QUERY_MS) to this process's file next to log_file. Call in each
+    worker process before it opens its first connection; returns False
+    if the log is turned off.
+    """
+    global _threshold, _log_file, _hooked
+    _threshold = threshold_ms() if threshold is None else threshold
+    if _threshold <= 0:
+        return False
+    _log_file = log_file or LOG_FILE
+    if not _hooked:
+        db.add_statement_hook(_record)
+        _hooked = True
+    return True
+
+
+def flush(timeout=5):
+    """Waits until queued slow statements are written (for tests and benchmarks)."""
+    deadline = time.monotonic() + timeout
+    while _queue.unfinished_tasks:
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def read_log(log_file=None):
+    """Yields logged entries from every process's log and rotated backups, oldest file first."""
+    for path in log_files(log_file):
+        try:
+            f = open(path, encoding='utf-8')
+        except OSError:
+            continue  # rotated or pruned since it was listed
+        with f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def summarize(log_file=None):
+    """
+    Groups logged statements by shape. Returns a list of dicts (shape,
+    count, total_ms, max_ms, last_at, routes, full_scan, and the slowest
+    example's sql, params and plan), the most total time first.
+    """
+    groups = {}
+    for entry in read_log(log_file):
+        shape = entry.get('shape') or normalize(entry['sql'])
+        group = groups.get(shape)
+        if group is None:
+            group = groups[shape] = {'shape': shape, 'count': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+                                     'last_at': None, 'routes': set(), 'full_scan': False}
+        group['count'] += 1
+        group['total_ms'] += entry['ms']
+        group['last_at'] = max(group['last_at'] or entry['at'], entry['at'])
+        if entry.get('route'):
+            group['routes'].add(entry['route'])
+        group['full_scan'] = group['full_scan'] or entry.get('full_scan', False)
+        if entry['ms'] >= group['max_ms']:
+            group.update(max_ms=entry['ms'], sql=entry['sql'], params=entry.get('params'),
+                         plan=entry.get('plan', []), db=entry.get('db'))
+    for group in groups.values():
+        group['total_ms'] = round(group['total_ms'], 2)
+        group['routes'] = sorted(group['routes'])
+    return sorted(groups.values(), key=lambda g: g['total_ms'], reverse=True)
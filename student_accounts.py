@@ -0,0 +1,79 @@
+"""
+Questions that span the business ledger and the school app.
+
+Fees are billed to customers in record_book.db; canteen orders, wallets
+and library fines live in super_app.db under a student_id, which is the
+customer_id written as text. Each report here runs as one SQL query on
+a record_book.db connection with super_app.db ATTACHed (db.attached),
+so the join and the aggregation both happen inside SQLite.
+"""
+from datetime import datetime, timedelta
+
+import db
+
+RECORD_BOOK_DB = db.RECORD_BOOK_DB
+SUPER_APP_DB = db.SUPER_APP_DB
+
+# Alias super_app.db is ATTACHed under.
+SUPER_APP = 'super_app'
+
+# Days of canteen spend reported when no range is given.
+DEFAULT_DAYS = 30
+
+
+def default_range(today=None):
+    """Returns (start, end) dates for the last DEFAULT_DAYS days."""
+    today = today or datetime.now()
+    return (today - timedelta(days=DEFAULT_DAYS - 1)).strftime('%Y-%m-%d'), today.strftime('%Y-%m-%d')
+
+
+def spend_vs_outstanding(start, end, customer_id=None, limit=None,
+                         record_book_db=None, super_app_db=None):
+    """
+    Canteen spend between start and end (inclusive YYYY-MM-DD dates)
+    against outstanding fees, per student, along with wallet balance and
+    unpaid library fines. Students with neither spend nor fees are left
+    out; the rest are ordered by outstanding fees, then spend.
+    Returns a list of dicts, all amounts in rupees.
+    """
+    with db.attached(record_book_db or RECORD_BOOK_DB, foreign_keys=False,
+                     **{SUPER_APP: super_app_db or SUPER_APP_DB}) as conn:
+        rows = conn.execute(f"""
+            WITH fees AS (
+                SELECT customer_id, SUM(due_amount) AS outstanding, COUNT(*) AS unpaid_bills
+                FROM monthly_bills
+                WHERE status = 'Unpaid' AND due_amount > 0
+                GROUP BY customer_id
+            ),
+            spend AS (
+                SELECT student_id, SUM(total_price) AS spend, COUNT(*) AS orders
+                FROM {SUPER_APP}.canteen_orders
+                WHERE student_id IS NOT NULL
+                  AND created_at >= :start AND created_at < date(:end, '+1 day')
+                GROUP BY student_id
+            ),
+            fines AS (
+                SELECT o.student_id,
+                       SUM(o.fine - COALESCE((SELECT SUM(p.amount) FROM {SUPER_APP}.library_fine_payments p
+                                              WHERE p.issue_id = o.issue_id), 0)) AS fines
+                FROM {SUPER_APP}.library_overdue o
+                GROUP BY o.student_id
+            )
+            SELECT c.customer_id, c.name,
+                   ROUND(COALESCE(fees.outstanding, 0) / 100.0, 2) AS outstanding,  -- paise to rupees
+                   COALESCE(fees.unpaid_bills, 0) AS unpaid_bills,
+                   ROUND(COALESCE(spend.spend, 0), 2) AS canteen_spend,
+                   COALESCE(spend.orders, 0) AS canteen_orders,
+                   ROUND(COALESCE(fines.fines, 0), 2) AS library_fines,
+                   ROUND(w.balance / 100.0, 2) AS wallet_balance  -- paise to rupees
+            FROM customers c
+            LEFT JOIN fees ON fees.customer_id = c.customer_id
+            LEFT JOIN spend ON spend.student_id = CAST(c.customer_id AS TEXT)
+            LEFT JOIN fines ON fines.student_id = CAST(c.customer_id AS TEXT)
+            LEFT JOIN {SUPER_APP}.wallets w ON w.student_id = CAST(c.customer_id AS TEXT)
+            WHERE (fees.customer_id IS NOT NULL OR spend.student_id IS NOT NULL)
+              AND (:customer_id IS NULL OR c.customer_id = :customer_id)
+            ORDER BY outstanding DESC, canteen_spend DESC, c.customer_id
+            LIMIT COALESCE(:limit, -1)
+        """, {'start': start, 'end': end, 'customer_id': customer_id, 'limit': limit}).fetchall()
+    return [dict(row) for row in rows]
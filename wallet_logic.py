@@ -0,0 +1,305 @@
+"""
+Prepaid student wallets.
+
+Amounts are integer paise (see money.py), so balances never drift and
+reconciliation compares exactly. Top-ups are parsed with money.to_paise
+and the fines paid from a wallet are converted from rupees the same way.
+
+wallets.balance is the live balance. Every change to it is also
+appended to wallet_ledger in the same transaction, and debits are a
+single conditional UPDATE (balance >= amount), so concurrent debits on
+one wallet can never take it below zero.
+
+A nightly snapshot records each wallet's balance and the last ledger
+entry it covers. Historical balances and reconciliation read the
+nearest snapshot plus the ledger entries after it, never the whole
+ledger.
+
+Run the snapshot from cron with:  python wallet_logic.py [path/to/super_app.db]
+"""
+import sys
+from datetime import datetime
+
+import db
+import money
+
+DB_FILE = db.SUPER_APP_DB
+
+# Largest single top-up accepted, in paise (₹10,000).
+MAX_TOP_UP = 10000 * money.PAISE_PER_RUPEE
+
+LEDGER_KINDS = ('topup', 'canteen', 'fine', 'refund')
+
+# The wallet money columns, all integer paise
+WALLET_MONEY_COLUMNS = {
+    'wallets': ('balance',),
+    'wallet_ledger': ('amount',),
+    'wallet_snapshots': ('balance',),
+}
+
+
+class WalletError(Exception):
+    """A debit or top-up that cannot be applied (raised inside transactions)."""
+
+
+def initialize_wallet_schema(db_path=None):
+    """
+    Creates the wallet tables and indexes if missing, converting wallet
+    tables from when amounts were REAL rupees to integer paise. Raises
+    money.AmountOutOfRange, leaving them as they were, if one cannot be.
+    """
+    db_path = db_path or DB_FILE
+    conn = db.connect(db_path)
+    cursor = conn.cursor()
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS wallets (
+            student_id TEXT PRIMARY KEY,
+            balance INTEGER NOT NULL DEFAULT 0 CHECK (balance >= 0),
+            updated_at TEXT NOT NULL
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS wallet_ledger (
+            entry_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_id TEXT NOT NULL REFERENCES wallets (student_id),
+            amount INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            reference TEXT,
+            created_at TEXT NOT NULL
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS wallet_snapshots (
+            student_id TEXT NOT NULL,
+            taken_on TEXT NOT NULL,
+            balance INTEGER NOT NULL,
+            last_entry_id INTEGER NOT NULL,
+            PRIMARY KEY (student_id, taken_on)
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS library_fine_payments (
+            payment_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            issue_id INTEGER NOT NULL,
+            student_id TEXT NOT NULL,
+            amount REAL NOT NULL,
+            entry_id INTEGER REFERENCES wallet_ledger (entry_id),
+            paid_at TEXT NOT NULL
+        )
+    """)
+    conn.commit()
+    conn.close()
+
+    # The table rebuild needs foreign keys off, and must come before the indexes
+    with db.transaction(db_path, foreign_keys=False) as conn:
+        money.migrate_to_paise(conn.cursor(), WALLET_MONEY_COLUMNS)
+
+    conn = db.connect(db_path)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_wallet_ledger_student ON wallet_ledger (student_id, entry_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_library_fine_payments_issue ON library_fine_payments (issue_id)")
+    conn.commit()
+    conn.close()
+
+
+# --- Ledger primitives (caller owns the transaction) ---
+
+def debit(conn, student_id, amount, kind, reference=None):
+    """
+    Takes amount (integer paise) from a wallet with one conditional UPDATE
+    and records the ledger entry. Raises WalletError if the wallet is
+    missing or short. Returns the new ledger entry_id.
+    """
+    amount = int(amount)
+    if amount <= 0:
+        raise WalletError("Debit amount must be positive.")
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+    cursor = conn.execute("""
+        UPDATE wallets SET balance = balance - ?, updated_at = ?
+        WHERE student_id = ? AND balance >= ?
+    """, (amount, now, student_id, amount))
+    if cursor.rowcount == 0:
+        row = conn.execute("SELECT balance FROM wallets WHERE student_id = ?", (student_id,)).fetchone()
+        if row is None:
+            raise WalletError(f"No wallet found for student {student_id}.")
+        raise WalletError(f"Insufficient balance for student {student_id}: "
+                          f"{money.format_paise(row[0])} available, {money.format_paise(amount)} needed.")
+
+    return conn.execute("""
+        INSERT INTO wallet_ledger (student_id, amount, kind, reference, created_at)
+        VALUES (?, ?, ?, ?, ?)
+    """, (student_id, -amount, kind, reference, now)).lastrowid
+
+
+def credit(conn, student_id, amount, kind, reference=None):
+    """
+    Adds amount (integer paise) to a wallet, creating it on first top-up,
+    and records the ledger entry. Returns the new ledger entry_id.
+    """
+    amount = int(amount)
+    if amount <= 0:
+        raise WalletError("Credit amount must be positive.")
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+    conn.execute("""
+        INSERT INTO wallets (student_id, balance, updated_at) VALUES (?, ?, ?)
+        ON CONFLICT (student_id) DO UPDATE SET balance = balance + excluded.balance,
+                                               updated_at = excluded.updated_at
+    """, (student_id, amount, now))
+    return conn.execute("""
+        INSERT INTO wallet_ledger (student_id, amount, kind, reference, created_at)
+        VALUES (?, ?, ?, ?, ?)
+    """, (student_id, amount, kind, reference, now)).lastrowid
+
+
+# --- Wallet operations ---
+
+def top_up(student_id, amount):
+    """
+    Adds a rupee amount (form value) to a student's wallet.
+    Returns a success or error message string.
+    """
+    student_id = str(student_id).strip()
+    try:
+        amount = money.to_paise(amount)
+    except ValueError:
+        return "Error: Amount must be a number."
+    if not student_id:
+        return "Error: Student ID is required."
+    if amount <= 0 or amount > MAX_TOP_UP:
+        return f"Error: Top-up must be between ₹0.01 and {money.format_paise(MAX_TOP_UP)}."
+
+    with db.transaction(DB_FILE) as conn:
+        credit(conn, student_id, amount, 'topup')
+        balance = conn.execute("SELECT balance FROM wallets WHERE student_id = ?", (student_id,)).fetchone()[0]
+    return (f"Success: Added {money.format_paise(amount)} to student {student_id}'s wallet. "
+            f"Balance: {money.format_paise(balance)}.")
+
+
+def get_wallet(student_id, history=20):
+    """
+    Fetches a wallet's live balance and its most recent ledger entries.
+    Returns (wallet_row, ledger_rows), or (None, []) if there is no wallet.
+    """
+    with db.get_pool(DB_FILE).connection() as conn:
+        wallet = conn.execute(
+            "SELECT student_id, balance, updated_at FROM wallets WHERE student_id = ?", (student_id,)
+        ).fetchone()
+        if wallet is None:
+            return None, []
+        ledger = conn.execute("""
+            SELECT entry_id, amount, kind, reference, created_at FROM wallet_ledger
+            WHERE student_id = ?
+            ORDER BY entry_id DESC
+            LIMIT ?
+        """, (student_id, history)).fetchall()
+    return wallet, ledger
+
+
+def get_outstanding_fines(conn, student_id):
+    """
+    Returns [(issue_id, book_id, title, unpaid), ...] from library_overdue,
+    which keeps a returned issue's frozen fine until it is paid.
+    """
+    return conn.execute("""
+        SELECT o.issue_id, o.book_id, o.title,
+               ROUND(o.fine - COALESCE((SELECT SUM(p.amount) FROM library_fine_payments p
+                                        WHERE p.issue_id = o.issue_id), 0), 2) AS unpaid
+        FROM library_overdue o
+        WHERE o.student_id = ?
+        ORDER BY o.issue_id
+    """, (student_id,)).fetchall()
+
+
+def pay_library_fines(student_id):
+    """
+    Pays all of a student's outstanding library fines from their wallet,
+    in one transaction: either every fine is paid or none is.
+    Returns a success or error message string.
+    """
+    student_id = str(student_id).strip()
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    try:
+        with db.transaction(DB_FILE) as conn:
+            fines = [f for f in get_outstanding_fines(conn, student_id) if f['unpaid'] > 0]
+            if not fines:
+                return f"Error: Student {student_id} has no outstanding library fines."
+            total = round(sum(f['unpaid'] for f in fines), 2)
+            # Fines are rupees; the wallet is paise
+            entry_id = debit(conn, student_id, money.to_paise(total), 'fine',
+                             "issues " + ",".join(str(f['issue_id']) for f in fines))
+            conn.executemany("""
+                INSERT INTO library_fine_payments (issue_id, student_id, amount, entry_id, paid_at)
+                VALUES (?, ?, ?, ?, ?)
+            """, [(f['issue_id'], student_id, f['unpaid'], entry_id, now) for f in fines])
+    except WalletError as e:
+        return f"Error: {e}"
+    return f"Success: Paid ₹{total:.2f} in library fines for student {student_id}."
+
+
+# --- Snapshots ---
+
+def snapshot_wallets(db_path=None, today=None):
+    """
+    Records every wallet's balance and last ledger entry for today, in one
+    transaction so balances and entry ids agree.
+    Returns the number of wallets snapshotted.
+    """
+    today = today or datetime.now().strftime('%Y-%m-%d')
+    with db.transaction(db_path or DB_FILE) as conn:
+        cursor = conn.execute("""
+            INSERT OR REPLACE INTO wallet_snapshots (student_id, taken_on, balance, last_entry_id)
+            SELECT w.student_id, ?, w.balance,
+                   COALESCE((SELECT MAX(l.entry_id) FROM wallet_ledger l WHERE l.student_id = w.student_id), 0)
+            FROM wallets w
+        """, (today,))
+        return cursor.rowcount
+
+
+def last_snapshot_date(db_path=None):
+    """Returns the date of the latest wallet snapshot, or None."""
+    with db.get_pool(db_path or DB_FILE).connection() as conn:
+        return conn.execute("SELECT MAX(taken_on) FROM wallet_snapshots").fetchone()[0]
+
+
+def ledger_balance(conn, student_id, as_of_entry_id=None):
+    """
+    Rebuilds a balance from the latest snapshot at or before as_of_entry_id
+    (default: now) plus the ledger entries after it.
+    """
+    bound = as_of_entry_id if as_of_entry_id is not None else sys.maxsize
+    snapshot = conn.execute("""
+        SELECT balance, last_entry_id FROM wallet_snapshots
+        WHERE student_id = ? AND last_entry_id <= ?
+        ORDER BY last_entry_id DESC LIMIT 1
+    """, (student_id, bound)).fetchone()
+    balance, after = (snapshot[0], snapshot[1]) if snapshot else (0, 0)
+    delta = conn.execute("""
+        SELECT COALESCE(SUM(amount), 0) FROM wallet_ledger
+        WHERE student_id = ? AND entry_id > ? AND entry_id <= ?
+    """, (student_id, after, bound)).fetchone()[0]
+    return balance + delta
+
+
+def find_mismatches(db_path=None):
+    """
+    Compares every live balance against snapshot + ledger.
+    Returns [(student_id, live_balance, ledger_balance), ...] that disagree.
+    """
+    with db.get_pool(db_path or DB_FILE).connection() as conn:
+        wallets = conn.execute("SELECT student_id, balance FROM wallets").fetchall()
+        return [
+            (w['student_id'], w['balance'], expected)
+            for w in wallets
+            if w['balance'] != (expected := ledger_balance(conn, w['student_id']))
+        ]
+
+
+if __name__ == "__main__":
+    db_path = sys.argv[1] if len(sys.argv) > 1 else DB_FILE
+    count = snapshot_wallets(db_path)
+    mismatches = find_mismatches(db_path)
+    print(f"Snapshotted {count} wallets in {db_path}; {len(mismatches)} mismatched balances")
+    for student_id, live, expected in mismatches:
+        print(f"  {student_id}: live {money.format_paise(live)}, ledger {money.format_paise(expected)}")